@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from functools import lru_cache
+
+from regions import REGISTRY, normalize
+
+MAX_CHOICES = 25  # Discord's autocomplete limit
+
+# Ranking tiers, best first
+EXACT = 0
+PREFIX = 1
+ALIAS_PREFIX = 2
+SUBSTRING = 3
+
+# =======================================================
+# Region Autocomplete Engine
+# =======================================================
+
+class RegionSearch:
+    """Case- and accent-insensitive region lookup for autocomplete.
+
+    Names, pycountry aliases and ISO codes are normalized once into a sorted
+    key list (prefix matches via bisect) and an n-gram index of every key
+    (substring matches without scanning). Results rank exact matches, then
+    name prefixes, then alias/word prefixes, then anything containing the query.
+    """
+
+    def __init__(self, registry=REGISTRY):
+        self.names = sorted(registry, key=normalize)
+        self._order = {name: i for i, name in enumerate(self.names)}
+        self._keys = []  # (key, name, is_primary)
+        for region in registry.values():
+            self._keys.append((region.key, region.name, True))
+            for alias in region.aliases:
+                self._keys.append((normalize(alias), region.name, False))
+            for code in (region.iso2, region.iso3):
+                if code:
+                    self._keys.append((code.casefold(), region.name, False))
+        self._keys.sort()
+        self._sorted = [key for key, _, _ in self._keys]
+
+        # Every 1-, 2- and 3-gram of every key; longer queries intersect trigrams
+        self._grams = {}
+        for i, (key, _, _) in enumerate(self._keys):
+            for n in (1, 2, 3):
+                for start in range(len(key) - n + 1):
+                    self._grams.setdefault(key[start:start + n], set()).add(i)
+
+        self.search = lru_cache(maxsize=2048)(self._search)
+
+    def _candidates(self, query):
+        if len(query) <= 3:
+            return self._grams.get(query, ())
+        grams = [self._grams.get(query[i:i + 3]) for i in range(len(query) - 2)]
+        if not all(grams):
+            return ()
+        grams.sort(key=len)
+        candidates = set(grams[0])
+        for gram in grams[1:]:
+            candidates &= gram
+        return candidates
+
+    def _search(self, query, limit=MAX_CHOICES):
+        query = normalize(query)
+        if not query:
+            return tuple(self.names[:limit])
+
+        best = {}
+
+        def rank(name, tier):
+            if tier < best.get(name, SUBSTRING + 1):
+                best[name] = tier
+
+        # Prefix matches are a contiguous run of the sorted keys
+        i = bisect_left(self._sorted, query)
+        while i < len(self._sorted) and self._sorted[i].startswith(query):
+            key, name, is_primary = self._keys[i]
+            if key == query:
+                rank(name, EXACT)
+            else:
+                rank(name, PREFIX if is_primary else ALIAS_PREFIX)
+            i += 1
+
+        word_start = " " + query
+        for i in self._candidates(query):
+            key, name, _ = self._keys[i]
+            if best.get(name, SUBSTRING + 1) <= ALIAS_PREFIX or query not in key:
+                continue
+            best[name] = ALIAS_PREFIX if word_start in key else SUBSTRING
+
+        order = self._order
+        ordered = sorted(best, key=lambda name: (best[name], order[name]))
+        return tuple(ordered[:limit])
+
+region_search = RegionSearch()
@@ -0,0 +1,48 @@
+"""Region autocomplete latency per keystroke: the old sorted-and-scan handler vs RegionSearch.
+
+Every region name is "typed" one character at a time, the way Discord
+fires autocomplete while a user types.
+
+Run from the repository root:  python -m benchmarks.autocomplete
+"""
+import argparse
+import statistics
+import time
+
+from autocomplete import RegionSearch
+from regions import REGIONS, REGISTRY
+
+def old_handler(current):
+    return [name for name in sorted(REGIONS.keys()) if current.lower() in name.lower()][:25]
+
+def measure(handler, keystrokes):
+    samples = []
+    for query in keystrokes:
+        start = time.perf_counter()
+        handler(query)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    keystrokes = [name[:i] for name in REGIONS for i in range(1, len(name) + 1)] * args.rounds
+
+    # Cold engine (no memoized queries) and the warm steady state
+    cold = RegionSearch(REGISTRY)
+    results = {
+        "old sorted + scan": measure(old_handler, keystrokes),
+        "RegionSearch (cold)": measure(lambda q: cold._search(q), keystrokes),
+        "RegionSearch (memoized)": measure(RegionSearch(REGISTRY).search, keystrokes),
+    }
+
+    print(f"{len(keystrokes)} keystrokes over {len(REGIONS)} regions")
+    print(f"{'handler':26} {'mean':>10} {'p50':>10} {'p99':>10}")
+    for label, (mean, p50, p99) in results.items():
+        print(f"{label:26} {mean * 1e6:>7.1f} µs {p50 * 1e6:>7.1f} µs {p99 * 1e6:>7.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Slash-command latency with many commands in flight: connect-per-call sqlite3 vs the async WAL layer.
+
+Each simulated command writes a subscription and reads it back, while a
+ticker task measures how long the event loop was blocked.
+
+Run from the repository root:  python -m benchmarks.db_commands
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database
+
+# --- The old database.py: one connection per call, on the event loop ---
+
+def old_add_subscriber(path, user_id, region, min_magnitude):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("REPLACE INTO subscribers (user_id, region, min_magnitude) VALUES (?, ?, ?)", (user_id, region, min_magnitude))
+    conn.commit()
+    conn.close()
+
+def old_get_subscriber(path, user_id):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute("SELECT region, min_magnitude FROM subscribers WHERE user_id = ?", (user_id,))
+    result = c.fetchone()
+    conn.close()
+    return result
+
+async def old_command(path, user_id):
+    old_add_subscriber(path, user_id, "Japan", 4.5)
+    return old_get_subscriber(path, user_id)
+
+async def new_command(user_id):
+    await database.add_subscriber(user_id, "Japan", 4.5)
+    return database.get_subscriber(user_id)
+
+async def ticker(lags, stop):
+    interval = 0.005
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+async def burst(make_command, commands):
+    lags = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.01)
+
+    # Every command arrives at once, so latency runs from the start of the burst
+    start = time.perf_counter()
+
+    async def timed(user_id):
+        await make_command(user_id)
+        return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(timed(user_id) for user_id in range(commands)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick
+    return elapsed, sorted(latencies), max(lags, default=0.0)
+
+def report(label, commands, elapsed, latencies, max_lag):
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(
+        f"{label:22} {commands / elapsed:8.0f} cmd/s  p50 {p50 * 1000:7.2f} ms  "
+        f"p99 {p99 * 1000:7.2f} ms  mean {statistics.mean(latencies) * 1000:7.2f} ms  "
+        f"max loop stall {max_lag * 1000:7.2f} ms"
+    )
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, "old.db")
+        conn = sqlite3.connect(old_path)
+        conn.execute("CREATE TABLE subscribers (user_id INTEGER PRIMARY KEY, region TEXT, min_magnitude REAL)")
+        conn.close()
+
+        database.DB_FILE = os.path.join(tmp, "botdata.db")
+        await database.init_db()
+
+        print(f"{args.commands} concurrent slash commands (write + read each)")
+        report("connect per call", args.commands, *await burst(lambda u: old_command(old_path, u), args.commands))
+        report("async WAL connection", args.commands, *await burst(new_command, args.commands))
+        await database.close_db()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--commands", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,87 @@
+"""Alert fan-out throughput: sequential sends vs AlertDispatcher, against a rate-limited fake Discord.
+
+Run from the repository root:  python -m benchmarks.dispatch
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from dispatcher import AlertDispatcher, Delivery, CHANNEL, DM
+from benchmarks.fake_discord import FakeDiscord
+
+async def post_message(session, base_url, channel_id, payload):
+    async with session.post(f"{base_url}/channels/{channel_id}/messages", json=payload) as response:
+        if response.status == 429:
+            raise RuntimeError("429 rate limited")
+        response.raise_for_status()
+
+def make_targets(channels, dms):
+    return [(CHANNEL, 1000 + i) for i in range(channels)] + [(DM, 900000 + i) for i in range(dms)]
+
+async def run_sequential(session, url, events, targets):
+    start = time.perf_counter()
+    for event_id, mag in events:
+        for _, channel_id in targets:
+            try:
+                await post_message(session, url, channel_id, {"embeds": [{"title": event_id, "mag": mag}]})
+            except RuntimeError:
+                pass
+    return time.perf_counter() - start, []
+
+async def run_dispatcher(session, url, events, targets, workers):
+    dispatcher = AlertDispatcher(workers=workers)
+    dispatcher.start()
+    start = time.perf_counter()
+    reports = []
+    for event_id, mag in events:
+        deliveries = [
+            Delivery(
+                f"channel:{channel_id}", kind, f"{channel_id}",
+                lambda channel_id=channel_id, event_id=event_id, mag=mag: post_message(
+                    session, url, channel_id, {"embeds": [{"title": event_id, "mag": mag}]}
+                )
+            )
+            for kind, channel_id in targets
+        ]
+        reports.append(dispatcher.submit(event_id, mag, deliveries))
+    await asyncio.gather(*(report.done.wait() for report in reports))
+    elapsed = time.perf_counter() - start
+    await dispatcher.stop()
+    return elapsed, reports
+
+async def main(args):
+    targets = make_targets(args.channels, args.dms)
+    events = [(f"bench{i}", round(6.5 - i * 0.7, 1)) for i in range(args.events)]
+    total = len(targets) * len(events)
+
+    modes = [("dispatcher", lambda s, u: run_dispatcher(s, u, events, targets, args.workers))]
+    if not args.skip_sequential:
+        modes.insert(0, ("sequential", lambda s, u: run_sequential(s, u, events, targets)))
+
+    print(f"{len(events)} events x {len(targets)} targets = {total} sends, {args.latency * 1000:.0f} ms API latency")
+    for label, run in modes:
+        fake = FakeDiscord(latency=args.latency)
+        url = await fake.start()
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=args.workers * 2)) as session:
+            elapsed, reports = await run(session, url)
+        await fake.stop()
+
+        print(
+            f"{label:11} {elapsed:7.2f} s  {len(fake.accepted) / elapsed:7.1f} msg/s  "
+            f"accepted {len(fake.accepted)}/{total}  429s {fake.rejected}  "
+            f"max burst {fake.max_global_burst()}/{fake.global_limit} per {fake.global_period:.0f}s"
+        )
+        for report in reports:
+            print(f"    {report.event_id} M{report.magnitude}: last delivery after {report.time_to_last_delivery:.2f} s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2)
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--dms", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.08)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--skip-sequential", action="store_true")
+    asyncio.run(main(parser.parse_args()))
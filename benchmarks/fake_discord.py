@@ -0,0 +1,134 @@
+"""A local stand-in for Discord's REST API that enforces its rate limits.
+
+Every accepted request is recorded, and anything that would have exceeded
+the per-route or global window is answered with a 429 and counted, so a
+benchmark can assert that a client never bursts past the limits.
+"""
+import asyncio
+import itertools
+import json
+import time
+from collections import defaultdict, deque
+
+from aiohttp import web
+
+BOT_USER_ID = 1  # the user that owns webhooks created here
+
+class FakeDiscord:
+    def __init__(self, latency=0.08, global_limit=50, global_period=1.0, route_limit=5, route_period=5.0):
+        self.latency = latency
+        self.global_limit = global_limit
+        self.global_period = global_period
+        self.route_limit = route_limit
+        self.route_period = route_period
+
+        self.global_window = deque()
+        self.route_windows = defaultdict(deque)
+        self.accepted = []  # (timestamp, route, payload)
+        self.rejected = 0
+        self.rejected_global = 0
+        self.webhooks_created = 0
+        self.webhooks = defaultdict(list)  # channel_id -> webhook payloads
+        self._ids = itertools.count(10**17)
+        self._runner = None
+        self.url = None
+
+    def _over(self, window, limit, period, now):
+        while window and now - window[0] >= period:
+            window.popleft()
+        return len(window) >= limit
+
+    def _limited(self, is_global):
+        # Shaped like Discord's: discord.py only parses an exact application/json, and its
+        # webhook client takes a 429 without a Via header for a Cloudflare ban
+        body = {"message": "You are being rate limited.", "retry_after": 1.0, "global": is_global}
+        return web.Response(body=json.dumps(body).encode(), status=429, headers={"Via": "1.1 google", "Content-Type": "application/json"})
+
+    def _admit(self, route):
+        now = time.monotonic()
+        if self._over(self.global_window, self.global_limit, self.global_period, now):
+            self.rejected += 1
+            self.rejected_global += 1
+            return self._limited(True)
+        window = self.route_windows[route]
+        if self._over(window, self.route_limit, self.route_period, now):
+            self.rejected += 1
+            return self._limited(False)
+        self.global_window.append(now)
+        window.append(now)
+        return None
+
+    async def create_message(self, request):
+        route = f"channel:{request.match_info['channel_id']}"
+        limited = self._admit(route)
+        if limited is not None:
+            return limited
+        payload = await request.json()
+        self.accepted.append((time.monotonic(), route, payload))
+        await asyncio.sleep(self.latency)
+        return web.json_response({"id": str(next(self._ids)), "channel_id": request.match_info["channel_id"]})
+
+    async def execute_webhook(self, request):
+        route = f"webhook:{request.match_info['webhook_id']}"
+        limited = self._admit(route)
+        if limited is not None:
+            return limited
+        payload = await request.json()
+        self.accepted.append((time.monotonic(), route, payload))
+        await asyncio.sleep(self.latency)
+        return web.json_response({"id": str(next(self._ids))})
+
+    async def create_webhook(self, request):
+        await asyncio.sleep(self.latency)
+        self.webhooks_created += 1
+        webhook_id = next(self._ids)
+        channel_id = request.match_info["channel_id"]
+        webhook = {"id": str(webhook_id), "token": f"token-{webhook_id}", "type": 1, "channel_id": channel_id,
+                   "name": (await request.json())["name"], "user": {"id": str(BOT_USER_ID)}}
+        self.webhooks[channel_id].append(webhook)
+        return web.json_response(webhook)
+
+    async def channel_webhooks(self, request):
+        await asyncio.sleep(self.latency)
+        return web.json_response(self.webhooks[request.match_info["channel_id"]])
+
+    async def delete_webhook(self, request):
+        for webhooks in self.webhooks.values():
+            webhooks[:] = [w for w in webhooks if w["id"] != request.match_info["webhook_id"]]
+        return web.Response(status=204)
+
+    async def create_dm(self, request):
+        payload = await request.json()
+        await asyncio.sleep(self.latency)
+        return web.json_response({"id": str(payload["recipient_id"]), "type": 1})
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_post("/api/v10/channels/{channel_id}/messages", self.create_message)
+        app.router.add_post("/api/v10/channels/{channel_id}/webhooks", self.create_webhook)
+        app.router.add_get("/api/v10/channels/{channel_id}/webhooks", self.channel_webhooks)
+        app.router.add_post("/api/v10/webhooks/{webhook_id}/{token}", self.execute_webhook)
+        app.router.add_delete("/api/v10/webhooks/{webhook_id}/{token}", self.delete_webhook)
+        app.router.add_post("/api/v10/users/@me/channels", self.create_dm)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}/api/v10"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def max_global_burst(self):
+        """Most accepted requests seen in any sliding global window."""
+        stamps = [stamp for stamp, _, _ in self.accepted]
+        best = 0
+        start = 0
+        for end, stamp in enumerate(stamps):
+            while stamp - stamps[start] >= self.global_period:
+                start += 1
+            best = max(best, end - start + 1)
+        return best
@@ -0,0 +1,84 @@
+"""Bytes downloaded and CPU spent per idle poll, unconditional vs conditional.
+
+Run from the repository root:  python -m benchmarks.feed_poll
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import time
+
+from aiohttp import web
+
+from feed import FeedClient
+from benchmarks.synthetic import make_feed, dumps
+
+def serve(port, count, ready):
+    body = dumps(make_feed(count=count, generated=1700000000000))
+    etag = '"' + hashlib.md5(body).hexdigest() + '"'
+    last_modified = "Tue, 14 Nov 2023 22:13:20 GMT"
+
+    async def handler(request):
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body,
+            content_type="application/geo+json",
+            headers={"ETag": etag, "Last-Modified": last_modified}
+        )
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/feed.geojson", handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+async def measure(client, polls, conditional):
+    # One warm-up poll primes the validators, as the running bot would have
+    await (client.poll() if conditional else client.fetch())
+    start_bytes = client.bytes_downloaded
+    start_cpu = time.process_time()
+    for _ in range(polls):
+        if conditional:
+            await client.poll()
+        else:
+            await client.fetch()
+    cpu = time.process_time() - start_cpu
+    return (client.bytes_downloaded - start_bytes) / polls, cpu / polls * 1000
+
+async def run(port, polls):
+    url = f"http://127.0.0.1:{port}/feed.geojson"
+    results = {}
+    for label, conditional in (("before (full GET + parse)", False), ("after (conditional GET)", True)):
+        client = FeedClient(url)
+        results[label] = await measure(client, polls, conditional)
+        await client.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8731)
+    parser.add_argument("--features", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(args.port, args.features, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+    try:
+        results = asyncio.run(run(args.port, args.polls))
+    finally:
+        server.terminate()
+
+    print(f"{args.features} features, {args.polls} idle polls")
+    for label, (bytes_per_poll, cpu_ms) in results.items():
+        print(f"{label:28} {bytes_per_poll:>10.0f} bytes/poll {cpu_ms:>8.3f} ms CPU/poll")
+
+if __name__ == "__main__":
+    main()
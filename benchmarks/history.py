@@ -0,0 +1,100 @@
+"""History queries against a large event store.
+
+Fills a temporary history.db with a year of synthetic events (1M by
+default, a third of them clustered in a few seismic zones), then times
+one page of each /history-style query, plus paging deep into a result.
+
+Run from the repository root:  python -m benchmarks.history
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import history
+from regions import REGIONS
+
+YEAR_MS = 365 * 24 * 3600 * 1000
+ZONES = [(38.5, 35.0), (36.0, 140.0), (-33.0, -71.0), (61.0, -150.0), (-6.0, 130.0)]
+
+def fill(conn, count, now, seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        if i % 3 == 0:
+            zone_lat, zone_lon = rng.choice(ZONES)
+            lat, lon = zone_lat + rng.gauss(0, 3), zone_lon + rng.gauss(0, 3)
+            lat, lon = max(-89.9, min(89.9, lat)), (lon + 180) % 360 - 180
+        else:
+            lat, lon = rng.uniform(-70, 75), rng.uniform(-180, 180)
+        quake_time = now - rng.randrange(YEAR_MS)
+        mag = round(min(9.0, rng.expovariate(1 / 1.2) + 0.5), 1)
+        feature = {
+            "id": f"bm{i:08d}",
+            "properties": {"mag": mag, "time": quake_time, "updated": quake_time + 60000, "place": "Somewhere", "url": ""},
+            "geometry": {"coordinates": [round(lon, 4), round(lat, 4), 10.0]}
+        }
+        rows.append(history._row(feature))
+        if len(rows) == 50000:
+            history._record(conn, rows)
+            conn.commit()
+            rows = []
+    if rows:
+        history._record(conn, rows)
+        conn.commit()
+    conn.execute("ANALYZE")
+
+def timed(conn, repeats, **query):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        page, cursor = history._query(conn, query.get("start"), query.get("end"), query.get("min_magnitude"),
+                                      query.get("bbox"), query.get("near"), history.PAGE_SIZE, None)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), len(page)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    now = int(time.time() * 1000)
+    day = 24 * 3600 * 1000
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = history.connect(os.path.join(tmp, "history.db"))
+        start = time.perf_counter()
+        fill(conn, args.events, now, args.seed)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(os.path.join(tmp, "history.db")) / 1024 / 1024
+        print(f"stored {args.events} events in {elapsed:.1f} s ({args.events / elapsed:.0f}/s, {size:.0f} MB)")
+
+        queries = [
+            ("latest page", {}),
+            ("M6+ last 30 days", {"start": now - 30 * day, "min_magnitude": 6.0}),
+            ("Turkey last 7 days", {"start": now - 7 * day, "bbox": REGIONS["Turkey"]}),
+            ("Turkey M4+ last year", {"bbox": REGIONS["Turkey"], "min_magnitude": 4.0}),
+            ("Russia M5+ (antimeridian)", {"bbox": REGIONS["Russian Federation"], "min_magnitude": 5.0}),
+            ("300 km of Tokyo, 30 days", {"start": now - 30 * day, "near": (35.68, 139.69, 300)}),
+            ("1000 km of Anchorage M3+", {"near": (61.2, -149.9, 1000), "min_magnitude": 3.0}),
+        ]
+        print(f"{'query':28} {'p50 ms':>9} {'rows':>5}")
+        for label, query in queries:
+            p50, rows = timed(conn, args.repeats, **query)
+            print(f"{label:28} {p50 * 1000:9.2f} {rows:>5}")
+
+        # Keyset paging stays flat however deep the user goes
+        cursor = None
+        page_times = []
+        for _ in range(50):
+            start = time.perf_counter()
+            _, cursor = history._query(conn, now - 30 * day, None, 2.5, None, None, history.PAGE_SIZE, cursor)
+            page_times.append(time.perf_counter() - start)
+        print(f"{'M2.5+ 30 days, page 1 / 50':28} {page_times[0] * 1000:9.2f} / {page_times[-1] * 1000:.2f} ms")
+        conn.close()
+
+if __name__ == "__main__":
+    main()
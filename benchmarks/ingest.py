@@ -0,0 +1,93 @@
+"""Multi-feed ingestion throughput on replayed feed files.
+
+Writes an all_day feed plus overlapping all_hour, 4.5_hour and
+significant_hour feeds (with newer revisions of some events) to a temp
+directory, then replays them through FileSource + Ingestor and reports
+how many features per second are read, parsed and merged.
+
+Run from the repository root:  python -m benchmarks.ingest
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import tempfile
+import time
+
+from ingest import FileSource, Ingestor, merge
+from benchmarks.synthetic import make_feed
+
+def write_feeds(directory, day_count, seed):
+    rng = random.Random(seed)
+    generated = int(time.time() * 1000)
+    day = make_feed(count=day_count, seed=seed, generated=generated)
+    # Spread the events over the whole day, newest first
+    spacing = 24 * 3600 * 1000 // day_count
+    for i, f in enumerate(day["features"]):
+        f["properties"]["time"] = generated - (i + 1) * spacing
+        f["properties"]["updated"] = f["properties"]["time"] + rng.randint(1000, 60000)
+    hour_start = generated - 3600 * 1000
+    hour = [f for f in day["features"] if f["properties"]["time"] >= hour_start]
+
+    # The shorter feeds carry fresher revisions of some of the same events
+    def revised(features):
+        features = copy.deepcopy(features)
+        for f in features:
+            if rng.random() < 0.3:
+                f["properties"]["updated"] += rng.randint(1000, 120000)
+        return features
+
+    feeds = {
+        "all_day": day["features"],
+        "all_hour": revised(hour),
+        "4.5_hour": revised([f for f in hour if f["properties"]["mag"] >= 4.5]),
+        "significant_hour": revised([f for f in hour if f["properties"]["mag"] >= 6.0])
+    }
+    paths = {}
+    for name, features in feeds.items():
+        paths[name] = os.path.join(directory, f"{name}.geojson")
+        with open(paths[name], "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "metadata": {"generated": generated}, "features": features}, f)
+    return paths
+
+async def replay(paths, rounds):
+    features_in = features_out = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        # Fresh sources each round, so every file is read and parsed again
+        ingestor = Ingestor(
+            [FileSource(paths[name]) for name in ("all_hour", "4.5_hour", "significant_hour")],
+            [FileSource(paths["all_day"])]
+        )
+        await ingestor.poll()
+        features_in += ingestor.features_in
+        features_out += ingestor.features_out
+    return time.perf_counter() - start, features_in, features_out
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = write_feeds(tmp, args.day, args.seed)
+        elapsed, features_in, features_out = await replay(paths, args.rounds)
+
+        batches = []
+        for name in paths:
+            with open(paths[name], "rb") as f:
+                batches.append(json.loads(f.read())["features"])
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            merged = merge(batches)
+        merge_elapsed = time.perf_counter() - start
+
+    print(f"{args.rounds} replays of 4 feeds ({features_in // args.rounds} features in, {features_out // args.rounds} events out)")
+    print(f"read + parse + merge  {features_in / elapsed:10.0f} features/s  {elapsed / args.rounds * 1000:7.2f} ms per poll")
+    print(f"merge only            {features_in / merge_elapsed:10.0f} features/s  {merge_elapsed / args.rounds * 1000:7.2f} ms per poll")
+    assert len(merged) == features_out // args.rounds
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--day", type=int, default=8000, help="events in the all_day feed")
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,78 @@
+"""Subscriber matching: the old per-target bbox loop vs SubscriptionIndex.
+
+Run from the repository root:  python -m benchmarks.matching
+"""
+import argparse
+import random
+import time
+
+from matching import SubscriptionIndex
+from regions import REGIONS
+
+def make_regions(count, rng):
+    regions = dict(REGIONS)
+    while len(regions) < count:
+        lat = rng.uniform(-60, 60)
+        lon = rng.uniform(-170, 160)
+        regions[f"Synthetic {len(regions)}"] = [lat, lat + rng.uniform(1, 15), lon, lon + rng.uniform(1, 20)]
+    return regions
+
+def linear_match(targets, regions, lat, lon, mag):
+    # The loop check_earthquakes ran for every target
+    matched = []
+    for key, region, min_mag in targets:
+        if mag < min_mag:
+            continue
+        bounds = regions.get(region)
+        if bounds:
+            lat_min, lat_max, lon_min, lon_max = bounds
+            if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+                continue
+        matched.append(key)
+    return matched
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=100_000)
+    parser.add_argument("--regions", type=int, default=250)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    regions = make_regions(args.regions, rng)
+    names = list(regions)
+    targets = [
+        (("user", i), rng.choice(names), round(rng.uniform(1.0, 7.0), 1))
+        for i in range(args.subscribers)
+    ]
+    events = [
+        (rng.uniform(-60, 70), rng.uniform(-180, 180), round(rng.uniform(2.0, 7.5), 1))
+        for _ in range(args.events)
+    ]
+
+    start = time.perf_counter()
+    index = SubscriptionIndex(regions)
+    for key, region, min_mag in targets:
+        index.add(key, region, min_mag)
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = [linear_match(targets, regions, *event) for event in events]
+    linear = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = [index.match(*event) for event in events]
+    indexed = time.perf_counter() - start
+
+    assert all(set(a) == set(e) for a, e in zip(actual, expected)), "index disagrees with the linear loop"
+
+    matched = sum(len(m) for m in expected)
+    print(f"{args.subscribers} subscribers, {len(regions)} regions, burst of {args.events} events ({matched} matches)")
+    print(f"index build      {build * 1000:10.1f} ms")
+    print(f"linear loop      {linear * 1000:10.1f} ms  ({linear / args.events * 1000:.3f} ms/event)")
+    print(f"indexed match    {indexed * 1000:10.1f} ms  ({indexed / args.events * 1000:.3f} ms/event)")
+    print(f"speedup          {linear / indexed:10.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""What the always-on instrumentation costs: per recording, and per scrape.
+
+Times each kind of recording the bot does on its hot paths against an
+empty loop, then starts a MetricsServer, fills every series and times a
+scrape of /metrics.
+
+Run from the repository root:  python -m benchmarks.metrics
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+import metrics
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+async def scrape(args):
+    for kind in ("channel", "dm"):
+        for outcome in ("delivered", "failed"):
+            metrics.SENDS.labels(kind, outcome).inc()
+        metrics.SEND.labels(kind).observe(0.1)
+    for status in ("200", "304", "error"):
+        metrics.FEED_FETCH.labels(status).observe(0.2)
+
+    server = metrics.MetricsServer(port=args.port)
+    await server.start()
+    async with aiohttp.ClientSession() as session:
+        samples = []
+        for _ in range(args.scrapes):
+            start = time.perf_counter()
+            async with session.get(f"http://127.0.0.1:{args.port}/metrics") as response:
+                body = await response.text()
+            samples.append(time.perf_counter() - start)
+    await server.stop()
+    samples.sort()
+    series = sum(1 for line in body.splitlines() if line and not line.startswith("#"))
+    print(f"scrape: {len(body)} bytes, {series} samples, p50 {samples[len(samples) // 2] * 1000:.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--scrapes", type=int, default=200)
+    parser.add_argument("--port", type=int, default=9198)
+    args = parser.parse_args()
+
+    histogram = metrics.Histogram("bench_seconds", "benchmark only")
+    counter = metrics.Counter("bench", "benchmark only", ["kind"])
+    series = counter.labels("channel")
+
+    def timed_block():
+        with histogram.time():
+            pass
+
+    baseline = per_call_ns(lambda: None, args.calls)
+    print(f"{'recording':34} {'ns/call':>8}")
+    for label, fn in (
+        ("counter.labels(kind).inc()", lambda: counter.labels("channel").inc()),
+        ("cached series .inc()", lambda: series.inc()),
+        ("histogram.observe(x)", lambda: histogram.observe(0.0123)),
+        ("with histogram.time(): pass", timed_block),
+    ):
+        print(f"{label:34} {per_call_ns(fn, args.calls) - baseline:8.0f}")
+    asyncio.run(scrape(args))
+
+if __name__ == "__main__":
+    main()
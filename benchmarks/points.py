@@ -0,0 +1,99 @@
+"""Point/radius subscription matching: Python loop vs NumPy over everything vs the gridded PointIndex.
+
+Subscribers sit around populated areas with radii from 25 to 2000 km
+(plus a few continent-sized ones). The burst is an aftershock swarm
+followed by scattered worldwide events.
+
+Run from the repository root:  python -m benchmarks.points
+"""
+import argparse
+import math
+import random
+import time
+
+import numpy as np
+
+from geo import EARTH_RADIUS_KM, haversine_km
+from matching import PointIndex
+
+CITIES = [(41.0, 29.0), (35.7, 139.7), (34.0, -118.2), (-33.4, -70.6), (37.8, -122.4), (28.6, 77.2),
+          (-6.2, 106.8), (19.4, -99.1), (14.6, 121.0), (38.0, 23.7), (40.4, -3.7), (61.2, -149.9)]
+
+def make_points(rng, count):
+    points = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            lat, lon = rng.choice(CITIES)
+            lat, lon = lat + rng.gauss(0, 2), lon + rng.gauss(0, 2)
+        else:
+            lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+        radius = 5000.0 if rng.random() < 0.001 else rng.choice([25, 50, 100, 200, 300, 500, 1000, 2000])
+        points.append((max(-89.9, min(89.9, lat)), (lon + 180) % 360 - 180, radius, rng.choice([2.5, 3.0, 4.0, 4.5, 5.0])))
+    return points
+
+def make_burst(rng, size):
+    events = []
+    for i in range(size):
+        if i < size // 2:
+            events.append((38.0 + rng.gauss(0, 0.2), 37.5 + rng.gauss(0, 0.2), 6.8 if i == 0 else round(rng.uniform(2.5, 5.0), 1)))
+        else:
+            events.append((rng.uniform(-60, 70), rng.uniform(-180, 180), round(rng.uniform(2.5, 6.0), 1)))
+    return events
+
+def python_loop(points, events):
+    return [
+        [key for key, (lat, lon, radius, min_mag) in enumerate(points) if min_mag <= mag and haversine_km(lat, lon, elat, elon) <= radius]
+        for elat, elon, mag in events
+    ]
+
+def numpy_everything(arrays, events):
+    lat, lon, cos_lat, reach, min_mag = arrays
+    matched = []
+    for elat, elon, mag in events:
+        elat, elon = math.radians(elat), math.radians(elon)
+        a = np.sin((lat - elat) / 2) ** 2 + cos_lat * math.cos(elat) * np.sin((lon - elon) / 2) ** 2
+        matched.append(np.nonzero((a <= reach) & (min_mag <= mag))[0].tolist())
+    return matched
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    points = make_points(rng, args.points)
+    events = make_burst(rng, args.burst)
+
+    index = PointIndex()
+    for key, point in enumerate(points):
+        index.add(key, *point)
+    start = time.perf_counter()
+    index.match(0.0, 0.0, 0.0)
+    build = time.perf_counter() - start
+
+    values = np.array(points)
+    arrays = (
+        np.radians(values[:, 0]), np.radians(values[:, 1]), np.cos(np.radians(values[:, 0])),
+        np.sin(values[:, 2] / EARTH_RADIUS_KM / 2) ** 2, values[:, 3]
+    )
+
+    results = {}
+    print(f"{args.points} point subscriptions, burst of {args.burst} events (index build {build * 1000:.0f} ms)")
+    print(f"{'matcher':22} {'burst ms':>10} {'per event us':>13} {'matches':>9}")
+    for label, run in (
+        ("python haversine loop", lambda: python_loop(points, events)),
+        ("numpy, every point", lambda: numpy_everything(arrays, events)),
+        ("PointIndex (grid)", lambda: index.match_batch(events)),
+    ):
+        start = time.perf_counter()
+        matched = run()
+        elapsed = time.perf_counter() - start
+        results[label] = [sorted(keys) for keys in matched]
+        print(f"{label:22} {elapsed * 1000:10.2f} {elapsed / len(events) * 1e6:13.1f} {sum(map(len, matched)):>9}")
+
+    assert results["PointIndex (grid)"] == results["numpy, every point"] == results["python haversine loop"]
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Detection latency and poll count: the old fixed one-minute loop vs AdaptiveSchedule.
+
+Simulates a day of USGS activity in virtual time. Events are published
+some minutes after origin, the summary feed is regenerated every minute,
+and a swarm follows each notable quake. Each poller only sees an event
+once a regeneration after its publication has happened before the poll.
+
+Run from the repository root:  python -m benchmarks.polling
+"""
+import argparse
+import random
+import statistics
+
+from scheduler import AdaptiveSchedule
+
+FEED_PERIOD = 60.0  # USGS regenerates the summary feeds about once a minute
+
+def simulate_events(rng, hours, rate_per_hour, swarms):
+    events = []  # (published, origin, magnitude)
+    t = 0.0
+    end = hours * 3600
+    while t < end:
+        t += rng.expovariate(rate_per_hour / 3600)
+        events.append((t + rng.uniform(60, 300), t, round(rng.uniform(1.0, 4.0), 1)))
+    for _ in range(swarms):
+        start = rng.uniform(0, end)
+        for i in range(40):
+            origin = start + i * rng.uniform(10, 90)
+            events.append((origin + rng.uniform(60, 240), origin, 5.8 if i == 0 else round(rng.uniform(2.5, 4.8), 1)))
+    events.sort()
+    return events, end
+
+def visible_at(published):
+    # The first regeneration at or after publication carries the event
+    return (published // FEED_PERIOD + 1) * FEED_PERIOD
+
+def run(events, end, next_interval, observe, start=0.0):
+    pending = list(events)
+    latencies = []
+    polls = 0
+    t = start
+    while t < end:
+        polls += 1
+        seen = [e for e in pending if visible_at(e[0]) <= t]
+        if seen:
+            pending = [e for e in pending if visible_at(e[0]) > t]
+            latencies.extend(t - published for published, _, _ in seen)
+        generated = (t // FEED_PERIOD) * FEED_PERIOD * 1000
+        observe(len(seen), max((m for _, _, m in seen), default=None), generated, t)
+        t += next_interval(t)
+    return polls, latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--rate", type=float, default=8, help="background events per hour")
+    parser.add_argument("--swarms", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    events, end = simulate_events(random.Random(args.seed), args.hours, args.rate, args.swarms)
+
+    # The fixed loop's phase against the feed depends on when the bot started
+    rng = random.Random(args.seed)
+    fixed = run(events, end, lambda t: 60.0, lambda *a: None, start=rng.uniform(0, FEED_PERIOD))
+    schedule = AdaptiveSchedule(rng=rng)
+    adaptive = run(
+        events, end, lambda t: schedule.next_interval(now=t),
+        lambda n, mag, gen, t: schedule.observe(n, mag, gen, now=t),
+        start=rng.uniform(0, FEED_PERIOD)
+    )
+
+    print(f"{len(events)} events over {args.hours:g} h ({args.swarms} swarms)")
+    print(f"{'poller':10} {'polls':>7} {'p50 latency':>13} {'p90 latency':>13}")
+    for label, (polls, latencies) in (("fixed 60s", fixed), ("adaptive", adaptive)):
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p90 = latencies[int(len(latencies) * 0.9)]
+        print(f"{label:10} {polls:>7} {p50:>11.1f} s {p90:>11.1f} s")
+
+if __name__ == "__main__":
+    main()
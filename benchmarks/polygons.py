@@ -0,0 +1,103 @@
+"""Region matching accuracy and cost: bounding boxes vs the polygon locator.
+
+Accuracy is checked on places whose country is known (one subscriber per
+region, so every extra match is a false alert), and overlap on synthetic
+events clustered around seismic zones. Cost is the per-event time of
+SubscriptionIndex.match with each engine, before and after the polygon
+locator's per-cell memo has warmed up.
+
+Run from the repository root:  python -m benchmarks.polygons
+"""
+import argparse
+import random
+import statistics
+import time
+
+from matching import SubscriptionIndex
+from polygons import load_locator
+from regions import REGIONS
+
+# (lat, lon, country) for inland places and epicentres with a known country
+KNOWN = [
+    (39.93, 32.86, "Turkey"), (37.17, 37.03, "Turkey"), (38.42, 27.14, "Turkey"), (41.72, 44.79, "Georgia"),
+    (40.18, 44.51, "Armenia"), (35.69, 51.39, "Iran, Islamic Republic of"), (33.51, 36.28, "Syrian Arab Republic"),
+    (31.95, 35.93, "Jordan"), (33.89, 35.50, "Lebanon"), (32.08, 34.78, "Israel"), (37.98, 23.73, "Greece"),
+    (42.70, 23.32, "Bulgaria"), (44.43, 26.10, "Romania"), (41.33, 19.82, "Albania"), (42.44, 19.26, "Montenegro"),
+    (41.90, 12.50, "Italy"), (46.95, 7.45, "Switzerland"), (40.42, -3.70, "Spain"), (34.02, -6.84, "Morocco"),
+    (36.75, 3.06, "Algeria"), (35.68, 139.69, "Japan"), (37.57, 126.98, "Korea, Republic of"),
+    (39.90, 116.40, "China"), (27.72, 85.32, "Nepal"), (28.61, 77.21, "India"), (33.69, 73.05, "Pakistan"),
+    (34.53, 69.17, "Afghanistan"), (38.56, 68.78, "Tajikistan"), (42.87, 74.59, "Kyrgyzstan"),
+    (14.60, 120.98, "Philippines"), (-6.21, 106.85, "Indonesia"), (19.43, -99.13, "Mexico"),
+    (14.63, -90.51, "Guatemala"), (13.69, -89.19, "El Salvador"), (12.11, -86.24, "Nicaragua"),
+    (9.93, -84.08, "Costa Rica"), (4.71, -74.07, "Colombia"), (-0.18, -78.47, "Ecuador"), (-12.05, -77.04, "Peru"),
+    (-16.50, -68.15, "Bolivia, Plurinational State of"), (-33.45, -70.67, "Chile"), (-34.60, -58.38, "Argentina"),
+    (-32.89, -68.83, "Argentina"), (61.22, -149.90, "United States"), (34.05, -118.24, "United States"),
+    (49.28, -123.12, "Canada"), (-41.29, 174.78, "New Zealand"), (-35.28, 149.13, "Australia"),
+    (9.03, 38.74, "Ethiopia"), (-1.29, 36.82, "Kenya"), (-6.79, 39.21, "Tanzania, United Republic of"),
+    # Coastal cities, where the 1:110m outlines are least exact
+    (41.01, 28.97, "Turkey"), (38.72, -9.14, "Portugal"), (35.68, 139.77, "Japan"), (-33.05, -71.62, "Chile"),
+    (40.85, 14.27, "Italy"), (34.69, 135.19, "Japan"), (35.18, 129.08, "Korea, Republic of"),
+    (36.88, 30.70, "Turkey"), (37.77, -122.42, "United States"), (-41.29, 174.78, "New Zealand"),
+]
+
+ZONES = [(38.5, 35.0), (36.0, 140.0), (-33.0, -71.0), (61.0, -150.0), (-6.0, 130.0), (28.0, 84.0), (15.0, -92.0)]
+
+def make_events(rng, count):
+    events = []
+    for _ in range(count):
+        if rng.random() < 0.7:
+            lat, lon = rng.choice(ZONES)
+            lat, lon = lat + rng.gauss(0, 4), lon + rng.gauss(0, 4)
+        else:
+            lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+        events.append((max(-89.0, min(89.0, lat)), (lon + 180) % 360 - 180, round(rng.uniform(2.5, 6.5), 1)))
+    return events
+
+def per_event_us(index, events):
+    start = time.perf_counter()
+    for lat, lon, mag in events:
+        index.match(lat, lon, mag)
+    return (time.perf_counter() - start) / len(events) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=19)
+    args = parser.parse_args()
+
+    missing = [name for _, _, name in KNOWN if name not in REGIONS]
+    assert not missing, missing
+
+    bbox = SubscriptionIndex(REGIONS)
+    polygon = SubscriptionIndex(REGIONS, locator=load_locator())
+    for index in (bbox, polygon):
+        for name in REGIONS:
+            if REGIONS[name]:
+                index.add(name, name, 0.0)
+
+    print(f"{'engine':8} {'known places':>13} {'false alerts':>13} {'missed':>7} {'regions/event':>14} {'>1 region':>10}")
+    events = make_events(random.Random(args.seed), args.events)
+    for label, index in (("bbox", bbox), ("polygon", polygon)):
+        right = wrong = missed = 0
+        for lat, lon, country in KNOWN:
+            matched = index.match(lat, lon, 5.0)
+            right += country in matched
+            missed += country not in matched
+            wrong += sum(1 for name in matched if name != country)
+        counts = [len(index.match(lat, lon, mag)) for lat, lon, mag in events]
+        multi = sum(1 for c in counts if c > 1) / len(counts)
+        print(f"{label:8} {right:>6}/{len(KNOWN):<6} {wrong:>13} {missed:>7} {statistics.mean(counts):>14.2f} {multi:>9.0%}")
+
+    # Timing on a fresh locator so the first pass pays for the memo
+    polygon = SubscriptionIndex(REGIONS, locator=load_locator())
+    for name in REGIONS:
+        if REGIONS[name]:
+            polygon.add(name, name, 0.0)
+    print()
+    print(f"{'engine':24} {'us/event':>9}")
+    print(f"{'bbox':24} {per_event_us(bbox, events):9.1f}")
+    print(f"{'polygon (cold memo)':24} {per_event_us(polygon, events):9.1f}")
+    print(f"{'polygon (warm memo)':24} {per_event_us(polygon, events):9.1f}")
+
+if __name__ == "__main__":
+    main()
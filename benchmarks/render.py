@@ -0,0 +1,44 @@
+"""Embed rendering cost per event as a function of recipient count.
+
+"per recipient" rebuilds the embed for every target, as dispatch used to;
+"cached" renders once per (event, region, template) through AlertRenderer.
+
+Run from the repository root:  python -m benchmarks.render
+"""
+import argparse
+import random
+import time
+
+import render
+from regions import REGIONS
+from benchmarks.synthetic import make_feature
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipients", type=int, nargs="+", default=[1, 10, 100, 1000, 5000])
+    parser.add_argument("--regions", type=int, default=5, help="distinct regions among the recipients")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    regions = [name for name in REGIONS if name != "World"][:args.regions]
+
+    print(f"{'recipients':>10} {'per recipient':>15} {'cached':>12} {'renders':>8}")
+    for count in args.recipients:
+        feature = make_feature(rng, f"rb{count}", int(time.time() * 1000))
+        targets = [rng.choice(regions) for _ in range(count)]
+
+        start = time.perf_counter()
+        for region in targets:
+            render.build_alert_embed(feature, region, render.SERVER)
+        rebuilt = time.perf_counter() - start
+
+        renderer = render.AlertRenderer()
+        start = time.perf_counter()
+        for region in targets:
+            renderer.render(feature, region, render.SERVER)
+        cached = time.perf_counter() - start
+
+        print(f"{count:>10} {rebuilt * 1000:>12.2f} ms {cached * 1000:>9.2f} ms {renderer.renders:>8}")
+
+if __name__ == "__main__":
+    main()
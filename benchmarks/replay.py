@@ -0,0 +1,367 @@
+"""End-to-end replay of the alert pipeline against a fake Discord.
+
+Feeds are replayed one per poll through bot.poll_feed and bot.dispatch_new,
+so ingest, the seen-event store, history, matching, rendering, the
+dispatcher and the journal all run as they do live. Only the network ends
+are fake: a ReplaySource instead of USGS, and a gateway whose channels and
+DMs post to FakeDiscord (latency plus Discord's rate limits). botdata.db is
+seeded with guild channels, group chats, region and point subscribers.
+
+By default the feeds are synthetic: a few worldwide events per poll and an
+aftershock swarm mid-run. Pass recorded GeoJSON files (one poll each, in
+order) with --feeds. Results are printed, and written as JSON with --output
+so runs of different versions can be compared.
+
+Polls are --interval real seconds apart for a minute of feed time each, so
+the coalescing --window is in the same compressed time: the default of 2 s
+spans four polls. --window 0 sends one message per event per target.
+
+Run from the repository root:  python -m benchmarks.replay --output replay.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+import aiohttp
+import discord
+
+import bot as bot_module
+import database
+import history
+from benchmarks.fake_discord import BOT_USER_ID, FakeDiscord
+from benchmarks.synthetic import make_feature, make_swarm
+from coalesce import Coalescer
+from ingest import FeedSource, Ingestor
+from journal import AlertJournal
+from regions import REGIONS
+from users import UserResolver
+from webhooks import WebhookSender
+
+HOUR_MS = 3600 * 1000
+POLL_MS = 60 * 1000  # feed time between replayed polls
+CITIES = [(38.4, 27.1), (39.9, 32.9), (41.0, 29.0), (35.7, 139.7), (34.0, -118.2), (-33.4, -70.6), (14.6, 121.0)]
+
+# =======================================================
+# Feeds
+# =======================================================
+
+class ReplaySource(FeedSource):
+    """Hands out prepared feeds one per poll: a list of (generated, features)."""
+
+    name = "replay"
+
+    def __init__(self, feeds):
+        self.feeds = list(feeds)
+        self.position = 0
+        self.generated = None
+
+    async def poll(self):
+        if self.position >= len(self.feeds):
+            return None
+        self.generated, features = self.feeds[self.position]
+        self.position += 1
+        return features
+
+def synthetic_feeds(polls, background, swarm, seed):
+    """all_hour-style feeds: a few new events worldwide each poll, and a swarm near Izmir from a third of the way in."""
+    rng = random.Random(seed)
+    start = int(time.time() * 1000) - polls * POLL_MS
+    events = [
+        make_feature(rng, f"rp{i:06d}", start - rng.randrange(HOUR_MS) + i // background * POLL_MS)
+        for i in range(polls * background)
+    ]
+    swarm_start = start + polls // 3 * POLL_MS
+    events += make_swarm(swarm, seed, lat=38.4, lon=26.8, start=swarm_start, spacing_ms=POLL_MS * polls // 2 // max(swarm, 1))["features"]
+
+    feeds = []
+    for i in range(polls):
+        generated = start + i * POLL_MS
+        window = [f for f in events if generated - HOUR_MS < f["properties"]["time"] <= generated]
+        window.sort(key=lambda f: f["properties"]["time"], reverse=True)
+        feeds.append((generated, window))
+    return feeds
+
+def recorded_feeds(paths):
+    feeds = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        feeds.append((data.get("metadata", {}).get("generated"), data["features"]))
+    return feeds
+
+# =======================================================
+# Seeded Database
+# =======================================================
+
+def snowflake(rng):
+    return (rng.randrange(1 << 38, 1 << 40) << 22) | rng.randrange(1 << 22)
+
+def _seed(conn, targets, webhook_channels, subscribers, points):
+    database.migrate(conn)
+    conn.executemany(database.REPLACE_ALERT_TARGET, targets)
+    conn.executemany(database.INSERT_WEBHOOK_CHANNEL, webhook_channels)
+    conn.executemany(database.REPLACE_SUBSCRIBER, subscribers)
+    conn.executemany(database.REPLACE_POINT_SUBSCRIBER, points)
+
+async def seed(args):
+    """Guild channels (--webhooks of them by webhook), group chats, region and point subscribers; a third want Turkey."""
+    rng = random.Random(args.seed)
+    names = [name for name in REGIONS if REGIONS[name]]
+
+    def region():
+        return "Turkey" if rng.random() < 0.3 else rng.choice(names)
+
+    targets = []
+    for _ in range(args.guilds):
+        guild_id = snowflake(rng)
+        for _ in range(rng.choice([1, 1, 1, 2])):
+            targets.append((snowflake(rng), guild_id, rng.choice([3.0, 4.0, 4.5, 5.0]), region()))
+    picker = random.Random(args.seed + 1)  # keeps the rest of the seeded data the same for any --webhooks
+    webhook_channels = [(channel_id,) for channel_id, *_ in targets if picker.random() < args.webhooks]
+    targets += [(snowflake(rng), None, rng.choice([3.0, 4.5]), region()) for _ in range(args.chats)]
+    subscribers = [(snowflake(rng), region(), rng.choice([3.5, 4.5, 5.5])) for _ in range(args.subscribers)]
+    points = []
+    for _ in range(args.points):
+        lat, lon = rng.choice(CITIES)
+        points.append((snowflake(rng), lat + rng.gauss(0, 1), lon + rng.gauss(0, 1), rng.choice([100, 300, 1000]), rng.choice([3.0, 4.5])))
+
+    await database.run(_seed, targets, webhook_channels, subscribers, points)
+    await database.init_db()
+    return [channel_id for channel_id, *_ in targets]
+
+# =======================================================
+# Fake Gateway
+# =======================================================
+
+class FakeChannel:
+    def __init__(self, gateway, channel_id):
+        self.gateway = gateway
+        self.id = channel_id
+
+    async def send(self, embed=None, embeds=(), **kwargs):
+        # Like discord.py's HTTP client: sleep out a 429 and retry, up to 5 tries
+        gateway = self.gateway
+        payload = {"embeds": [e.to_dict() for e in ([embed] if embed else embeds)]}
+        for _ in range(5):
+            async with gateway.session.post(f"{gateway.url}/channels/{self.id}/messages", json=payload) as response:
+                if response.status != 429:
+                    response.raise_for_status()
+                    return
+                gateway.rate_limited += 1
+                await asyncio.sleep((await response.json())["retry_after"])
+        raise RuntimeError("429 rate limited")
+
+class FakeUser:
+    def __init__(self, gateway, user_id):
+        self.gateway = gateway
+        self.id = user_id
+        self.dm_channel = None
+
+    async def create_dm(self):
+        async with self.gateway.session.post(f"{self.gateway.url}/users/@me/channels", json={"recipient_id": self.id}) as response:
+            response.raise_for_status()
+        self.dm_channel = FakeChannel(self.gateway, self.id)
+        return self.dm_channel
+
+class FakeGateway:
+    """Stands in for the bot's gateway cache and REST client, posting to FakeDiscord."""
+
+    def __init__(self, session, url, channel_ids):
+        self.session = session
+        self.url = url
+        self.channels = {channel_id: FakeChannel(self, channel_id) for channel_id in channel_ids}
+        self.ingested = {}   # event id -> perf_counter() when its poll started
+        self.latencies = []  # ingest -> send, seconds
+        self.rate_limited = 0
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_user(self, user_id):
+        return None
+
+    # The bot's `http` and `user`, as far as WebhookSender uses them
+    @property
+    def http(self):
+        return self
+
+    @property
+    def user(self):
+        return FakeUser(self, BOT_USER_ID)
+
+    async def channel_webhooks(self, channel_id):
+        async with self.session.get(f"{self.url}/channels/{channel_id}/webhooks") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def create_webhook(self, channel_id, name, reason=None):
+        async with self.session.post(f"{self.url}/channels/{channel_id}/webhooks", json={"name": name}) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def fetch_user(self, user_id):
+        await asyncio.sleep(0)
+        return FakeUser(self, user_id)
+
+    def on_delivery(self, delivery, latency, error):
+        # A digest delivers every event it lists
+        if error is None:
+            now = time.perf_counter()
+            for event_id in delivery.events or [delivery.report.event_id]:
+                self.latencies.append(now - self.ingested[event_id])
+
+# =======================================================
+# Replay
+# =======================================================
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        if not statement.startswith(("BEGIN", "COMMIT", "ROLLBACK")):
+            self.count += 1
+
+def _trace(conn, callback):
+    conn.set_trace_callback(callback)
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+async def replay(args, tmp):
+    database.DB_FILE = os.path.join(tmp, "botdata.db")
+    history.HISTORY_FILE = os.path.join(tmp, "history.db")
+    channel_ids = await seed(args)
+
+    feeds = recorded_feeds(args.feeds) if args.feeds else synthetic_feeds(args.polls, args.background, args.swarm, args.seed)
+    bot_module.ingestor = Ingestor([ReplaySource(feeds)])
+    bot_module.journal = AlertJournal(path=os.path.join(tmp, "alerts.jsonl"))
+
+    fake = FakeDiscord(latency=args.latency)
+    url = await fake.start()
+    queries = QueryCounter()
+    await database.run(_trace, queries)
+    await history.run(_trace, queries)
+
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=64)) as session:
+        gateway = FakeGateway(session, url, channel_ids)
+        bot_module.ALERT_CHANNEL_TYPES = (FakeChannel,)
+        bot_module.bot.get_channel = gateway.get_channel
+        bot_module.user_resolver = UserResolver(gateway)
+        # Webhook messages go out through discord.py's own webhook client
+        discord.http.Route.BASE = url
+        webhooks = bot_module.webhooks = WebhookSender(gateway)
+        journal_delivery = bot_module.dispatcher.on_delivery
+
+        def on_delivery(delivery, latency, error):
+            journal_delivery(delivery, latency, error)
+            gateway.on_delivery(delivery, latency, error)
+        bot_module.dispatcher.on_delivery = on_delivery
+
+        reports = []
+
+        def submit_digest(event_id, magnitude, deliveries):
+            reports.append(bot_module.dispatcher.submit(event_id, magnitude, deliveries))
+        coalescer = bot_module.coalescer = Coalescer(submit_digest, bot_module.renderer, window=args.window,
+                                                    wanted=bot_module.still_subscribed)
+        bot_module.journal.start()
+        bot_module.dispatcher.start()
+
+        events = 0
+        batches = 0
+        pipeline = 0.0
+        start = time.perf_counter()
+        for _ in feeds:
+            polled = time.perf_counter()
+            features, new_features = await bot_module.poll_feed()
+            for feature in new_features:
+                gateway.ingested[feature["id"]] = polled
+            reports += await bot_module.dispatch_new(new_features)
+            pipeline += time.perf_counter() - polled
+            events += len(new_features)
+            batches += bool(new_features)
+            await asyncio.sleep(args.interval)
+        while not coalescer.idle():
+            await asyncio.sleep(0.05)
+        await asyncio.gather(*(report.done.wait() for report in reports))
+        elapsed = time.perf_counter() - start
+
+        await bot_module.dispatcher.stop()
+        await bot_module.journal.close()
+        await webhooks.close()
+    await fake.stop()
+    await database.run(_trace, None)
+    await asyncio.gather(*bot_module.history_writes)
+    await history.run(_trace, None)
+
+    deliveries = sum(report.total for report in reports)
+    return {
+        "polls": len(feeds),
+        "events": events,
+        "deliveries": deliveries,
+        "delivered": sum(report.delivered for report in reports),
+        "failed": sum(report.failed for report in reports),
+        "rate_limited": gateway.rate_limited,
+        "rate_limited_global": fake.rejected_global,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(events / elapsed, 2) if elapsed else None,
+        "pipeline_events_per_s": round(events / pipeline, 1) if pipeline else None,
+        "ingest_to_send_p50_ms": round(percentile(gateway.latencies, 0.5) * 1000, 1) if gateway.latencies else None,
+        "ingest_to_send_p99_ms": round(percentile(gateway.latencies, 0.99) * 1000, 1) if gateway.latencies else None,
+        "sqlite_queries": queries.count,
+        "sqlite_queries_per_event": round(queries.count / events, 2) if events else None,
+        "rest_calls": len(fake.accepted),
+        "rest_calls_per_event": round(len(fake.accepted) / events, 2) if events else None,
+        "messages_per_batch": round(len(fake.accepted) / batches, 2) if batches else None,
+        "webhook_messages": sum(1 for _, route, _ in fake.accepted if route.startswith("webhook:")),
+        "webhooks_created": fake.webhooks_created,
+        "alerts_immediate": coalescer.immediate,
+        "alerts_coalesced": coalescer.coalesced,
+        "digests": coalescer.digests,
+        "alerts_dropped": coalescer.dropped,
+        "user_resolver": bot_module.user_resolver.stats(),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log) if not args.verbose else contextlib.nullcontext():
+            results = await replay(args, tmp)
+        await database.close_db()
+        await history.close_history()
+
+    results["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "verbose")}
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--feeds", nargs="*", help="recorded GeoJSON feeds, replayed one per poll")
+    parser.add_argument("--polls", type=int, default=30)
+    parser.add_argument("--background", type=int, default=3, help="new worldwide events per synthetic poll")
+    parser.add_argument("--swarm", type=int, default=60, help="aftershocks in the synthetic swarm")
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=50)
+    parser.add_argument("--subscribers", type=int, default=300)
+    parser.add_argument("--points", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Discord response time, seconds")
+    parser.add_argument("--interval", type=float, default=0.5, help="real seconds between replayed polls")
+    parser.add_argument("--window", type=float, default=2.0, help="coalescing window in real seconds, 0 sends every alert on its own")
+    parser.add_argument("--webhooks", type=float, default=0.0, help="share of guild channels set to webhook delivery")
+    parser.add_argument("--seed", type=int, default=21)
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own log lines")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,180 @@
+"""Exactly-once delivery across shard worker processes.
+
+Seeds a temporary botdata.db with guild channels, DM/GC targets and DM
+subscribers, starts a coordinator (an EventBroadcaster fed with synthetic
+feeds) and one process per worker. Each worker loads its own subscription
+index for the shards it owns and posts its deliveries to a fake Discord
+REST API, which stands in for the gateway sessions. One worker adds a DM
+subscriber through the relay mid-run, and another drops its coordinator
+connection and reconnects. Every (event, target) the unsharded index
+matches must arrive exactly once.
+
+Run from the repository root:  python -m benchmarks.shards
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+import aiohttp
+
+import database
+from benchmarks.fake_discord import FakeDiscord
+from benchmarks.synthetic import make_feed
+from regions import REGIONS
+from shards import EventBroadcaster, ShardLink, ownership, shard_for, split_shards
+
+RELAYED_USER = 7_000_000  # subscribed by a worker that doesn't run shard 0
+
+def snowflake(rng):
+    return (rng.randrange(1 << 38, 1 << 40) << 22) | rng.randrange(1 << 22)
+
+async def seed(path, args):
+    rng = random.Random(args.seed)
+    regions = list(REGIONS)
+    database.DB_FILE = path
+    await database.init_db()
+    for _ in range(args.guilds):
+        guild_id = snowflake(rng)
+        for _ in range(rng.randint(1, 3)):
+            await database.set_alert_channel(guild_id, snowflake(rng), rng.choice([2.5, 3.0, 4.0, 5.0]), rng.choice(regions))
+    for i in range(args.chats):
+        await database.set_alert_channel(None, snowflake(rng), rng.choice([2.5, 4.0]), rng.choice(regions))
+    for i in range(args.users):
+        await database.add_subscriber(5_000_000 + i, rng.choice(regions), rng.choice([3.0, 4.5]))
+    await database.close_db()
+
+async def post(session, url, route, event_id):
+    async with session.post(f"{url}/channels/{route}/messages", json={"content": event_id}) as response:
+        response.raise_for_status()
+
+async def worker(index, shard_ids, shard_count, port, token, path, url, drop_after):
+    database.DB_FILE = path
+    database.set_ownership(ownership(shard_ids, shard_count))
+    await database.init_db()
+    link = ShardLink("127.0.0.1", port, shard_ids, token, retry=0.05)
+
+    feeds = 0
+    async with aiohttp.ClientSession() as session:
+        async for message in link.messages():
+            if message["type"] == "done":
+                break
+            if message["type"] == "start":
+                # Workers that connect later get no replay, so relay only once all are connected
+                if 0 not in shard_ids and index == 1:
+                    await database.add_point_subscriber(RELAYED_USER, 0.0, 0.0, 20000.0, 0.0)
+                    link.send({"type": "subscriber", "user_id": RELAYED_USER})
+                continue
+            if message["type"] == "subscriber":
+                await database.refresh_subscriber(message["user_id"])
+                continue
+
+            new_ids = set(message["new"])
+            sends = []
+            for feature in message["features"]:
+                if feature["id"] not in new_ids:
+                    continue
+                lon, lat = feature["geometry"]["coordinates"][:2]
+                channels, subscribers = database.match_alert_targets(lat, lon, feature["properties"]["mag"])
+                sends += [post(session, url, channel_id, feature["id"]) for _, channel_id, _, _ in channels]
+                sends += [post(session, url, user_id, feature["id"]) for user_id, _, _ in subscribers]
+            await asyncio.gather(*sends)
+
+            feeds += 1
+            if feeds == drop_after:
+                link._writer.transport.abort()
+    await database.close_db()
+
+def worker_process(*args):
+    asyncio.run(worker(*args))
+
+async def expected(path, broadcasts):
+    database.DB_FILE = path
+    database.set_ownership(None)
+    await database.init_db()
+    wanted = set()
+    for features in broadcasts:
+        for feature in features:
+            lon, lat = feature["geometry"]["coordinates"][:2]
+            channels, subscribers = database.match_alert_targets(lat, lon, feature["properties"]["mag"])
+            wanted.update((str(channel_id), feature["id"]) for _, channel_id, _, _ in channels)
+            wanted.update((str(user_id), feature["id"]) for user_id, _, _ in subscribers)
+    await database.close_db()
+    return wanted
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "botdata.db")
+        await seed(path, args)
+
+        fake = FakeDiscord(latency=0.0, global_limit=10**9, route_limit=10**9)
+        url = await fake.start()
+        token = os.urandom(8).hex()
+        broadcaster = EventBroadcaster("127.0.0.1", 0, token)
+        await broadcaster.start()
+
+        spawn = multiprocessing.get_context("spawn")
+        workers = [
+            spawn.Process(target=worker_process, args=(
+                index, shard_ids, args.shards, broadcaster.port, token, path, url,
+                args.feeds // 2 if index == args.processes - 1 else None
+            ))
+            for index, shard_ids in enumerate(split_shards(args.shards, args.processes))
+        ]
+        for process in workers:
+            process.start()
+        await broadcaster.wait_for_workers(args.processes)
+        await broadcaster.publish({"type": "start"})
+        if args.processes > 1:
+            while broadcaster.seq < 2:  # the relayed subscription goes out before any event
+                await asyncio.sleep(0.01)
+
+        start = time.perf_counter()
+        broadcasts = []
+        reconnects = 0
+        for i in range(args.feeds):
+            features = make_feed(args.events, seed=args.seed * 1000 + i)["features"]
+            broadcasts.append(features)
+            await broadcaster.broadcast(features, [f["id"] for f in features])
+            if i + 1 == args.feeds // 2:
+                # Keep broadcasting only once the dropping worker has gone, so it misses some
+                while len(broadcaster._workers) == args.processes:
+                    await asyncio.sleep(0.005)
+                reconnects += 1
+            await asyncio.sleep(0.02)
+        await broadcaster.publish({"type": "done"})
+        for process in workers:
+            await asyncio.get_running_loop().run_in_executor(None, process.join)
+        elapsed = time.perf_counter() - start
+        await broadcaster.close()
+        await fake.stop()
+
+        wanted = await expected(path, broadcasts)
+        got = Counter((route.split(":", 1)[1], payload["content"]) for _, route, payload in fake.accepted)
+        duplicates = sum(count - 1 for count in got.values() if count > 1)
+        missing = len(wanted - set(got))
+        extra = len(set(got) - wanted)
+        relayed = sum(1 for route, _ in got if route == str(RELAYED_USER))
+
+        owners = Counter(shard_for(guild_id, args.shards) for guild_id, *_ in database.get_all_alert_channels() if guild_id)
+        print(f"{args.processes} workers, {args.shards} shards, guild channels per shard {sorted(owners.values())}, {reconnects} reconnect")
+        print(f"{args.feeds * args.events} events, {len(wanted)} expected deliveries ({relayed} to the relayed subscriber)")
+        print(f"delivered {sum(got.values())} in {elapsed:.2f} s: {duplicates} duplicates, {missing} missing, {extra} unexpected")
+        assert all(process.exitcode == 0 for process in workers)
+        assert duplicates == missing == extra == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--guilds", type=int, default=1500)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--feeds", type=int, default=10)
+    parser.add_argument("--events", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,90 @@
+"""Cold start: process start to alert-ready, and whether the command tree is synced.
+
+Seeds a botdata.db, then starts fresh interpreters that import bot.py and
+run its setup_hook the way login does, with the feed replaced by a local
+file and tree.sync by a stub that takes --sync-cost seconds (a real sync
+is one bulk-overwrite request per scope, and rate limited). The first
+start syncs; later ones find the tree's hash unchanged and skip it.
+
+Run from the repository root:  python -m benchmarks.startup
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import database
+from benchmarks import replay
+from benchmarks.synthetic import make_feed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import asyncio, json, sys, time
+import bot
+imported = time.monotonic() - bot.STARTED
+
+from ingest import FileSource, Ingestor
+bot.ingestor = Ingestor([FileSource(sys.argv[1])])
+synced = []
+
+async def fake_sync(*args, **kwargs):
+    await asyncio.sleep(float(sys.argv[2]))
+    synced.append(True)
+    return []
+bot.tree.sync = fake_sync
+
+async def main():
+    await bot.bot.setup_hook()
+    while bot.alert_ready is None:
+        await asyncio.sleep(0.005)
+    await bot.bot.sync_task
+    bot.check_earthquakes.cancel()
+    await bot.dispatcher.stop()
+    await bot.journal.close()
+    await bot.close_db()
+    await asyncio.gather(*bot.history_writes)
+    await bot.close_history()
+    await bot.http_session.close()
+    return {"import_s": round(imported, 3), "alert_ready_s": round(bot.alert_ready, 3), "synced": bool(synced)}
+
+print("RESULT " + json.dumps(asyncio.run(main())))
+"""
+
+def start_once(tmp, feed_path, sync_cost):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD, feed_path, str(sync_cost)],
+        cwd=tmp, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.split("RESULT ", 1)[1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--starts", type=int, default=3)
+    parser.add_argument("--guilds", type=int, default=5000)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--sync-cost", type=float, default=2.0, help="seconds the stubbed tree.sync takes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_FILE = os.path.join(tmp, "botdata.db")
+        seed_args = argparse.Namespace(seed=23, guilds=args.guilds, chats=args.guilds // 10, subscribers=args.subscribers, points=args.subscribers // 5, webhooks=0)
+        asyncio.run(replay.seed(seed_args))
+        asyncio.run(database.close_db())
+
+        feed_path = os.path.join(tmp, "all_hour.geojson")
+        with open(feed_path, "w", encoding="utf-8") as f:
+            json.dump(make_feed(200, seed=23), f)
+
+        print(f"{args.guilds} guilds, {args.subscribers} subscribers, tree.sync stub {args.sync_cost:.1f} s")
+        print(f"{'start':6} {'import s':>9} {'alert-ready s':>14} {'synced':>7}")
+        for number in range(1, args.starts + 1):
+            result = start_once(tmp, feed_path, args.sync_cost)
+            print(f"{number:<6} {result['import_s']:9.2f} {result['alert_ready_s']:14.2f} {str(result['synced']):>7}")
+
+if __name__ == "__main__":
+    main()
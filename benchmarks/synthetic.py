@@ -0,0 +1,70 @@
+import json
+import random
+import time
+
+# =======================================================
+# Synthetic USGS GeoJSON feeds
+# =======================================================
+
+def make_feature(rng, event_id, quake_time, lat=None, lon=None, mag=None):
+    lat = round(rng.uniform(-60.0, 70.0), 4) if lat is None else lat
+    lon = round(rng.uniform(-180.0, 180.0), 4) if lon is None else lon
+    mag = round(rng.uniform(0.5, 7.5), 1) if mag is None else mag
+    return {
+        "type": "Feature",
+        "properties": {
+            "mag": mag,
+            "place": f"{rng.randint(1, 90)} km of Somewhere",
+            "time": quake_time,
+            "updated": quake_time + rng.randint(1000, 60000),
+            "url": f"https://earthquake.usgs.gov/earthquakes/eventpage/{event_id}",
+            "type": "earthquake"
+        },
+        "geometry": {"type": "Point", "coordinates": [lon, lat, round(rng.uniform(0, 80), 2)]},
+        "id": event_id
+    }
+
+def make_feed(count=200, seed=0, generated=None, start=None):
+    rng = random.Random(seed)
+    generated = generated or int(time.time() * 1000)
+    start = start or generated - 3600 * 1000
+    features = [
+        make_feature(rng, f"sy{seed:04d}{i:05d}", start + i * (3600 * 1000 // max(count, 1)))
+        for i in range(count)
+    ]
+    features.reverse()  # USGS lists newest first
+    return {
+        "type": "FeatureCollection",
+        "metadata": {
+            "generated": generated,
+            "url": "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson",
+            "title": "USGS All Earthquakes, Past Hour",
+            "status": 200,
+            "api": "1.10.3",
+            "count": count
+        },
+        "features": features
+    }
+
+def make_swarm(count=50, seed=0, lat=38.0, lon=37.5, start=None, spacing_ms=20000):
+    """An aftershock sequence clustered around one epicenter, newest first."""
+    rng = random.Random(seed)
+    start = start or int(time.time() * 1000) - count * spacing_ms
+    features = []
+    for i in range(count):
+        mag = 6.8 if i == 0 else round(max(1.0, rng.gauss(3.2, 0.8)), 1)
+        features.append(make_feature(
+            rng, f"sw{seed:04d}{i:05d}", start + i * spacing_ms,
+            lat=round(lat + rng.gauss(0, 0.2), 4),
+            lon=round(lon + rng.gauss(0, 0.2), 4),
+            mag=mag
+        ))
+    features.reverse()
+    return {
+        "type": "FeatureCollection",
+        "metadata": {"generated": start + count * spacing_ms, "count": count},
+        "features": features
+    }
+
+def dumps(feed):
+    return json.dumps(feed, separators=(",", ":")).encode()
@@ -1,26 +1,63 @@
-import os
-import sqlite3
-import requests
+import time
+STARTED = time.monotonic()  # before the imports below, for time-to-alert-ready
+
+import asyncio
+import hashlib
 import json
+import os
 import random
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import partial
+from typing import Optional
 
 import discord
 from discord.ext import tasks
-from discord.ext.commands import Bot
+from discord.ext.commands import AutoShardedBot, Bot
 from discord import app_commands
 
-import pycountry
 from dotenv import load_dotenv
 
+from feed import USGS_FEED_URL, FeedClient, create_session
+from ingest import FEEDS, CATCH_UP_FEEDS, event_aliases, usgs_ingestor
+from snapshot import SNAPSHOT_MAX_AGE, FeedSnapshot
+from history import record_events, query_events, close_history
+from regions import REGIONS, flag_emoji
+from autocomplete import region_search
+from dispatcher import AlertDispatcher, CHANNEL, DM
+from coalesce import COALESCE_WINDOW, Coalescer, Target
+from webhooks import MAX_EMBEDS, WebhookSender
+from users import DMClosed, UserResolver
+from journal import JOURNAL_FILE, AlertJournal
+from scheduler import POLL_START, AdaptiveSchedule, LatencyTracker
+import render
+from metrics import ALERT_READY, AUTOCOMPLETE, MATCH, NEW_EVENTS, POLL, MetricsServer
+from shards import ShardLink, ownership, parse_shard_ids
 from database import (
-    DB_FILE,
     init_db,
+    close_db,
     set_alert_channel,
-    get_alert_channel,
+    get_alert_channels,
+    get_chat_channel,
+    is_alert_target,
+    get_subscriber,
+    get_point_subscriber,
+    match_alert_targets,
+    use_region_locator,
+    set_ownership,
+    refresh_subscriber,
+    set_webhook_delivery,
+    uses_webhook,
+    remove_alert_channel,
+    remove_chat_channel,
     add_subscriber,
     remove_subscriber,
-    get_all_subscribers_with_filters
+    add_point_subscriber,
+    remove_point_subscriber,
+    get_setting,
+    set_setting,
+    has_seen_events,
+    claim_new_events,
+    evict_seen_events
 )
 
 # =======================================================
@@ -29,191 +66,279 @@ from database import (
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
-USGS_FEED_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
-last_earthquake_time = None
+
+# REGION_ENGINE=polygon matches countries by outline instead of bounding box
+if os.getenv("REGION_ENGINE", "bbox") == "polygon":
+    from polygons import load_locator
+    use_region_locator(load_locator())
+http_session = None  # created in setup_hook; every USGS source and the webhook sender share it
+feed_client = FeedClient(USGS_FEED_URL)  # /recent's own conditional fetch, when the poller falls behind
+
+def feed_list(value, default):
+    return tuple(f.strip() for f in value.split(",") if f.strip()) if value is not None else default
+
+ingestor = usgs_ingestor(
+    feeds=feed_list(os.getenv("USGS_FEEDS"), FEEDS),
+    catch_up=feed_list(os.getenv("USGS_CATCHUP_FEEDS"), CATCH_UP_FEEDS)
+)
+latest_feed = FeedSnapshot(max_age=float(os.getenv("SNAPSHOT_MAX_AGE", SNAPSHOT_MAX_AGE)))
+
+# METRICS_PORT serves Prometheus metrics on 127.0.0.1
+METRICS_PORT = os.getenv("METRICS_PORT")
+metrics_server = MetricsServer(port=int(METRICS_PORT)) if METRICS_PORT else None
+
+# AUTO_SHARD=1 lets discord.py pick the shard count, all in this process.
+# shards.py runs worker processes with SHARD_COUNT/SHARD_IDS/SHARD_IPC set:
+# they take events from its coordinator instead of polling, and only
+# deliver to the guilds on their own shards.
+SHARD_COUNT = int(os.getenv("SHARD_COUNT") or 0) or None
+SHARD_IDS = parse_shard_ids(os.getenv("SHARD_IDS", "")) or None
+SHARD_IPC = os.getenv("SHARD_IPC")
+shard_link = None
+follower = None  # the follow_coordinator() task
+if SHARD_IPC:
+    ipc_host, ipc_port = SHARD_IPC.rsplit(":", 1)
+    shard_link = ShardLink(ipc_host, int(ipc_port), SHARD_IDS, token=os.getenv("SHARD_IPC_TOKEN"))
+    set_ownership(ownership(SHARD_IDS, SHARD_COUNT))
+schedule = AdaptiveSchedule()
+detection_latency = LatencyTracker()
+
+def report_delivery(report):
+    print(
+        f"📨 {report.event_id} (M{report.magnitude}): {report.delivered}/{report.total} delivered, "
+        f"last after {report.time_to_last_delivery:.2f}s"
+    )
+
+def journal_delivery(delivery, latency, error):
+    journal.record(
+        delivery.report.event_id,
+        delivery.route,
+        "skipped" if isinstance(error, DMClosed) else "failed" if error else "delivered",
+        latency,
+        magnitude=delivery.report.magnitude,
+        error=str(error) if error else None,
+        events=delivery.events
+    )
+
+# JOURNAL_FILE: shards.py gives every worker process its own
+journal = AlertJournal(path=os.getenv("JOURNAL_FILE", JOURNAL_FILE))
+dispatcher = AlertDispatcher(on_report=report_delivery, on_delivery=journal_delivery)
+renderer = render.AlertRenderer()
+def still_subscribed(route):
+    """False once the target behind a coalescer route was removed or unsubscribed."""
+    kind, target_id = route.split(":", 1)
+    if kind == "channel":
+        return is_alert_target(int(target_id))
+    return get_subscriber(int(target_id)) is not None or get_point_subscriber(int(target_id)) is not None
+
+coalescer = Coalescer(dispatcher.submit, renderer, window=float(os.getenv("COALESCE_WINDOW", COALESCE_WINDOW)),
+                      wanted=still_subscribed)
+
+ALERT_CHANNEL_TYPES = (discord.TextChannel, discord.VoiceChannel, discord.Thread, discord.DMChannel, discord.GroupChannel)
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = Bot(command_prefix="/", intents=intents)
+class EarthquakeBot(AutoShardedBot if SHARD_COUNT or os.getenv("AUTO_SHARD") == "1" else Bot):
+    async def setup_hook(self):
+        # Runs right after login, before the gateway connects: alerts go out
+        # over REST, so monitoring doesn't wait for READY and guild chunking
+        global http_session
+        http_session = create_session()
+        ingestor.use_session(http_session)
+        feed_client.use_session(http_session)
+        webhooks.use_session(http_session)
+        journal.start()
+        dispatcher.start()
+        if metrics_server:
+            await metrics_server.start()
+        await init_db()
+
+        global follower
+        if shard_link is not None:
+            follower = asyncio.create_task(follow_coordinator())
+            print(f"🌍 Following the coordinator for shards {SHARD_IDS} of {SHARD_COUNT}")
+        else:
+            check_earthquakes.start()
+            print("🌍 Earthquake monitoring started!")
+        self.sync_task = asyncio.create_task(sync_command_tree())
+
+    async def close(self):
+        if metrics_server:
+            await metrics_server.stop()
+        coalescer.close()
+        await dispatcher.stop()
+        await journal.close()
+        await webhooks.close()
+        await ingestor.close()
+        await feed_client.close()
+        if http_session is not None:
+            await http_session.close()
+        await close_db()
+        await asyncio.gather(*history_writes)
+        await close_history()
+        await super().close()
+
+shard_options = {"shard_count": SHARD_COUNT, "shard_ids": SHARD_IDS} if SHARD_COUNT else {}
+bot = EarthquakeBot(command_prefix="/", intents=intents, **shard_options)
 tree = bot.tree
+user_resolver = UserResolver(bot)
+webhooks = WebhookSender(bot, avatar_url=render.THUMBNAIL_URL)
 
 # =======================================================
 # Regions & Flags
 # =======================================================
 
-with open("countries.json", "r") as f:
-    loaded_regions = json.load(f)
-REGIONS = {"World": None, **loaded_regions}
-
-def flag_emoji(country_name):
-    try:
-        country = pycountry.countries.get(name=country_name)
-        if not country or not hasattr(country, "alpha_2"):
-            return ""
-        code = country.alpha_2.upper()
-        return "".join([chr(ord(c) + 127397) for c in code])
-    except:
-        return ""
+REGION_CHOICES = {
+    name: app_commands.Choice(name=f"{flag_emoji(name)} {name}".strip(), value=name)
+    for name in REGIONS
+}
 
 async def region_autocomplete(interaction: discord.Interaction, current: str):
-    return [
-        app_commands.Choice(
-            name=f"{flag_emoji(name)} {name}" if name != "World" else "🌍 World",
-            value=name
-        )
-        for name in sorted(REGIONS.keys())
-        if current.lower() in name.lower()
-    ][:25]
+    with AUTOCOMPLETE.time():
+        return [REGION_CHOICES[name] for name in region_search.search(current)]
 
 # =======================================================
 # Earthquake Checker Task
 # =======================================================
 
-@tasks.loop(minutes=1)
+async def dispatch_earthquake(feature):
+    event_id = feature["id"]
+    props = feature["properties"]
+    mag = props["mag"]
+    lon, lat = feature["geometry"]["coordinates"][:2]
+
+    with MATCH.time():
+        alert_channels, subscribers = match_alert_targets(lat, lon, mag)
+    targets = []
+
+    # Server alerts and DM/GC alerts
+    for guild_id, channel_id, min_mag, region_name in alert_channels:
+        channel = bot.get_channel(channel_id)
+        if channel is None and not bot.is_ready():
+            # The gateway cache is still filling after a restart; send by ID over REST
+            channel = bot.get_partial_messageable(channel_id)
+        elif not isinstance(channel, ALERT_CHANNEL_TYPES):
+            continue
+
+        if guild_id is None:
+            targets.append(Target(f"channel:{channel_id}", CHANNEL, f"DM/GC {channel_id}", channel.send, region_name, render.CHAT, min_mag))
+        elif uses_webhook(channel_id):
+            send = partial(webhooks.send, channel_id, channel.send)
+            targets.append(Target(f"channel:{channel_id}", CHANNEL, f"{channel_id} (webhook)", send, region_name, render.SERVER, min_mag, MAX_EMBEDS))
+        else:
+            targets.append(Target(f"channel:{channel_id}", CHANNEL, f"{channel_id}", channel.send, region_name, render.SERVER, min_mag))
+
+    # User DM subscriptions
+    for user_id, sub_region, sub_mag in subscribers:
+        if user_resolver.is_closed(user_id):
+            journal.record(event_id, f"dm:{user_id}", "skipped", magnitude=mag, error="DMs closed")
+            continue
+        targets.append(Target(f"dm:{user_id}", DM, f"user {user_id}", partial(user_resolver.send, user_id), None, render.DM, sub_mag))
+
+    # Targets already alerted within the coalescing window hold this one for their next digest
+    return dispatcher.submit(event_id, mag, coalescer.offer(feature, targets))
+
+history_writes = set()  # record_events() tasks still running
+
+async def _record_history(features):
+    try:
+        await record_events(features)
+    except Exception as e:
+        print(f"⚠️ Couldn't record events in history.db: {e}")
+
+def record_history(features):
+    """Store the feed in history.db in the background, so a slow or broken history store never holds up alerts."""
+    task = asyncio.create_task(_record_history(features))
+    history_writes.add(task)
+    task.add_done_callback(history_writes.discard)
+
+async def poll_feed():
+    """Poll the feeds once. Returns (features, new_features); features is None when nothing changed."""
+    new_features = []
+    start = time.perf_counter()
+    try:
+        features = await ingestor.poll()
+        if features is None:
+            latest_feed.touch()
+            return None, []
+        latest_feed.publish(features, ingestor.generated)
+        record_history(features)
+
+        first_run = not await has_seen_events()
+        new_ids = await claim_new_events([
+            (f["id"], event_aliases(f), f["properties"].get("updated") or f["properties"]["time"]) for f in features
+        ])
+        await evict_seen_events()
+
+        # A brand-new store only records the current feed, so a fresh install doesn't replay the past hour
+        if not first_run:
+            new_features = [f for f in features if f["id"] in new_ids]
+        return features, new_features
+
+    finally:
+        POLL.observe(time.perf_counter() - start)
+        schedule.observe(
+            new_events=len(new_features),
+            max_magnitude=max((f["properties"]["mag"] for f in new_features), default=None),
+            generated=ingestor.generated
+        )
+
+async def dispatch_new(new_features):
+    NEW_EVENTS.inc(len(new_features))
+    reports = []
+    for feature in new_features:
+        reports.append(await dispatch_earthquake(feature))
+        detection_latency.record(feature["properties"]["time"], feature["properties"].get("updated"))
+    # Webhook channels get this batch's alerts for them in as few messages as possible
+    coalescer.flush()
+
+    if new_features:
+        print(f"⏱️ Detection latency (median): {detection_latency.summary()}")
+    return reports
+
+@tasks.loop(seconds=POLL_START)
 async def check_earthquakes():
-    global last_earthquake_time
     try:
-        response = requests.get(USGS_FEED_URL)
-        data = response.json()
-
-        for feature in data["features"]:
-            event_id = feature["id"]
-            map_url = f"https://earthquake.usgs.gov/earthquakes/eventpage/{event_id}/map"
-            props = feature["properties"]
-            geom = feature["geometry"]
-            place = props["place"]
-            mag = props["mag"]
-            quake_time = props["time"]
-            coords = geom["coordinates"]
-            lon, lat = coords[0], coords[1]
-
-            if mag is None:
-                continue
-
-            if last_earthquake_time is None or quake_time > last_earthquake_time:
-                last_earthquake_time = quake_time
-
-                # Server alerts (existing code)
-                for guild in bot.guilds:
-                    result = get_alert_channel(guild.id)
-                    if not result:
-                        continue
-
-                    channel_id, min_mag, region_name = result
-                    if min_mag is None or region_name is None:
-                        continue
-                    if mag < min_mag:
-                        continue
-
-                    bounds = REGIONS.get(region_name)
-                    if bounds:
-                        lat_min, lat_max, lon_min, lon_max = bounds
-                        if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
-                            continue
-
-                    channel = bot.get_channel(channel_id)
-                    if channel and isinstance(channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread, discord.DMChannel, discord.GroupChannel)):
-                        try:
-                            with open("logs.txt", "a") as log:
-                                log.write(f"[{datetime.utcnow()}] Magnitude {mag} | {place} | {lat}, {lon} | URL: {props['url']}\n")
-
-                            embed = discord.Embed(
-                                title="🌍 Earthquake Alert!",
-                                color=discord.Color.from_rgb(231, 76, 60),
-                                timestamp=datetime.utcnow()
-                            )
-                            embed.set_thumbnail(url="https://yourcdn.com/Earthquake%20Alerts.webp")
-                            embed.add_field(name="Region", value=f"{flag_emoji(region_name)} {region_name}", inline=True)
-                            embed.add_field(name="Magnitude", value=f"`{mag}`", inline=True)
-                            embed.add_field(name="Location", value=place or "Unknown", inline=False)
-                            embed.add_field(name="Coordinates", value=f"`{lat}, {lon}`", inline=False)
-                            embed.add_field(name="More Info", value=f"[USGS Details]({props['url']})", inline=False)
-                            embed.add_field(name="Epicenter Map", value=f"[📍 View on Map]({map_url})", inline=False)
-                            embed.set_footer(text="Stay alert. Stay safe.")
-
-                            await channel.send(embed=embed)
-                        except Exception as e:
-                            print(f"❌ Failed to send to {channel_id}: {e}")
-
-                # DM/GC alerts (NEW)
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
-                c.execute("SELECT channel_id, min_magnitude, region FROM guild_channels WHERE guild_id = 0")
-                dm_gc_configs = c.fetchall()
-                conn.close()
-                
-                for channel_id, min_mag, region_name in dm_gc_configs:
-                    if min_mag is None or region_name is None:
-                        continue
-                    if mag < min_mag:
-                        continue
-
-                    bounds = REGIONS.get(region_name)
-                    if bounds:
-                        lat_min, lat_max, lon_min, lon_max = bounds
-                        if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
-                            continue
-
-                    try:
-                        channel = bot.get_channel(channel_id)
-                        if channel and isinstance(channel, (discord.TextChannel, discord.VoiceChannel, discord.Thread, discord.DMChannel, discord.GroupChannel)):
-                            embed = discord.Embed(
-                                title="🌍 Earthquake Alert!",
-                                color=discord.Color.from_rgb(231, 76, 60),
-                                timestamp=datetime.utcnow()
-                            )
-                            embed.set_thumbnail(url="https://yourcdn.com/Earthquake%20Alerts.webp")
-                            embed.add_field(name="Magnitude", value=f"`{mag}`", inline=True)
-                            embed.add_field(name="Region", value=f"{flag_emoji(region_name)} {region_name}", inline=True)
-                            embed.add_field(name="Location", value=place or "Unknown", inline=False)
-                            embed.add_field(name="Coordinates", value=f"`{lat}, {lon}`", inline=False)
-                            embed.add_field(name="More Info", value=f"[USGS Details]({props['url']})", inline=False)
-                            embed.add_field(name="Epicenter Map", value=f"[📍 View on Map]({map_url})", inline=False)
-                            embed.set_footer(text="Stay alert. Stay safe.")
-
-                            await channel.send(embed=embed)
-                    except Exception as e:
-                        print(f"❌ Failed to send to DM/GC {channel_id}: {e}")
-
-                # User DM subscriptions (existing code)
-                for user_id, sub_region, sub_mag in get_all_subscribers_with_filters():
-                    if mag < sub_mag:
-                        continue
-
-                    sub_bounds = REGIONS.get(sub_region)
-                    if sub_bounds:
-                        lat_min, lat_max, lon_min, lon_max = sub_bounds
-                        if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
-                            continue
-
-                    try:
-                        user = await bot.fetch_user(user_id)
-                        embed = discord.Embed(
-                            title="🔔 Earthquake Detected!",
-                            color=discord.Color.from_rgb(231, 76, 60),
-                            timestamp=datetime.utcnow()
-                        )
-                        embed.set_thumbnail(url="https://yourcdn.com/Earthquake%20Alerts.webp")
-                        embed.add_field(name="Magnitude", value=f"`{mag}`", inline=True)
-                        embed.add_field(name="Location", value=place or "Unknown", inline=False)
-                        embed.add_field(name="Coordinates", value=f"`{lat}, {lon}`", inline=False)
-                        embed.add_field(name="More Info", value=f"[USGS Details]({props['url']})", inline=False)
-                        embed.set_footer(text="Stay alert. Stay safe.")
-
-                        await user.send(embed=embed)
-                    except Exception as e:
-                        print(f"❌ Failed to DM {user_id}: {e}")
-
-                break
+        _, new_features = await poll_feed()
+        await dispatch_new(new_features)
 
     except Exception as e:
         print("❌ Error fetching earthquake data:", e)
 
-@check_earthquakes.before_loop
-async def before_check_earthquakes():
-    await bot.wait_until_ready()
+    finally:
+        mark_alert_ready()
+        check_earthquakes.change_interval(seconds=schedule.next_interval())
+
+alert_ready = None
+
+def mark_alert_ready():
+    """Record, once, how long the process took to get its first poll through."""
+    global alert_ready
+    if alert_ready is None:
+        alert_ready = time.monotonic() - STARTED
+        ALERT_READY.set(alert_ready)
+        print(f"🚀 Alert-ready {alert_ready:.2f}s after start")
+
+async def follow_coordinator():
+    """Shard worker loop: deliver the coordinator's new events instead of polling."""
+    async for message in shard_link.messages():
+        try:
+            if message["type"] == "feed":
+                latest_feed.publish(message["features"], message["generated"])
+                new_ids = set(message["new"])
+                await dispatch_new([f for f in message["features"] if f["id"] in new_ids])
+            elif message["type"] == "subscriber":
+                await refresh_subscriber(message["user_id"])
+        except Exception as e:
+            print("❌ Error handling coordinator message:", e)
+        mark_alert_ready()
+
+def subscriber_changed(user_id):
+    # DM subscriptions are cached by the worker running shard 0, whichever worker took the command
+    if shard_link is not None:
+        shard_link.send({"type": "subscriber", "user_id": user_id})
 
 # =======================================================
 # Slash Commands
@@ -229,7 +354,8 @@ async def subscribe(interaction: discord.Interaction, region: str, min_magnitude
         await interaction.response.send_message("⚠️ Invalid region. Please choose a valid country name.", ephemeral=True)
         return
 
-    add_subscriber(interaction.user.id, region, min_magnitude)
+    await add_subscriber(interaction.user.id, region, min_magnitude)
+    subscriber_changed(interaction.user.id)
     await interaction.response.send_message(
         f"📬 You are now subscribed to DMs for `{region}` earthquakes ≥ `{min_magnitude}`!",
         ephemeral=True
@@ -237,30 +363,52 @@ async def subscribe(interaction: discord.Interaction, region: str, min_magnitude
 
 @subscribe.autocomplete("region")
 async def subscribe_region_autocomplete(interaction: discord.Interaction, current: str):
-    return [
-        app_commands.Choice(name=name, value=name)
-        for name in sorted(REGIONS.keys())
-        if current.lower() in name.lower()
-    ][:25]
+    return await region_autocomplete(interaction, current)
 
 @tree.command(name="unsubscribe", description="Unsubscribe from alerts")
 async def unsubscribe(interaction: discord.Interaction):
     user_id = interaction.user.id
-    remove_subscriber(user_id)
+    await remove_subscriber(user_id)
+    await remove_point_subscriber(user_id)
+    subscriber_changed(user_id)
     await interaction.response.send_message("❎ You have been unsubscribed from alerts.", ephemeral=True)
 
+@tree.command(name="subscribenear", description="Receive DMs for earthquakes within a distance of a location")
+@app_commands.describe(
+    latitude="Latitude of the location, e.g. 41.01",
+    longitude="Longitude of the location, e.g. 28.98",
+    radius_km="Alert for earthquakes within this many kilometres",
+    min_magnitude="Minimum magnitude to receive DMs"
+)
+async def subscribe_near(
+    interaction: discord.Interaction,
+    latitude: app_commands.Range[float, -90.0, 90.0],
+    longitude: app_commands.Range[float, -180.0, 180.0],
+    radius_km: app_commands.Range[float, 1.0, 20000.0],
+    min_magnitude: float
+):
+    await add_point_subscriber(interaction.user.id, latitude, longitude, radius_km, min_magnitude)
+    subscriber_changed(interaction.user.id)
+    await interaction.response.send_message(
+        f"📬 You are now subscribed to DMs for earthquakes ≥ `{min_magnitude}` within "
+        f"`{radius_km:g} km` of `{latitude:.2f}, {longitude:.2f}`!",
+        ephemeral=True
+    )
+
 @tree.command(name="setchannel", description="Configure earthquake alerts for this server")
 @app_commands.describe(
     channel="Which channel should receive earthquake alerts?",
     min_magnitude="Minimum magnitude to receive alerts for",
-    region="Region to monitor earthquakes in"
+    region="Region to monitor earthquakes in",
+    webhook="Post alerts through a channel webhook, several per message (needs Manage Webhooks)"
 )
 @app_commands.checks.has_permissions(administrator=True)
 async def setchannel(
     interaction: discord.Interaction,
     channel: discord.TextChannel,
     min_magnitude: float,
-    region: str
+    region: str,
+    webhook: bool = False
 ):
     if interaction.guild is None:
         await interaction.response.send_message(
@@ -278,20 +426,21 @@ async def setchannel(
         )
         return
 
-    set_alert_channel(guild_id, channel.id, min_magnitude, region)
+    await set_alert_channel(guild_id, channel.id, min_magnitude, region)
+    if webhook:
+        await set_webhook_delivery(channel.id, True)
+    elif uses_webhook(channel.id):
+        await webhooks.discard(channel.id, partial(set_webhook_delivery, channel.id, False))
 
     await interaction.response.send_message(
-        f"✅ Alerts will be sent to {channel.mention} for `{region}` with magnitude ≥ `{min_magnitude}`.",
+        f"✅ Alerts will be sent to {channel.mention} for `{region}` with magnitude ≥ `{min_magnitude}`"
+        f"{' through a webhook' if webhook else ''}.",
         ephemeral=True
     )
 
 @setchannel.autocomplete("region")
 async def setchannel_region_autocomplete(interaction: discord.Interaction, current: str):
-    return [
-        app_commands.Choice(name=name, value=name)
-        for name in sorted(REGIONS.keys())
-        if current.lower() in name.lower()
-    ][:25]
+    return await region_autocomplete(interaction, current)
 
 @tree.command(name="faketest", description="Send a fake earthquake alert (only for the developer)")
 async def faketest(interaction: discord.Interaction):
@@ -318,7 +467,7 @@ async def faketest(interaction: discord.Interaction):
         color=discord.Color.orange()
     )
     embed.set_footer(text="⚠️ This is a fake alert for testing purposes only.")
-    embed.timestamp = datetime.utcnow()
+    embed.timestamp = discord.utils.utcnow()
 
     await interaction.response.send_message(embed=embed)
 
@@ -333,19 +482,21 @@ async def status(interaction: discord.Interaction):
         return
         
     guild_id = interaction.guild.id
-    result = get_alert_channel(guild_id)
-    if not result:
+    results = get_alert_channels(guild_id)
+    if not results:
         await interaction.response.send_message("⚠️ This server has no alert configuration yet. Use `/setchannel` to set one up.", ephemeral=True)
         return
 
-    channel_id, min_mag, region_name = result
-    channel_mention = f"<#{channel_id}>"
+    settings = "\n\n".join(
+        f"**Alert Channel:** <#{channel_id}>\n"
+        f"**Region:** `{region_name}`\n"
+        f"**Minimum Magnitude:** `{min_mag}`"
+        + ("\n**Delivery:** `webhook`" if uses_webhook(channel_id) else "")
+        for channel_id, min_mag, region_name in results
+    )
 
     await interaction.response.send_message(
-        f"🔎 **Earthquake Alert Settings for This Server:**\n"
-        f"**Region:** `{region_name}`\n"
-        f"**Minimum Magnitude:** `{min_mag}`\n"
-        f"**Alert Channel:** {channel_mention}",
+        f"🔎 **Earthquake Alert Settings for This Server:**\n{settings}",
         ephemeral=True
     )
 
@@ -358,7 +509,8 @@ async def help_command(interaction: discord.Interaction):
     )
     embed.add_field(
         name="/setchannel",
-        value="Admin-only. Set the channel, region, and minimum magnitude for alerts.",
+        value="Admin-only. Set a channel, region, and minimum magnitude for alerts. Run it again for more channels. "
+              "With `webhook: True` alerts are posted through a channel webhook.",
         inline=False
     )
     embed.add_field(
@@ -366,6 +518,11 @@ async def help_command(interaction: discord.Interaction):
         value="Receive DMs for global earthquake alerts.",
         inline=False
     )
+    embed.add_field(
+        name="/subscribenear",
+        value="Receive DMs for earthquakes within a distance of a location.",
+        inline=False
+    )
     embed.add_field(
         name="/unsubscribe",
         value="Stop receiving DM alerts.",
@@ -376,13 +533,19 @@ async def help_command(interaction: discord.Interaction):
         value="Check the current alert settings for this server.",
         inline=False
     )
+    embed.add_field(
+        name="/history",
+        value="Search past earthquakes by region, days and minimum magnitude.",
+        inline=False
+    )
     embed.set_footer(text="Made with 💙 to help you get the fastest information. Stay safe!")
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
-@tree.command(name="removechannel", description="Remove the earthquake alert channel for this server")
+@tree.command(name="removechannel", description="Remove earthquake alert channels for this server")
+@app_commands.describe(channel="Alert channel to remove (leave empty to remove all of them)")
 @app_commands.checks.has_permissions(administrator=True)
-async def removechannel(interaction: discord.Interaction):
+async def removechannel(interaction: discord.Interaction, channel: Optional[discord.TextChannel] = None):
     if interaction.guild is None:
         await interaction.response.send_message(
             "⚠️ This command can only be used in servers.",
@@ -392,11 +555,18 @@ async def removechannel(interaction: discord.Interaction):
         
     guild_id = interaction.guild.id
 
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM guild_channels WHERE guild_id = ?", (guild_id,))
-    conn.commit()
-    conn.close()
+    if channel is not None:
+        if await webhooks.discard(channel.id, partial(remove_alert_channel, guild_id, channel.id)):
+            message = f"🗑️ Earthquake alerts have been removed from {channel.mention}."
+        else:
+            message = f"⚠️ {channel.mention} isn't an alert channel for this server."
+        await interaction.response.send_message(message, ephemeral=True)
+        return
+
+    for channel_id, _, _ in get_alert_channels(guild_id):
+        if uses_webhook(channel_id):
+            await webhooks.discard(channel_id, partial(set_webhook_delivery, channel_id, False))
+    await remove_alert_channel(guild_id)
 
     await interaction.response.send_message(
         "🗑️ Earthquake alerts have been disabled for this server. Use `/setchannel` to re-enable.",
@@ -407,29 +577,30 @@ async def removechannel(interaction: discord.Interaction):
 async def dm_status(interaction: discord.Interaction):
     user_id = interaction.user.id
     
-    # Get user's subscription from database
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT region, min_magnitude FROM subscribers WHERE user_id = ?", (user_id,))
-    result = c.fetchone()
-    conn.close()
+    # Get user's subscriptions from the database cache
+    result = get_subscriber(user_id)
+    point = get_point_subscriber(user_id)
     
-    if not result:
+    if not result and not point:
         await interaction.response.send_message(
             "📭 You are not currently subscribed to any earthquake alerts.\nUse `/subscribe` to get started!",
             ephemeral=True
         )
         return
     
-    region, min_mag = result
-    flag = flag_emoji(region) if region != "World" else "🌍"
-    
     embed = discord.Embed(
         title="📬 Your DM Subscription Status",
         color=discord.Color.blue()
     )
-    embed.add_field(name="Region", value=f"{flag} {region}", inline=True)
-    embed.add_field(name="Minimum Magnitude", value=f"`{min_mag}`", inline=True)
+    if result:
+        region, min_mag = result
+        flag = flag_emoji(region)
+        embed.add_field(name="Region", value=f"{flag} {region}", inline=True)
+        embed.add_field(name="Minimum Magnitude", value=f"`{min_mag}`", inline=True)
+    if point:
+        lat, lon, radius_km, min_mag = point
+        embed.add_field(name="Near", value=f"📍 `{lat:.2f}, {lon:.2f}` within `{radius_km:g} km`", inline=False)
+        embed.add_field(name="Minimum Magnitude", value=f"`{min_mag}`", inline=True)
     embed.set_footer(text="Use /unsubscribe to stop alerts or /subscribe to change settings")
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -463,10 +634,10 @@ async def gc_setup(interaction: discord.Interaction, min_magnitude: float, regio
         return
     
     channel_id = interaction.channel.id
-    # Use 0 as guild_id for DMs/GCs to distinguish from servers
-    set_alert_channel(0, channel_id, min_magnitude, region)
+    # DMs/GCs have no guild; each chat is its own alert target
+    await set_alert_channel(None, channel_id, min_magnitude, region)
     
-    flag = flag_emoji(region) if region != "World" else "🌍"
+    flag = flag_emoji(region)
     
     await interaction.response.send_message(
         f"✅ Earthquake alerts set up for this chat!\n"
@@ -475,6 +646,10 @@ async def gc_setup(interaction: discord.Interaction, min_magnitude: float, regio
         f"You'll receive alerts here when earthquakes occur in {region} with magnitude ≥ {min_magnitude}."
     )
 
+@gc_setup.autocomplete("region")
+async def gc_setup_region_autocomplete(interaction: discord.Interaction, current: str):
+    return await region_autocomplete(interaction, current)
+
 @tree.command(name="gcremove", description="Remove earthquake alerts from this group chat or DM")
 async def gc_remove(interaction: discord.Interaction):
     if interaction.guild is not None:
@@ -493,14 +668,7 @@ async def gc_remove(interaction: discord.Interaction):
     
     channel_id = interaction.channel.id
     
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM guild_channels WHERE guild_id = 0 AND channel_id = ?", (channel_id,))
-    affected_rows = c.rowcount
-    conn.commit()
-    conn.close()
-    
-    if affected_rows > 0:
+    if await remove_chat_channel(channel_id):
         await interaction.response.send_message(
             "🗑️ Earthquake alerts have been removed from this chat."
         )
@@ -527,11 +695,7 @@ async def gc_status(interaction: discord.Interaction):
     
     channel_id = interaction.channel.id
     
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT min_magnitude, region FROM guild_channels WHERE guild_id = 0 AND channel_id = ?", (channel_id,))
-    result = c.fetchone()
-    conn.close()
+    result = get_chat_channel(channel_id)
     
     if not result:
         await interaction.response.send_message(
@@ -540,7 +704,7 @@ async def gc_status(interaction: discord.Interaction):
         return
     
     min_mag, region_name = result
-    flag = flag_emoji(region_name) if region_name != "World" else "🌍"
+    flag = flag_emoji(region_name)
     
     embed = discord.Embed(
         title="🔎 Earthquake Alert Settings",
@@ -556,29 +720,22 @@ async def gc_status(interaction: discord.Interaction):
 @app_commands.describe(min_magnitude="Minimum magnitude to show (optional)")
 async def recent_earthquakes(interaction: discord.Interaction, min_magnitude: float = 1.0):
     try:
-        response = requests.get(USGS_FEED_URL)
-        data = response.json()
-        
-        earthquakes = []
-        for feature in data["features"]:
-            props = feature["properties"]
-            coords = feature["geometry"]["coordinates"]
-            
-            mag = props["mag"]
-            if mag is None or mag < min_magnitude:
-                continue
-                
-            earthquakes.append({
-                "magnitude": mag,
-                "place": props["place"],
-                "time": props["time"],
-                "coords": (coords[1], coords[0]),  # lat, lon
-                "url": props["url"]
-            })
-        
-        # Sort by time (most recent first) and take top 5
-        earthquakes.sort(key=lambda x: x["time"], reverse=True)
-        earthquakes = earthquakes[:5]
+        # Served from the poller's snapshot; only go to USGS if the poller has fallen behind
+        if latest_feed.stale:
+            try:
+                data = await feed_client.poll()
+            except Exception as e:
+                print(f"⚠️ /recent couldn't refresh the feed, using the last snapshot: {e}")
+            else:
+                if data is not None:
+                    latest_feed.publish(data["features"], data.get("metadata", {}).get("generated"))
+                elif latest_feed.age() is not None:
+                    # 304: all_hour hasn't changed since this client last published it
+                    latest_feed.touch()
+        if latest_feed.age() is None:
+            await interaction.response.send_message("⏳ The earthquake feed hasn't loaded yet. Please try again in a moment.", ephemeral=True)
+            return
+        earthquakes = latest_feed.recent(5, min_magnitude)
         
         if not earthquakes:
             await interaction.response.send_message(
@@ -591,18 +748,21 @@ async def recent_earthquakes(interaction: discord.Interaction, min_magnitude: fl
             title="📊 Recent Earthquakes",
             description=f"Showing {len(earthquakes)} most recent earthquakes ≥ M{min_magnitude}",
             color=discord.Color.orange(),
-            timestamp=datetime.utcnow()
+            timestamp=discord.utils.utcnow()
         )
         
         for i, eq in enumerate(earthquakes, 1):
-            time_str = datetime.fromtimestamp(eq["time"] / 1000).strftime("%m/%d %H:%M UTC")
+            time_str = datetime.fromtimestamp(eq.time / 1000, timezone.utc).strftime("%m/%d %H:%M UTC")
             embed.add_field(
-                name=f"{i}. M{eq['magnitude']} - {time_str}",
-                value=f"📍 {eq['place']}\n🌐 [{eq['coords'][0]:.2f}, {eq['coords'][1]:.2f}]({eq['url']})",
+                name=f"{i}. M{eq.magnitude} - {time_str}",
+                value=f"📍 {eq.place}\n🌐 [{eq.lat:.2f}, {eq.lon:.2f}]({eq.url})",
                 inline=False
             )
         
-        embed.set_footer(text="Data from USGS • Click coordinates for details")
+        footer = "Data from USGS • Click coordinates for details"
+        if latest_feed.stale:
+            footer += f" • ⚠️ Feed last checked {int(latest_feed.age() // 60)} min ago"
+        embed.set_footer(text=footer)
         await interaction.response.send_message(embed=embed)
         
     except Exception as e:
@@ -612,13 +772,124 @@ async def recent_earthquakes(interaction: discord.Interaction, min_magnitude: fl
         )
         print(f"Error in recent_earthquakes: {e}")
 
+def history_embed(quakes, title, description, page):
+    embed = discord.Embed(
+        title=title,
+        description=description,
+        color=discord.Color.orange()
+    )
+    for quake in quakes:
+        time_str = datetime.fromtimestamp(quake.time / 1000, timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+        embed.add_field(
+            name=f"M{quake.magnitude} - {time_str}",
+            value=f"📍 {quake.place}\n🌐 [{quake.lat:.2f}, {quake.lon:.2f}]({quake.url})",
+            inline=False
+        )
+    embed.set_footer(text=f"Page {page} • Data recorded from USGS feeds")
+    return embed
+
+class HistoryView(discord.ui.View):
+    """Pages back through one /history search with an "Older" button."""
+
+    def __init__(self, user_id, query, cursor, title, description):
+        super().__init__(timeout=300)
+        self.user_id = user_id
+        self.query = query
+        self.cursor = cursor
+        self.title = title
+        self.description = description
+        self.page = 1
+
+    @discord.ui.button(label="Older", emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction: discord.Interaction, button: discord.ui.Button):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("⚠️ Run `/history` to start your own search.", ephemeral=True)
+            return
+        quakes, self.cursor = await query_events(**self.query, cursor=self.cursor)
+        self.page += 1
+        button.disabled = self.cursor is None
+        await interaction.response.edit_message(
+            embed=history_embed(quakes, self.title, self.description, self.page),
+            view=self
+        )
+
+@tree.command(name="history", description="Search earthquakes recorded by the bot")
+@app_commands.describe(
+    region="Country to search in (optional, worldwide by default)",
+    days="How many days back to search",
+    min_magnitude="Minimum magnitude to show"
+)
+async def history_command(
+    interaction: discord.Interaction,
+    region: Optional[str] = None,
+    days: app_commands.Range[int, 1, 365] = 7,
+    min_magnitude: float = 2.5
+):
+    if region is not None and region not in REGIONS:
+        await interaction.response.send_message("⚠️ Invalid region. Please choose a valid country name.", ephemeral=True)
+        return
+
+    query = {
+        "start": int((time.time() - days * 86400) * 1000),
+        "min_magnitude": min_magnitude,
+        "bbox": REGIONS[region] if region else None
+    }
+    try:
+        quakes, cursor = await query_events(**query)
+    except Exception as e:
+        await interaction.response.send_message(
+            "❌ Failed to search the earthquake history. Please try again later.",
+            ephemeral=True
+        )
+        print(f"Error in history_command: {e}")
+        return
+
+    place = f"{flag_emoji(region)} {region}" if region else "🌍 Worldwide"
+    if not quakes:
+        await interaction.response.send_message(
+            f"🔍 No earthquakes ≥ M{min_magnitude} recorded in {place} over the last {days} days.",
+            ephemeral=True
+        )
+        return
+
+    title = "🗂️ Earthquake History"
+    description = f"{place} • last {days} days • ≥ M{min_magnitude}"
+    embed = history_embed(quakes, title, description, 1)
+    if cursor is None:
+        await interaction.response.send_message(embed=embed)
+        return
+    view = HistoryView(interaction.user.id, query, cursor, title, description)
+    await interaction.response.send_message(embed=embed, view=view)
+
+@history_command.autocomplete("region")
+async def history_region_autocomplete(interaction: discord.Interaction, current: str):
+    return await region_autocomplete(interaction, current)
+
+# =======================================================
+# Command Tree Sync
+# =======================================================
+
+def command_tree_hash():
+    """Hash of every slash command's definition, as it would be sent to Discord."""
+    payload = sorted((command.to_dict(tree) for command in tree.get_commands()), key=lambda c: c["name"])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+async def sync_command_tree():
+    """Sync slash commands only when their definitions changed since the last sync (SYNC_COMMANDS=always forces it)."""
+    try:
+        digest = f"{bot.application_id}:{command_tree_hash()}"
+        if os.getenv("SYNC_COMMANDS") != "always" and await get_setting("command_tree_hash") == digest:
+            print("✅ Slash commands unchanged, not syncing")
+            return
+        synced = await tree.sync()
+        await set_setting("command_tree_hash", digest)
+        print(f"🔄 Synced {len(synced)} slash commands")
+    except Exception as e:
+        print("❌ Error syncing slash commands:", e)
+
 @bot.event
 async def on_ready():
     print(f'🤖 {bot.user} has connected to Discord!')
-    init_db()
-    if not check_earthquakes.is_running():
-        check_earthquakes.start()
-        print("🌍 Earthquake monitoring started!")
 
 if __name__ == "__main__":
     if TOKEN:
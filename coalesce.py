@@ -0,0 +1,163 @@
+import asyncio
+from functools import partial
+
+import render
+from dispatcher import Delivery
+
+COALESCE_WINDOW = 30.0  # seconds a target's follow-up alerts are held and merged into one digest
+URGENT_MAGNITUDE = 6.0  # always sent at once, whatever the target's minimum
+URGENT_MARGIN = 2.0     # ...and so is anything this far above the target's own minimum
+
+# =======================================================
+# Alert Targets
+# =======================================================
+
+class Target:
+    """Where one matched alert goes.
+
+    `send` is a coroutine function taking embed=, or embeds= when `pack` is
+    above 1: such a target gets up to `pack` alerts per message.
+    """
+
+    __slots__ = ("route", "kind", "label", "send", "region_name", "template", "min_magnitude", "pack")
+
+    def __init__(self, route, kind, label, send, region_name, template, min_magnitude, pack=1):
+        self.route = route
+        self.kind = kind
+        self.label = label
+        self.send = send
+        self.region_name = region_name
+        self.template = template
+        self.min_magnitude = min_magnitude
+        self.pack = pack
+
+# =======================================================
+# Alert Coalescing
+# =======================================================
+
+class Coalescer:
+    """Merges a target's alerts during a swarm into digest messages.
+
+    The first alert for a target goes out at once and opens a window of
+    `window` seconds. Alerts for that target during the window are held;
+    when it closes they are sent as one digest (largest magnitude first)
+    and a new window opens, so a long sequence yields one message per
+    window. An urgent event (at least urgent_threshold() for the target)
+    never waits. A window of 0 turns coalescing off.
+
+    Targets that take several embeds per message collect the alerts they
+    get from one batch of offers (one poll's new events) until flush(),
+    which sends them together, and a held window's worth of up to `pack`
+    alerts goes out as full embeds rather than a digest.
+
+    `wanted(route)`, when given, is asked again before held or collected
+    alerts go out; a target that unsubscribed meanwhile gets none of them.
+    """
+
+    def __init__(self, submit, renderer, window=COALESCE_WINDOW, urgent_magnitude=URGENT_MAGNITUDE,
+                 urgent_margin=URGENT_MARGIN, wanted=None):
+        self.submit = submit  # AlertDispatcher.submit
+        self.renderer = renderer
+        self.wanted = wanted
+        self.window = window
+        self.urgent_magnitude = urgent_magnitude
+        self.urgent_margin = urgent_margin
+        self._held = {}     # route -> [(feature, target)] for every open window
+        self._timers = {}   # route -> TimerHandle
+        self._packs = {}    # route -> [(feature, target)] sent at the next flush()
+
+        self.immediate = 0  # alerts sent as they came
+        self.coalesced = 0  # alerts folded into a digest
+        self.digests = 0    # digest embeds sent
+        self.dropped = 0    # held or collected alerts whose target unsubscribed first
+
+    def urgent_threshold(self, min_magnitude):
+        return min(self.urgent_magnitude, (min_magnitude or 0) + self.urgent_margin)
+
+    def offer(self, feature, targets):
+        """Return the deliveries to send now for one event; the rest wait for their target's window or flush()."""
+        mag = feature["properties"]["mag"] or 0
+        deliveries = []
+        for target in targets:
+            held = self._held.get(target.route)
+            packed = self._packs.get(target.route)
+            joins = packed is not None and len(packed) < target.pack
+            if joins or held is None or self.window <= 0 or mag >= self.urgent_threshold(target.min_magnitude):
+                if target.pack > 1:
+                    self._packs.setdefault(target.route, []).append((feature, target))
+                else:
+                    deliveries.append(self._delivery(target, [feature]))
+                self.immediate += 1
+                if held is None and self.window > 0:
+                    self._open(target.route)
+            else:
+                held.append((feature, target))
+                self.coalesced += 1
+        return deliveries
+
+    def flush(self):
+        """Send what multi-embed targets collected since the last flush, `pack` alerts per message."""
+        packs, self._packs = self._packs, {}
+        for route, packed in packs.items():
+            if not self._wanted(route):
+                self.dropped += len(packed)
+                continue
+            target = packed[0][1]
+            for start in range(0, len(packed), target.pack):
+                self._submit(target, [feature for feature, _ in packed[start:start + target.pack]])
+
+    def _wanted(self, route):
+        return self.wanted is None or self.wanted(route)
+
+    def _delivery(self, target, features, embed=None):
+        """One message to `target` for `features`: their embeds, or `embed` (a digest) in their place."""
+        if embed is not None:
+            embeds = [embed]
+        else:
+            embeds = [self.renderer.render(feature, target.region_name, target.template) for feature in features]
+        if target.pack > 1:
+            send = partial(target.send, embeds=embeds)
+        else:
+            send = partial(target.send, embed=embeds[0])
+        if len(features) == 1:
+            return Delivery(target.route, target.kind, target.label, send)
+        return Delivery(target.route, target.kind, f"{target.label} ({len(features)} events)", send,
+                        events=[feature["id"] for feature in features])
+
+    def _submit(self, target, features, embed=None):
+        features = sorted(features, key=lambda f: f["properties"]["mag"] or 0, reverse=True)
+        top = features[0]
+        self.submit(top["id"], top["properties"]["mag"], [self._delivery(target, features, embed)])
+
+    def _open(self, route):
+        self._held[route] = []
+        self._timers[route] = asyncio.get_running_loop().call_later(self.window, self._close, route)
+
+    def _close(self, route):
+        held = self._held.pop(route, [])
+        self._timers.pop(route, None)
+        if not held:
+            return
+        if not self._wanted(route):
+            # No new window either: nothing more is coming for this target
+            self.dropped += len(held)
+            return
+        features = [feature for feature, _ in held]
+        target = held[-1][1]
+        if len(features) <= target.pack:
+            self._submit(target, features)
+        else:
+            self._submit(target, features, render.build_digest_embed(features, target.region_name, target.template))
+            self.digests += 1
+        self._open(route)
+
+    def idle(self):
+        """True once no window is open, so nothing is held."""
+        return not self._timers
+
+    def close(self):
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        self._held.clear()
+        self._packs.clear()
@@ -1,11 +1,155 @@
-import sqlite3
+import time
+
+import sqlite_store
+from matching import PointIndex, SubscriptionIndex
+from regions import REGIONS
+from sqlite_store import Store
 
 DB_FILE = "botdata.db"
 
-def init_db():
-    print("🛠️ Running init_db()...")
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+# =======================================================
+# Connection
+# =======================================================
+
+def connect(path=DB_FILE):
+    return sqlite_store.connect(path)
+
+# Opened lazily, so DB_FILE can still be pointed elsewhere before first use
+_store = Store("botdata", lambda: connect(DB_FILE))
+
+async def run(fn, *args):
+    """Run fn(conn, *args) on the database thread and commit."""
+    return await _store.run(fn, *args)
+
+async def close_db():
+    await _store.close()
+
+# =======================================================
+# Alert Target Cache
+# =======================================================
+
+# Mirrors of alert_targets and subscribers, loaded once by init_db() and
+# kept current by the write functions below, so dispatch never touches disk.
+# Only the event loop thread reads or writes them.
+_alert_targets = {}  # channel_id -> (guild_id, min_magnitude, region); guild_id is None for DMs/GCs
+_subscribers = {}    # user_id -> (region, min_magnitude)
+_index = SubscriptionIndex(REGIONS)  # keys: ("channel", channel_id) and ("user", user_id)
+_point_subscribers = {}  # user_id -> (lat, lon, radius_km, min_magnitude)
+_points = PointIndex()   # keys: user_id
+_webhooks = {}  # channel_id -> (webhook_id, token) for channels alerted by webhook; (None, None) until one is created
+
+# A shard worker (see shards.py) only indexes, and so only delivers to, the
+# targets it owns: owns(guild_id), with guild_id None for DMs, GCs and users.
+# Subscribers are still kept in the dicts so /dmstatus works on any worker.
+_owns = None
+
+def set_ownership(owns):
+    """Only match targets for which owns(guild_id) is true; None matches everything."""
+    global _owns
+    _owns = owns
+
+def owns(guild_id):
+    return _owns is None or _owns(guild_id)
+
+def load_cache(alert_targets, subscribers, point_subscribers=(), webhooks=()):
+    _alert_targets.clear()
+    _subscribers.clear()
+    _index.clear()
+    _point_subscribers.clear()
+    _points.clear()
+    _webhooks.clear()
+
+    for channel_id, guild_id, min_magnitude, region in alert_targets:
+        if not owns(guild_id):
+            continue
+        _alert_targets[channel_id] = (guild_id, min_magnitude, region)
+        _index.add(("channel", channel_id), region, min_magnitude)
+
+    for user_id, region, min_magnitude in subscribers:
+        _subscribers[user_id] = (region, min_magnitude)
+        if owns(None):
+            _index.add(("user", user_id), region, min_magnitude)
+
+    for user_id, lat, lon, radius_km, min_magnitude in point_subscribers:
+        _point_subscribers[user_id] = (lat, lon, radius_km, min_magnitude)
+        if owns(None):
+            _points.add(user_id, lat, lon, radius_km, min_magnitude)
+
+    for channel_id, webhook_id, token in webhooks:
+        if channel_id in _alert_targets:
+            _webhooks[channel_id] = (webhook_id, token)
+
+def use_region_locator(locator):
+    """Match regions with `locator` (see polygons.py) instead of bounding boxes; None restores the boxes."""
+    _index.locator = locator
+
+def match_alert_targets(lat, lon, mag):
+    """Return (alert_channels, subscribers) that want an event of `mag` at (lat, lon).
+
+    Point subscribers come back with a region of None, and a user with both
+    kinds of subscription is only listed once.
+    """
+    channels = []
+    subscribers = []
+    for kind, target_id in _index.match(lat, lon, mag):
+        if kind == "channel":
+            guild_id, min_magnitude, region = _alert_targets[target_id]
+            channels.append((guild_id, target_id, min_magnitude, region))
+        else:
+            region, min_magnitude = _subscribers[target_id]
+            subscribers.append((target_id, region, min_magnitude))
+    if _point_subscribers:
+        listed = {subscriber[0] for subscriber in subscribers}
+        for user_id in _points.match(lat, lon, mag):
+            if user_id not in listed:
+                subscribers.append((user_id, None, _point_subscribers[user_id][3]))
+    return channels, subscribers
+
+def get_alert_channels(guild_id):
+    """Return [(channel_id, min_magnitude, region)] configured for a guild."""
+    return [
+        (channel_id, min_magnitude, region)
+        for channel_id, (target_guild_id, min_magnitude, region) in _alert_targets.items()
+        if target_guild_id == guild_id
+    ]
+
+def get_chat_channel(channel_id):
+    """Return (min_magnitude, region) for a DM/GC alert target, or None."""
+    result = _alert_targets.get(channel_id)
+    if not result or result[0] is not None:
+        return None
+    return result[1], result[2]
+
+def get_all_alert_channels():
+    return [
+        (guild_id, channel_id, min_magnitude, region)
+        for channel_id, (guild_id, min_magnitude, region) in _alert_targets.items()
+    ]
+
+def is_alert_target(channel_id):
+    return channel_id in _alert_targets
+
+def uses_webhook(channel_id):
+    return channel_id in _webhooks
+
+def get_webhook(channel_id):
+    """Return (webhook_id, token) for a webhook-delivered channel; both None until its webhook exists."""
+    return _webhooks.get(channel_id, (None, None))
+
+def get_subscriber(user_id):
+    """Return (region, min_magnitude) for a DM subscriber, or None."""
+    return _subscribers.get(user_id)
+
+def get_point_subscriber(user_id):
+    """Return (lat, lon, radius_km, min_magnitude) for a point subscriber, or None."""
+    return _point_subscribers.get(user_id)
+
+# =======================================================
+# Schema & Migrations
+# =======================================================
+
+def _migrate_v1(c):
+    # The original unversioned schema; a no-op on an existing botdata.db
     c.execute("""
     CREATE TABLE IF NOT EXISTS guild_channels (
         guild_id INTEGER PRIMARY KEY,
@@ -21,49 +165,305 @@ def init_db():
         min_magnitude REAL
     )
     """)
-    conn.commit()
-    conn.close()
+    init_seen_events(c)
 
-def set_alert_channel(guild_id, channel_id, min_magnitude, region):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+def _migrate_v2(c):
+    # guild_channels was keyed by guild, so every group chat (guild_id 0)
+    # overwrote the last one. Targets are now keyed by channel.
     c.execute("""
-        REPLACE INTO guild_channels (guild_id, channel_id, min_magnitude, region)
-        VALUES (?, ?, ?, ?)
-    """, (guild_id, channel_id, min_magnitude, region))
-    conn.commit()
-    conn.close()
+    CREATE TABLE IF NOT EXISTS alert_targets (
+        channel_id INTEGER PRIMARY KEY,
+        guild_id INTEGER,
+        min_magnitude REAL NOT NULL,
+        region TEXT NOT NULL
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alert_targets_guild ON alert_targets (guild_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alert_targets_region_magnitude ON alert_targets (region, min_magnitude)")
+    c.execute("""
+        INSERT OR REPLACE INTO alert_targets (channel_id, guild_id, min_magnitude, region)
+        SELECT channel_id, NULLIF(guild_id, 0), min_magnitude, region
+        FROM guild_channels
+        WHERE channel_id IS NOT NULL AND min_magnitude IS NOT NULL AND region IS NOT NULL
+    """)
+    c.execute("DROP TABLE IF EXISTS guild_channels")
 
+def _migrate_v3(c):
+    # "Within N km of a point" DM subscriptions, alongside the region ones
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS point_subscribers (
+        user_id INTEGER PRIMARY KEY,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        radius_km REAL NOT NULL,
+        min_magnitude REAL NOT NULL
+    )
+    """)
 
-def get_alert_channel(guild_id):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT channel_id, min_magnitude, region FROM guild_channels WHERE guild_id = ?", (guild_id,))
-    result = c.fetchone()
-    conn.close()
-    return result if result else None
+def _migrate_v4(c):
+    # Small key/value state that has to survive restarts (e.g. the synced command tree's hash)
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS settings (
+        key TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    )
+    """)
 
-def add_subscriber(user_id, region, min_magnitude):
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute(
-        "REPLACE INTO subscribers (user_id, region, min_magnitude) VALUES (?, ?, ?)",
-        (user_id, region, min_magnitude)
+def _migrate_v5(c):
+    # Guild channels that get their alerts through a channel webhook, and that webhook once created.
+    # REPLACE INTO alert_targets doesn't fire delete triggers, so re-running /setchannel keeps the row.
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS alert_webhooks (
+        channel_id INTEGER PRIMARY KEY,
+        webhook_id INTEGER,
+        token TEXT
     )
-    conn.commit()
-    conn.close()
+    """)
+    c.execute("""
+    CREATE TRIGGER IF NOT EXISTS alert_webhooks_target_removed AFTER DELETE ON alert_targets
+    BEGIN
+        DELETE FROM alert_webhooks WHERE channel_id = OLD.channel_id;
+    END
+    """)
+
+MIGRATIONS = [_migrate_v1, _migrate_v2, _migrate_v3, _migrate_v4, _migrate_v5]
+SCHEMA_VERSION = len(MIGRATIONS)
 
-def remove_subscriber(user_id):
-    conn = sqlite3.connect(DB_FILE)
+def migrate(conn):
+    """Bring the database up to SCHEMA_VERSION, one atomic step per version.
+
+    sqlite3 runs DDL outside its implicit transactions, so each step opens
+    its own: a crash part-way leaves neither its tables nor its version.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            print(f"🛠️ Migrating database to schema v{number}...")
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                step(c)
+                c.execute(f"PRAGMA user_version = {number}")
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+
+# =======================================================
+# Alert Targets & Subscribers
+# =======================================================
+
+SELECT_ALERT_TARGETS = "SELECT channel_id, guild_id, min_magnitude, region FROM alert_targets"
+SELECT_SUBSCRIBERS = "SELECT user_id, region, min_magnitude FROM subscribers"
+SELECT_POINT_SUBSCRIBERS = "SELECT user_id, lat, lon, radius_km, min_magnitude FROM point_subscribers"
+REPLACE_ALERT_TARGET = """
+    REPLACE INTO alert_targets (channel_id, guild_id, min_magnitude, region)
+    VALUES (?, ?, ?, ?)
+"""
+DELETE_GUILD_TARGETS = "DELETE FROM alert_targets WHERE guild_id = ?"
+DELETE_GUILD_TARGET = "DELETE FROM alert_targets WHERE guild_id = ? AND channel_id = ?"
+DELETE_CHAT_TARGET = "DELETE FROM alert_targets WHERE guild_id IS NULL AND channel_id = ?"
+REPLACE_SUBSCRIBER = "REPLACE INTO subscribers (user_id, region, min_magnitude) VALUES (?, ?, ?)"
+DELETE_SUBSCRIBER = "DELETE FROM subscribers WHERE user_id = ?"
+REPLACE_POINT_SUBSCRIBER = """
+    REPLACE INTO point_subscribers (user_id, lat, lon, radius_km, min_magnitude)
+    VALUES (?, ?, ?, ?, ?)
+"""
+DELETE_POINT_SUBSCRIBER = "DELETE FROM point_subscribers WHERE user_id = ?"
+SELECT_WEBHOOKS = "SELECT channel_id, webhook_id, token FROM alert_webhooks"
+INSERT_WEBHOOK_CHANNEL = "INSERT OR IGNORE INTO alert_webhooks (channel_id) VALUES (?)"
+DELETE_WEBHOOK_CHANNEL = "DELETE FROM alert_webhooks WHERE channel_id = ?"
+UPDATE_WEBHOOK = "UPDATE alert_webhooks SET webhook_id = ?, token = ? WHERE channel_id = ?"
+SELECT_SUBSCRIBER = "SELECT region, min_magnitude FROM subscribers WHERE user_id = ?"
+SELECT_POINT_SUBSCRIBER = "SELECT lat, lon, radius_km, min_magnitude FROM point_subscribers WHERE user_id = ?"
+
+def _init_db(conn):
+    migrate(conn)
     c = conn.cursor()
-    c.execute("DELETE FROM subscribers WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    c.execute(SELECT_ALERT_TARGETS)
+    alert_targets = c.fetchall()
+    c.execute(SELECT_SUBSCRIBERS)
+    subscribers = c.fetchall()
+    c.execute(SELECT_POINT_SUBSCRIBERS)
+    point_subscribers = c.fetchall()
+    c.execute(SELECT_WEBHOOKS)
+    webhooks = c.fetchall()
+    return alert_targets, subscribers, point_subscribers, webhooks
+
+async def init_db():
+    print("🛠️ Running init_db()...")
+    load_cache(*await run(_init_db))
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).rowcount
+
+def _drop_target(channel_id):
+    _alert_targets.pop(channel_id, None)
+    _webhooks.pop(channel_id, None)
+    _index.remove(("channel", channel_id))
+
+async def set_alert_channel(guild_id, channel_id, min_magnitude, region):
+    """Add or update the alert target for one channel. guild_id is None for DMs/GCs."""
+    await run(_execute, REPLACE_ALERT_TARGET, (channel_id, guild_id, min_magnitude, region))
+    if not owns(guild_id):
+        return
+    _alert_targets[channel_id] = (guild_id, min_magnitude, region)
+    _index.add(("channel", channel_id), region, min_magnitude)
+
+async def remove_alert_channel(guild_id, channel_id=None):
+    """Remove one of a guild's alert channels, or all of them. Returns how many were removed."""
+    if channel_id is None:
+        removed = await run(_execute, DELETE_GUILD_TARGETS, (guild_id,))
+        for target_id, _, _ in get_alert_channels(guild_id):
+            _drop_target(target_id)
+    else:
+        removed = await run(_execute, DELETE_GUILD_TARGET, (guild_id, channel_id))
+        if removed:
+            _drop_target(channel_id)
+    return removed
+
+async def remove_chat_channel(channel_id):
+    """Remove a DM/GC alert target. Returns True if one was configured."""
+    affected_rows = await run(_execute, DELETE_CHAT_TARGET, (channel_id,))
+    if affected_rows > 0:
+        _drop_target(channel_id)
+    return affected_rows > 0
+
+async def set_webhook_delivery(channel_id, enabled):
+    """Switch a guild alert channel between webhook delivery and the bot's own messages."""
+    if enabled:
+        await run(_execute, INSERT_WEBHOOK_CHANNEL, (channel_id,))
+        if channel_id in _alert_targets:
+            _webhooks.setdefault(channel_id, (None, None))
+    else:
+        await run(_execute, DELETE_WEBHOOK_CHANNEL, (channel_id,))
+        _webhooks.pop(channel_id, None)
+
+async def set_webhook(channel_id, webhook_id, token):
+    """Remember the webhook created for a channel; None, None forgets a deleted one."""
+    await run(_execute, UPDATE_WEBHOOK, (webhook_id, token, channel_id))
+    if channel_id in _webhooks:
+        _webhooks[channel_id] = (webhook_id, token)
+
+async def add_subscriber(user_id, region, min_magnitude):
+    await run(_execute, REPLACE_SUBSCRIBER, (user_id, region, min_magnitude))
+    _subscribers[user_id] = (region, min_magnitude)
+    if owns(None):
+        _index.add(("user", user_id), region, min_magnitude)
+
+async def remove_subscriber(user_id):
+    await run(_execute, DELETE_SUBSCRIBER, (user_id,))
+    _subscribers.pop(user_id, None)
+    _index.remove(("user", user_id))
 
-def get_all_subscribers_with_filters():
-    conn = sqlite3.connect(DB_FILE)
+async def add_point_subscriber(user_id, lat, lon, radius_km, min_magnitude):
+    await run(_execute, REPLACE_POINT_SUBSCRIBER, (user_id, lat, lon, radius_km, min_magnitude))
+    _point_subscribers[user_id] = (lat, lon, radius_km, min_magnitude)
+    if owns(None):
+        _points.add(user_id, lat, lon, radius_km, min_magnitude)
+
+async def remove_point_subscriber(user_id):
+    await run(_execute, DELETE_POINT_SUBSCRIBER, (user_id,))
+    _point_subscribers.pop(user_id, None)
+    _points.remove(user_id)
+
+def _read_subscriber(conn, user_id):
+    return conn.execute(SELECT_SUBSCRIBER, (user_id,)).fetchone(), conn.execute(SELECT_POINT_SUBSCRIBER, (user_id,)).fetchone()
+
+async def refresh_subscriber(user_id):
+    """Re-read one user's DM subscriptions after another shard worker changed them."""
+    region_row, point_row = await run(_read_subscriber, user_id)
+    if region_row:
+        _subscribers[user_id] = tuple(region_row)
+        if owns(None):
+            _index.add(("user", user_id), *region_row)
+    else:
+        _subscribers.pop(user_id, None)
+        _index.remove(("user", user_id))
+    if point_row:
+        _point_subscribers[user_id] = tuple(point_row)
+        if owns(None):
+            _points.add(user_id, *point_row)
+    else:
+        _point_subscribers.pop(user_id, None)
+        _points.remove(user_id)
+
+# =======================================================
+# Seen Event Store
+# =======================================================
+
+SEEN_EVENT_RETENTION = 2 * 24 * 60 * 60  # seconds; must outlast the longest feed window
+
+def init_seen_events(c):
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS seen_events (
+        event_id TEXT PRIMARY KEY,
+        updated INTEGER,
+        seen_at INTEGER
+    )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_seen_events_seen_at ON seen_events (seen_at)")
+
+def _has_seen_events(conn):
+    return conn.execute("SELECT 1 FROM seen_events LIMIT 1").fetchone() is not None
+
+async def has_seen_events():
+    return await run(_has_seen_events)
+
+def _claim_new_events(conn, events):
+    now = int(time.time())
     c = conn.cursor()
-    c.execute("SELECT user_id, region, min_magnitude FROM subscribers")
-    result = c.fetchall()
-    conn.close()
-    return result
\ No newline at end of file
+    ids = list({alias for _, aliases, _ in events for alias in aliases})
+    known = set()
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        c.execute(
+            f"SELECT event_id FROM seen_events WHERE event_id IN ({','.join('?' * len(chunk))})",
+            chunk
+        )
+        known.update(row[0] for row in c.fetchall())
+    # Every alias is stored, so the event stays known whichever ID USGS prefers next
+    c.executemany(
+        "INSERT OR IGNORE INTO seen_events (event_id, updated, seen_at) VALUES (?, ?, ?)",
+        [(alias, updated, now) for _, aliases, updated in events for alias in aliases if alias not in known]
+    )
+    c.executemany(
+        "UPDATE seen_events SET updated = ? WHERE event_id = ? AND updated < ?",
+        [(updated, alias, updated) for _, aliases, updated in events for alias in aliases if alias in known]
+    )
+    return {event_id for event_id, aliases, _ in events if known.isdisjoint(aliases)}
+
+async def claim_new_events(events):
+    """Record (event_id, aliases, updated) triples and return the IDs of events never seen under any alias.
+
+    Known events only get their `updated` stamp refreshed, so USGS revisions
+    of an event, and a change of its preferred ID, never come back as new.
+    `aliases` includes event_id itself; see ingest.event_aliases().
+    """
+    if not events:
+        return set()
+    return await run(_claim_new_events, events)
+
+async def evict_seen_events(max_age=SEEN_EVENT_RETENTION):
+    await run(_execute, "DELETE FROM seen_events WHERE seen_at < ?", (int(time.time()) - max_age,))
+
+# =======================================================
+# Settings
+# =======================================================
+
+def _get_setting(conn, key):
+    row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+async def get_setting(key):
+    return await run(_get_setting, key)
+
+async def set_setting(key, value):
+    await run(_execute, "REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+
+from metrics import RATE_LIMIT_WAIT, SEND, SENDS
+
+# Discord allows 50 requests/s per bot and 5 messages per 5 s per channel route
+GLOBAL_LIMIT = 50
+GLOBAL_PERIOD = 1.0
+ROUTE_LIMIT = 5
+ROUTE_PERIOD = 5.0
+SAFETY_MARGIN = 0.05  # seconds added to each window to absorb clock and network jitter
+
+WORKERS = 16
+
+CHANNEL = 0  # channels are delivered ahead of DMs
+DM = 1
+KIND_NAMES = ("channel", "dm")
+
+# =======================================================
+# Rate Limiting
+# =======================================================
+
+class RateLimiter:
+    """Sliding window: at most `limit` acquisitions in any `period` seconds."""
+
+    __slots__ = ("limit", "period", "stamps")
+
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.stamps = deque()
+
+    def delay(self, now):
+        while self.stamps and now - self.stamps[0] >= self.period:
+            self.stamps.popleft()
+        if len(self.stamps) < self.limit:
+            return 0.0
+        return self.stamps[0] + self.period - now
+
+    def acquire(self, now):
+        self.stamps.append(now)
+
+# =======================================================
+# Alert Dispatcher
+# =======================================================
+
+class Delivery:
+    """One message to one target. `send` is a zero-argument coroutine function.
+
+    `events` lists the event IDs a digest message covers (see coalesce.py);
+    it is None for a single-event alert.
+    """
+
+    __slots__ = ("route", "kind", "label", "send", "report", "events")
+
+    def __init__(self, route, kind, label, send, events=None):
+        self.route = route
+        self.kind = kind
+        self.label = label
+        self.send = send
+        self.report = None
+        self.events = events
+
+class EventReport:
+    __slots__ = ("event_id", "magnitude", "submitted", "total", "delivered", "failed", "last_delivery", "done")
+
+    def __init__(self, event_id, magnitude, total):
+        self.event_id = event_id
+        self.magnitude = magnitude
+        self.submitted = time.monotonic()
+        self.total = total
+        self.delivered = 0
+        self.failed = 0
+        self.last_delivery = None
+        self.done = asyncio.Event()
+
+    @property
+    def time_to_last_delivery(self):
+        if self.last_delivery is None:
+            return None
+        return self.last_delivery - self.submitted
+
+class AlertDispatcher:
+    """Fans deliveries out over a bounded worker pool, within Discord's rate limits.
+
+    Channels go before DMs and larger magnitudes before smaller ones. A
+    delivery whose route is still limited is parked with call_later instead
+    of holding a worker, so one busy channel never stalls the others.
+    """
+
+    def __init__(self, workers=WORKERS, global_limit=GLOBAL_LIMIT, global_period=GLOBAL_PERIOD,
+                 route_limit=ROUTE_LIMIT, route_period=ROUTE_PERIOD, margin=SAFETY_MARGIN, on_report=None,
+                 on_delivery=None):
+        self.workers = workers
+        self.global_limiter = RateLimiter(global_limit, global_period + margin)
+        self.route_limit = route_limit
+        self.route_period = route_period + margin
+        self.routes = {}
+        self.on_report = on_report
+        self.on_delivery = on_delivery
+        self.reports = deque(maxlen=100)
+        self.rate_limit_waits = 0.0
+
+        self._queue = None
+        self._tasks = []
+        self._parked = set()
+        self._seq = itertools.count()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for handle in self._parked:
+            handle.cancel()
+        self._parked.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, event_id, magnitude, deliveries):
+        """Queue every delivery for one event and return its EventReport."""
+        report = EventReport(event_id, magnitude, len(deliveries))
+        if not deliveries:
+            report.done.set()
+            return report
+        for delivery in deliveries:
+            delivery.report = report
+            self._put(delivery)
+        return report
+
+    def _put(self, delivery):
+        priority = (delivery.kind, -(delivery.report.magnitude or 0), next(self._seq))
+        self._queue.put_nowait((priority, delivery))
+
+    def _route(self, route):
+        limiter = self.routes.get(route)
+        if limiter is None:
+            limiter = self.routes[route] = RateLimiter(self.route_limit, self.route_period)
+        return limiter
+
+    def _park(self, delivery, wait):
+        def requeue():
+            self._parked.discard(handle)
+            self._put(delivery)
+        handle = asyncio.get_running_loop().call_later(wait, requeue)
+        self._parked.add(handle)
+
+    async def _worker(self):
+        while True:
+            _, delivery = await self._queue.get()
+            try:
+                route = self._route(delivery.route)
+                wait = route.delay(time.monotonic())
+                if wait > 0:
+                    self.rate_limit_waits += wait
+                    RATE_LIMIT_WAIT.labels("route").inc(wait)
+                    self._park(delivery, wait)
+                    continue
+                route.acquire(time.monotonic())
+
+                while (wait := self.global_limiter.delay(time.monotonic())) > 0:
+                    self.rate_limit_waits += wait
+                    RATE_LIMIT_WAIT.labels("global").inc(wait)
+                    await asyncio.sleep(wait)
+                self.global_limiter.acquire(time.monotonic())
+
+                await self._deliver(delivery)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, delivery):
+        report = delivery.report
+        kind = KIND_NAMES[delivery.kind]
+        error = None
+        start = time.perf_counter()
+        try:
+            await delivery.send()
+            report.delivered += 1
+        except Exception as e:
+            error = e
+            report.failed += 1
+            print(f"❌ Failed to send to {delivery.label}: {e}")
+        SEND.labels(kind).observe(time.perf_counter() - start)
+        SENDS.labels(kind, "failed" if error else "delivered").inc()
+        report.last_delivery = time.monotonic()
+        if self.on_delivery:
+            self.on_delivery(delivery, report.last_delivery - report.submitted, error)
+
+        if report.delivered + report.failed == report.total:
+            report.done.set()
+            self.reports.append(report)
+            if self.on_report:
+                self.on_report(report)
@@ -0,0 +1,127 @@
+import json
+import re
+import time
+
+import aiohttp
+
+from metrics import FEED_BYTES, FEED_FETCH, FEED_PARSE
+
+USGS_FEED_URL = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/all_hour.geojson"
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+POOL_SIZE = 32  # connections shared by the feed poller and webhook delivery
+USER_AGENT = "Earthquake-Alerts Discord Bot"
+
+# USGS writes "metadata" first, so the stamp sits within the first few hundred bytes
+GENERATED_PATTERN = re.compile(rb'"generated"\s*:\s*(\d+)')
+GENERATED_PEEK_BYTES = 1024
+
+def peek_generated(body):
+    match = GENERATED_PATTERN.search(body, 0, GENERATED_PEEK_BYTES)
+    return int(match.group(1)) if match else None
+
+# =======================================================
+# USGS Feed Client
+# =======================================================
+
+def create_session(pool_size=POOL_SIZE):
+    """The bot's one long-lived, pooled HTTP session; must be created inside the running event loop."""
+    connector = aiohttp.TCPConnector(limit=pool_size, ttl_dns_cache=300)
+    return aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT})
+
+class FeedClient:
+    """Fetches a GeoJSON feed over a long-lived, pooled aiohttp session.
+
+    The session is the one given to use_session(), shared with the rest of
+    the bot; without one the client opens, and later closes, its own.
+    """
+
+    def __init__(self, url=USGS_FEED_URL, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, pool_size=POOL_SIZE):
+        self.url = url
+        self.timeout = aiohttp.ClientTimeout(
+            total=connect_timeout + read_timeout,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self.pool_size = pool_size
+        self._session = None
+        self._shared = None
+
+        # Validators from the last full response
+        self.etag = None
+        self.last_modified = None
+        self.generated = None
+
+        self.polls = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.bytes_downloaded = 0
+
+    def use_session(self, session):
+        self._shared = session
+
+    @property
+    def session(self):
+        if self._shared is not None:
+            return self._shared
+        # Created lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = create_session(self.pool_size)
+        return self._session
+
+    async def fetch(self):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with self.session.get(self.url, timeout=self.timeout) as response:
+                status = str(response.status)
+                response.raise_for_status()
+                body = await response.read()
+        finally:
+            FEED_FETCH.labels(status).observe(time.perf_counter() - start)
+        self.bytes_downloaded += len(body)
+        FEED_BYTES.inc(len(body))
+        with FEED_PARSE.time():
+            return json.loads(body)
+
+    async def poll(self):
+        """Conditionally fetch the feed. Returns None when nothing changed since the last poll."""
+        self.polls += 1
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        start = time.perf_counter()
+        status = "error"
+        try:
+            async with self.session.get(self.url, headers=headers, timeout=self.timeout) as response:
+                status = str(response.status)
+                if response.status == 304:
+                    self.not_modified += 1
+                    return None
+                response.raise_for_status()
+                body = await response.read()
+                self.etag = response.headers.get("ETag")
+                self.last_modified = response.headers.get("Last-Modified")
+        finally:
+            FEED_FETCH.labels(status).observe(time.perf_counter() - start)
+        self.bytes_downloaded += len(body)
+        FEED_BYTES.inc(len(body))
+
+        generated = peek_generated(body)
+        if generated is not None and generated == self.generated:
+            self.unchanged += 1
+            return None
+
+        with FEED_PARSE.time():
+            data = json.loads(body)
+        self.generated = data.get("metadata", {}).get("generated", generated)
+        return data
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
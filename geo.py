@@ -0,0 +1,22 @@
+import math
+
+EARTH_RADIUS_KM = 6371.0
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def radius_box(lat, lon, radius_km):
+    """(lat_min, lat_max, lon_min, lon_max) containing every point within radius_km of (lat, lon)."""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    lat_min, lat_max = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    if lat_min <= -90.0 or lat_max >= 90.0:
+        return lat_min, lat_max, -180.0, 180.0
+    dlon = math.degrees(math.asin(min(1.0, math.sin(radius_km / EARTH_RADIUS_KM) / math.cos(math.radians(lat)))))
+    lon_min, lon_max = lon - dlon, lon + dlon
+    if lon_min < -180.0:
+        lon_min += 360.0
+    if lon_max > 180.0:
+        lon_max -= 360.0
+    return lat_min, lat_max, lon_min, lon_max
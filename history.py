@@ -0,0 +1,179 @@
+import sqlite_store
+from geo import haversine_km, radius_box
+from snapshot import Quake
+from sqlite_store import Store
+
+HISTORY_FILE = "history.db"
+CELL_SIZE = 1.0        # degrees per grid cell
+MAX_CELLS = 2000       # larger areas filter on lat/lon instead of listing cells
+PAGE_SIZE = 10
+
+# =======================================================
+# Connection
+# =======================================================
+
+def connect(path=HISTORY_FILE):
+    conn = sqlite_store.connect(path)
+    conn.create_function("haversine_km", 4, haversine_km, deterministic=True)
+    init_history(conn)
+    return conn
+
+def init_history(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS events (
+        event_id TEXT NOT NULL UNIQUE,
+        time INTEGER NOT NULL,
+        updated INTEGER,
+        magnitude REAL NOT NULL,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        depth REAL,
+        place TEXT,
+        url TEXT,
+        cell INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_time ON events (time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_magnitude_time ON events (magnitude, time)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_events_cell_time ON events (cell, time)")
+    conn.commit()
+
+# Kept apart from botdata.db: it only ever grows, and its writes and long
+# scans should not queue behind (or in front of) slash-command settings.
+_store = Store("history", lambda: connect(HISTORY_FILE))
+
+async def run(fn, *args):
+    """Run fn(conn, *args) on the history thread and commit."""
+    return await _store.run(fn, *args)
+
+async def close_history():
+    await _store.close()
+
+# =======================================================
+# Grid Cells
+# =======================================================
+
+COLUMNS = int(360 / CELL_SIZE)
+
+def cell_of(lat, lon):
+    row = min(int((lat + 90) // CELL_SIZE), int(180 / CELL_SIZE) - 1)
+    col = int((lon + 180) // CELL_SIZE) % COLUMNS
+    return row * COLUMNS + col
+
+def cells_in(lat_min, lat_max, lon_min, lon_max):
+    """Every cell overlapping the box, or None if there are more than MAX_CELLS. Handles boxes across the antimeridian."""
+    top = cell_of(lat_max, 0) // COLUMNS
+    bottom = cell_of(lat_min, 0) // COLUMNS
+    first = cell_of(0, lon_min) % COLUMNS
+    last = cell_of(0, lon_max) % COLUMNS
+    if lon_max - lon_min >= 360 - CELL_SIZE:
+        cols = list(range(COLUMNS))
+    elif first <= last:
+        cols = list(range(first, last + 1))
+    else:
+        cols = list(range(first, COLUMNS)) + list(range(0, last + 1))
+    if (top - bottom + 1) * len(cols) > MAX_CELLS:
+        return None
+    return [row * COLUMNS + col for row in range(bottom, top + 1) for col in cols]
+
+# =======================================================
+# Recording
+# =======================================================
+
+# A row is only rewritten for a newer USGS revision; nothing is ever deleted
+UPSERT_EVENT = """
+    INSERT INTO events (event_id, time, updated, magnitude, lat, lon, depth, place, url, cell)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (event_id) DO UPDATE SET
+        updated = excluded.updated, magnitude = excluded.magnitude, lat = excluded.lat,
+        lon = excluded.lon, depth = excluded.depth, place = excluded.place,
+        url = excluded.url, cell = excluded.cell
+    WHERE excluded.updated > events.updated
+"""
+
+def _row(feature):
+    props = feature["properties"]
+    coords = feature["geometry"]["coordinates"]
+    lon, lat = coords[0], coords[1]
+    updated = props.get("updated") or props["time"]
+    depth = coords[2] if len(coords) > 2 else None
+    return (
+        feature["id"], props["time"], updated, props["mag"], lat, lon, depth,
+        props.get("place"), props.get("url"), cell_of(lat, lon)
+    )
+
+def _record(conn, rows):
+    conn.executemany(UPSERT_EVENT, rows)
+
+async def record_events(features):
+    """Store (or revise) every feature that has a magnitude."""
+    rows = [_row(f) for f in features if f["properties"].get("mag") is not None]
+    if rows:
+        await run(_record, rows)
+
+# =======================================================
+# Queries
+# =======================================================
+
+SELECT_EVENTS = "SELECT rowid, event_id, magnitude, place, time, updated, lat, lon, depth, url FROM events"
+
+def _box_filter(box, where, params):
+    lat_min, lat_max, lon_min, lon_max = box
+    cells = cells_in(lat_min, lat_max, lon_min, lon_max)
+    if cells is not None:
+        where.append(f"cell IN ({','.join(map(str, cells))})")
+    where.append("lat BETWEEN ? AND ?")
+    params += [lat_min, lat_max]
+    if lon_min <= lon_max:
+        where.append("lon BETWEEN ? AND ?")
+        params += [lon_min, lon_max]
+    else:
+        where.append("(lon >= ? OR lon <= ?)")
+        params += [lon_min, lon_max]
+
+def _query(conn, start, end, min_magnitude, bbox, near, limit, cursor):
+    where = []
+    params = []
+    if start is not None:
+        where.append("time >= ?")
+        params.append(start)
+    if end is not None:
+        where.append("time < ?")
+        params.append(end)
+    if min_magnitude is not None:
+        where.append("magnitude >= ?")
+        params.append(min_magnitude)
+    if bbox is not None:
+        _box_filter(bbox, where, params)
+    if near is not None:
+        lat, lon, radius_km = near
+        _box_filter(radius_box(lat, lon, radius_km), where, params)
+        where.append("haversine_km(?, ?, lat, lon) <= ?")
+        params += [lat, lon, radius_km]
+    if cursor is not None:
+        # Keyset pagination: strictly older than the last row of the previous page
+        where.append("time <= ? AND (time, rowid) < (?, ?)")
+        params += [cursor[0], cursor[0], cursor[1]]
+
+    sql = SELECT_EVENTS
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY time DESC, rowid DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+
+    page = [Quake(*row[1:]) for row in rows[:limit]]
+    next_cursor = (rows[limit - 1][4], rows[limit - 1][0]) if len(rows) > limit else None
+    return page, next_cursor
+
+async def query_events(start=None, end=None, min_magnitude=None, bbox=None, near=None, limit=PAGE_SIZE, cursor=None):
+    """One page of stored events, newest first.
+
+    start/end are epoch milliseconds, bbox is (lat_min, lat_max, lon_min,
+    lon_max) as in REGIONS and may cross the antimeridian (lon_min > lon_max),
+    near is (lat, lon, radius_km).
+    Returns (quakes, cursor); pass the cursor back for the next page, it is
+    None on the last one.
+    """
+    return await run(_query, start, end, min_magnitude, bbox, near, limit, cursor)
+
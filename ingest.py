@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import time
+
+from feed import FeedClient
+
+USGS_FEED_BASE = "https://earthquake.usgs.gov/earthquakes/feed/v1.0/summary/"
+FEEDS = ("all_hour",)
+CATCH_UP_FEEDS = ("all_day",)
+CATCH_UP_AFTER = 10 * 60  # seconds without a successful poll before the catch-up feeds are read
+
+def feed_url(feed):
+    return f"{USGS_FEED_BASE}{feed}.geojson"
+
+def event_aliases(feature):
+    """Every ID USGS has given an event: its current one plus the comma-separated "ids" list."""
+    ids = [feature["id"]]
+    ids.extend(i for i in (feature["properties"].get("ids") or "").split(",") if i and i != feature["id"])
+    return ids
+
+def revision(feature):
+    props = feature["properties"]
+    return props.get("updated") or props["time"]
+
+# =======================================================
+# Sources
+# =======================================================
+
+class FeedSource:
+    """Anything that yields GeoJSON earthquake features.
+
+    poll() returns a list of features, or None when nothing changed since
+    the last call. `generated` is the source's own timestamp (ms) for the
+    data it last returned, if it has one.
+    """
+
+    name = "source"
+    generated = None
+
+    async def poll(self):
+        raise NotImplementedError
+
+    def use_session(self, session):
+        """Make HTTP requests over the bot's shared aiohttp session, if this source makes any."""
+
+    async def close(self):
+        pass
+
+class USGSSource(FeedSource):
+    """One USGS summary feed, e.g. "all_hour", "4.5_hour" or "significant_day"."""
+
+    def __init__(self, feed, client=None):
+        self.name = feed
+        self.client = client or FeedClient(feed_url(feed))
+
+    @property
+    def generated(self):
+        return self.client.generated
+
+    async def poll(self):
+        data = await self.client.poll()
+        return None if data is None else data["features"]
+
+    def use_session(self, session):
+        self.client.use_session(session)
+
+    async def close(self):
+        await self.client.close()
+
+class FileSource(FeedSource):
+    """A GeoJSON file on disk, re-read whenever it changes. For offline runs and replays."""
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.path = path
+        self.generated = None
+        self._mtime = None
+
+    def _read(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return None
+        with open(self.path, "rb") as f:
+            data = json.loads(f.read())
+        self._mtime = mtime
+        return data
+
+    async def poll(self):
+        data = await asyncio.to_thread(self._read)
+        if data is None:
+            return None
+        self.generated = data.get("metadata", {}).get("generated")
+        return data["features"]
+
+# =======================================================
+# Merging
+# =======================================================
+
+def merge(batches):
+    """Fold feature lists from several feeds into one list, oldest first.
+
+    An event that appears in more than one feed, or under more than one
+    network's ID (USGS lists them all in "ids"), is kept once, at its most
+    recently updated revision. Features without a magnitude are dropped.
+    """
+    merged = {}
+    aliases = {}
+    for features in batches:
+        for feature in features:
+            props = feature["properties"]
+            if props.get("mag") is None:
+                continue
+            ids = event_aliases(feature)
+            key = next((aliases[i] for i in ids if i in aliases), feature["id"])
+            for i in ids:
+                aliases[i] = key
+
+            current = merged.get(key)
+            if current is None or revision(feature) > revision(current):
+                merged[key] = feature
+    return sorted(merged.values(), key=lambda f: f["properties"]["time"])
+
+class Ingestor:
+    """Polls every source at once and hands back one merged event stream.
+
+    Catch-up sources (a longer feed such as all_day) are only read on the
+    first poll and after CATCH_UP_AFTER seconds without a successful one,
+    so events published while the bot was down are still picked up.
+    """
+
+    def __init__(self, sources, catch_up=(), catch_up_after=CATCH_UP_AFTER):
+        self.sources = list(sources)
+        self.catch_up = list(catch_up)
+        self.catch_up_after = catch_up_after
+        self.last_success = None
+        self.generated = None
+        self._latest = {}  # source -> its most recent features, so every merge covers all of them
+
+        self.polls = 0
+        self.catch_ups = 0
+        self.errors = 0
+        self.features_in = 0
+        self.features_out = 0
+
+    def _due(self, now):
+        if self.catch_up and (self.last_success is None or now - self.last_success > self.catch_up_after):
+            self.catch_ups += 1
+            return self.sources + self.catch_up
+        return self.sources
+
+    async def poll(self):
+        """Poll the sources. Returns the merged features, or None if none of them changed.
+
+        Raises the last error if every source failed.
+        """
+        self.polls += 1
+        now = time.monotonic()
+        sources = self._due(now)
+        results = await asyncio.gather(*(source.poll() for source in sources), return_exceptions=True)
+
+        catch_up = []
+        changed = False
+        error = None
+        failed = 0
+        for source, result in zip(sources, results):
+            if isinstance(result, Exception):
+                error = result
+                failed += 1
+                print(f"❌ Error polling {source.name}: {result}")
+            elif result is not None:
+                changed = True
+                if source in self.catch_up:
+                    catch_up.append(result)
+                else:
+                    self._latest[source] = result
+
+        stamps = [source.generated for source in sources if source.generated is not None]
+        if stamps:
+            self.generated = max(stamps)
+        self.errors += failed
+        if sources and failed == len(sources):
+            raise error
+        self.last_success = now
+
+        if not changed:
+            return None
+        batches = list(self._latest.values()) + catch_up
+        merged = merge(batches)
+        self.features_in += sum(len(batch) for batch in batches)
+        self.features_out += len(merged)
+        return merged
+
+    def use_session(self, session):
+        for source in self.sources + self.catch_up:
+            source.use_session(session)
+
+    async def close(self):
+        await asyncio.gather(*(source.close() for source in self.sources + self.catch_up))
+
+def usgs_ingestor(feeds=FEEDS, catch_up=CATCH_UP_FEEDS, catch_up_after=CATCH_UP_AFTER):
+    return Ingestor(
+        [USGSSource(feed) for feed in feeds],
+        [USGSSource(feed) for feed in catch_up],
+        catch_up_after
+    )
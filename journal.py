@@ -0,0 +1,133 @@
+import asyncio
+import glob
+import gzip
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+JOURNAL_FILE = "alerts.jsonl"
+MAX_BYTES = 10 * 1024 * 1024     # rotate once the live file passes this size...
+MAX_AGE = 24 * 60 * 60           # ...or this many seconds after it was started
+BACKUPS = 14                     # compressed files kept
+FLUSH_INTERVAL = 2.0             # seconds
+MAX_BUFFER = 1000                # records that trigger an early flush
+
+# =======================================================
+# Alert Journal
+# =======================================================
+
+class AlertJournal:
+    """Structured JSON-lines log of every alert delivery.
+
+    record() only appends to an in-memory buffer, so it costs nothing on
+    the send path; a background task writes batches from a worker thread
+    and rotates the file by size or age into gzip-compressed backups.
+    """
+
+    def __init__(self, path=JOURNAL_FILE, max_bytes=MAX_BYTES, max_age=MAX_AGE, backups=BACKUPS,
+                 flush_interval=FLUSH_INTERVAL, max_buffer=MAX_BUFFER):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+
+        self._buffer = []
+        self._task = None
+        self._early_flush = None
+        self._lock = None
+        self._opened_at = None
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        if self._task is None:
+            self._lock = asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._early_flush is not None:
+            await asyncio.gather(self._early_flush, return_exceptions=True)
+        await self.flush()
+
+    def record(self, event_id, target, outcome, latency=None, **fields):
+        entry = {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "event_id": event_id,
+            "target": target,
+            "outcome": outcome,
+            "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+            **fields
+        }
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.max_buffer and self._task is not None:
+            if self._early_flush is None or self._early_flush.done():
+                self._early_flush = asyncio.get_running_loop().create_task(self.flush())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in batch)
+        lock = self._lock or asyncio.Lock()
+        async with lock:
+            try:
+                await asyncio.to_thread(self._write, lines)
+                self.written += len(batch)
+            except OSError as e:
+                self.dropped += len(batch)
+                print(f"❌ Failed to write alert journal: {e}")
+
+    # Everything below runs on a worker thread
+
+    def _write(self, lines):
+        if self._opened_at is None:
+            self._opened_at = self._started_at()
+        if self._should_rotate():
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def _started_at(self):
+        # An existing file was started when its first record was written
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return datetime.fromisoformat(json.loads(f.readline())["ts"]).timestamp()
+        except (OSError, ValueError, KeyError):
+            return time.time()
+
+    def _should_rotate(self):
+        if not os.path.exists(self.path):
+            return False
+        too_big = os.path.getsize(self.path) >= self.max_bytes
+        too_old = time.time() - self._opened_at >= self.max_age
+        return too_big or too_old
+
+    def _rotate(self):
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+        rotated = f"{self.path}.{stamp}"
+        suffix = 1
+        while os.path.exists(rotated + ".gz"):
+            rotated = f"{self.path}.{stamp}-{suffix}"
+            suffix += 1
+        os.replace(self.path, rotated)
+        self._opened_at = time.time()
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+
+        backups = sorted(glob.glob(f"{glob.escape(self.path)}.*.gz"), key=os.path.getmtime)
+        for old in backups[:-self.backups]:
+            os.remove(old)
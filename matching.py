@@ -0,0 +1,371 @@
+import asyncio
+import math
+from bisect import bisect_left, bisect_right
+
+from geo import EARTH_RADIUS_KM, haversine_km
+
+WORLD = "World"
+CELL_SIZE = 5.0  # degrees
+POINT_LEVELS = (2.0, 8.0, 30.0, 90.0)  # grid cell sizes in degrees, finest first
+POINT_CELLS = 16                      # most cells one point subscription is listed in (except on the last level)
+
+# =======================================================
+# Subscription Index
+# =======================================================
+
+class MagnitudeBucket:
+    """Targets of one region, kept sorted by minimum magnitude."""
+
+    __slots__ = ("mags", "keys")
+
+    def __init__(self):
+        self.mags = []
+        self.keys = []
+
+    def add(self, min_magnitude, key):
+        i = bisect_right(self.mags, min_magnitude)
+        self.mags.insert(i, min_magnitude)
+        self.keys.insert(i, key)
+
+    def remove(self, min_magnitude, key):
+        i = bisect_left(self.mags, min_magnitude)
+        while i < len(self.keys) and self.mags[i] == min_magnitude:
+            if self.keys[i] == key:
+                del self.mags[i]
+                del self.keys[i]
+                return
+            i += 1
+
+    def matching(self, mag):
+        # Everything up to the first threshold above mag wants this event
+        return self.keys[:bisect_right(self.mags, mag)]
+
+    def __len__(self):
+        return len(self.keys)
+
+class SubscriptionIndex:
+    """Answers "which targets want an M>=mag event at (lat, lon)?" without scanning every target.
+
+    Each region keeps a magnitude-sorted bucket, and a grid of CELL_SIZE
+    degree cells maps every cell to the region boxes overlapping it. Targets
+    whose region has no bounds (World, or a name missing from `regions`)
+    live in one shared bucket that matches everywhere, as the old bbox loop did.
+
+    A `locator` (e.g. polygons.PolygonLocator) replaces the bounding-box
+    test: its locate(lat, lon) names the regions that contain the point.
+    """
+
+    def __init__(self, regions, cell_size=CELL_SIZE, locator=None):
+        self.regions = regions
+        self.cell_size = cell_size
+        self.locator = locator
+        self.rows = int(180 // cell_size) + 1
+        self.cols = int(360 // cell_size) + 1
+        self._cells = {}
+        self._buckets = {}
+        self._entries = {}
+
+        for name, bounds in regions.items():
+            if not bounds:
+                continue
+            lat_min, lat_max, lon_min, lon_max = bounds
+            if lat_min > lat_max or lon_min > lon_max:
+                continue
+            row_min, col_min = self._cell(lat_min, lon_min)
+            row_max, col_max = self._cell(lat_max, lon_max)
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    self._cells.setdefault((row, col), []).append(name)
+
+    def _cell(self, lat, lon):
+        row = min(max(int((lat + 90) // self.cell_size), 0), self.rows - 1)
+        col = min(max(int((lon + 180) // self.cell_size), 0), self.cols - 1)
+        return row, col
+
+    def _bucket_name(self, region):
+        return region if self.regions.get(region) else WORLD
+
+    def add(self, key, region, min_magnitude):
+        self.remove(key)
+        if region is None or min_magnitude is None:
+            return
+        bucket_name = self._bucket_name(region)
+        self._buckets.setdefault(bucket_name, MagnitudeBucket()).add(min_magnitude, key)
+        self._entries[key] = (bucket_name, min_magnitude)
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        bucket_name, min_magnitude = entry
+        bucket = self._buckets[bucket_name]
+        bucket.remove(min_magnitude, key)
+        if not bucket:
+            del self._buckets[bucket_name]
+
+    def clear(self):
+        self._buckets.clear()
+        self._entries.clear()
+
+    def match(self, lat, lon, mag):
+        matched = []
+        world = self._buckets.get(WORLD)
+        if world:
+            matched.extend(world.matching(mag))
+        if self.locator is not None:
+            for name in self.locator.locate(lat, lon):
+                bucket = self._buckets.get(name)
+                if bucket:
+                    matched.extend(bucket.matching(mag))
+            return matched
+        for name in self._cells.get(self._cell(lat, lon), ()):
+            bucket = self._buckets.get(name)
+            if not bucket:
+                continue
+            lat_min, lat_max, lon_min, lon_max = self.regions[name]
+            if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
+                matched.extend(bucket.matching(mag))
+        return matched
+
+    def __len__(self):
+        return len(self._entries)
+
+# =======================================================
+# Point Subscription Index
+# =======================================================
+
+class PointLevel:
+    """One grid level: its subscriptions' arrays sorted by (cell, min_magnitude), and each cell's slice."""
+
+    __slots__ = ("size", "cols", "slices", "index", "lat", "lon", "cos_lat", "reach", "min_mag")
+
+    def __init__(self, size, cols, slices, index, lat, lon, cos_lat, reach, min_mag):
+        self.size = size
+        self.cols = cols
+        self.slices = slices
+        self.index = index
+        self.lat = lat
+        self.lon = lon
+        self.cos_lat = cos_lat
+        self.reach = reach
+        self.min_mag = min_mag
+
+class PointIndex:
+    """Answers "which "within N km of a point" subscriptions want an M>=mag event at (lat, lon)?"
+
+    Each subscription is listed in the cells its circle's bounding box
+    overlaps, on the finest of several grid levels where that is at most
+    POINT_CELLS cells, so a 25 km circle and a 5000 km one both stay cheap.
+    An event looks up its own cell on every level. Within a cell the arrays
+    are contiguous and sorted by minimum magnitude, so only subscriptions
+    that want the magnitude reach the NumPy haversine.
+
+    After a subscription changes (only slash commands do that) the arrays
+    are rebuilt in a worker thread and swapped in when done; until then the
+    few changed subscriptions are checked one by one and their old entries
+    ignored, so a change never stalls matching on the event loop. Outside a
+    running event loop the rebuild happens on the next match instead.
+    """
+
+    def __init__(self, levels=POINT_LEVELS, max_cells=POINT_CELLS):
+        self.levels = levels
+        self.max_cells = max_cells
+        self._points = {}  # key -> (lat, lon, radius_km, min_magnitude)
+        self._built = None  # (keys, levels, points) of the arrays in use
+        self._added = {}    # key -> point changed since those were built, matched one by one
+        self._stale = set() # keys whose entry in the arrays no longer applies
+        self._changed = set()  # keys changed since the newest rebuild started
+        self._generation = 0   # bumped for every rebuild started, so an outdated one is thrown away
+        self._rebuild = None   # the background rebuild task
+
+    def add(self, key, lat, lon, radius_km, min_magnitude):
+        self._points[key] = (lat, lon, radius_km, min_magnitude)
+        self._change(key)
+
+    def remove(self, key):
+        if self._points.pop(key, None) is not None:
+            self._change(key)
+
+    def clear(self):
+        self._points.clear()
+        self._built = None
+        self._added.clear()
+        self._stale.clear()
+        self._changed.clear()
+        self._generation += 1
+
+    def __len__(self):
+        return len(self._points)
+
+    def _change(self, key):
+        self._changed.add(key)
+        if self._built is not None:
+            self._track(key, self._built[2])
+        if self._rebuild is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._rebuild = loop.create_task(self._rebuild_in_background())
+
+    def _track(self, key, built):
+        """Note how `key` now differs from the arrays built from `built`."""
+        point = self._points.get(key)
+        if built.get(key) == point:
+            self._added.pop(key, None)
+            self._stale.discard(key)
+            return
+        if point is None:
+            self._added.pop(key, None)
+        else:
+            self._added[key] = point
+        if key in built:
+            self._stale.add(key)
+
+    def _start(self):
+        self._generation += 1
+        self._changed = set()
+        return self._generation, dict(self._points)
+
+    def _install(self, generation, points, built):
+        if generation != self._generation:
+            return
+        changed = self._changed
+        self._built = (*built, points)
+        self._added = {}
+        self._stale = set()
+        for key in changed:
+            self._track(key, points)
+
+    async def _rebuild_in_background(self):
+        try:
+            while self._changed:
+                generation, points = self._start()
+                built = await asyncio.to_thread(self._build, points)
+                self._install(generation, points, built)
+        finally:
+            self._rebuild = None
+
+    def _build_now(self):
+        generation, points = self._start()
+        self._install(generation, points, self._build(points))
+
+    def _build(self, points):
+        """The arrays for `points`: (keys, levels). Reads nothing else of self, so it can run in a thread."""
+        # Imported here so a bot without point subscriptions never loads NumPy (~80 ms at start-up)
+        import numpy as np
+
+        keys = list(points)
+        if not keys:
+            return keys, []
+        values = np.array(list(points.values()), dtype=np.float64).reshape(-1, 4)
+        lat, lon, radius, min_mag = values.T
+        angle = np.minimum(radius / EARTH_RADIUS_KM, math.pi)
+
+        # Bounding boxes of every circle, as geo.radius_box does one at a time
+        dlat = np.degrees(angle)
+        lat_min = np.maximum(-90.0, lat - dlat)
+        lat_max = np.minimum(90.0, lat + dlat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.sin(np.minimum(angle, math.pi / 2)) / np.cos(np.radians(lat))
+        polar = (lat_min <= -90.0) | (lat_max >= 90.0) | ~(ratio < 1.0)
+        dlon = np.where(polar, 180.0, np.degrees(np.arcsin(np.minimum(ratio, 1.0))))
+
+        # Compare haversine terms directly: a <= sin^2(d / 2R) means distance <= d
+        reach = np.sin(angle / 2) ** 2
+        rad_lat = np.radians(lat)
+        rad_lon = np.radians(lon)
+        cos_lat = np.cos(rad_lat)
+
+        levels = []
+        pending = np.arange(len(keys))
+        for number, size in enumerate(self.levels):
+            rows = int(180 // size)
+            cols = int(360 // size)
+            p = pending
+            row_min = np.clip(((lat_min[p] + 90) // size).astype(np.intp), 0, rows - 1)
+            row_max = np.clip(((lat_max[p] + 90) // size).astype(np.intp), 0, rows - 1)
+            full = 2 * dlon[p] >= 360 - size
+            col_min = ((lon[p] - dlon[p] + 180) // size).astype(np.intp) % cols
+            col_max = ((lon[p] + dlon[p] + 180) // size).astype(np.intp) % cols
+            n_cols = np.where(full, cols, (col_max - col_min) % cols + 1)
+            col_min = np.where(full, 0, col_min)
+            n_cells = (row_max - row_min + 1) * n_cols
+
+            fits = n_cells <= self.max_cells
+            if number == len(self.levels) - 1:
+                fits[:] = True
+            here = p[fits]
+            pending = p[~fits]
+            if not len(here):
+                continue
+            row_min, n_cols, col_min, n_cells = row_min[fits], n_cols[fits], col_min[fits], n_cells[fits]
+
+            # Expand every subscription into (cell, subscription) pairs
+            owner = np.repeat(np.arange(len(here)), n_cells)
+            offset = np.arange(len(owner)) - np.repeat(np.cumsum(n_cells) - n_cells, n_cells)
+            row = row_min[owner] + offset // n_cols[owner]
+            col = (col_min[owner] + offset % n_cols[owner]) % cols
+            cell = row * cols + col
+            member = here[owner]
+
+            order = np.lexsort((min_mag[member], cell))
+            cell, member = cell[order], member[order]
+            starts = np.flatnonzero(np.r_[True, cell[1:] != cell[:-1]])
+            ends = np.r_[starts[1:], len(cell)]
+            slices = {int(cell[s]): (int(s), int(e)) for s, e in zip(starts, ends)}
+            levels.append(PointLevel(
+                size, cols, slices, member, rad_lat[member], rad_lon[member],
+                cos_lat[member], reach[member], min_mag[member]
+            ))
+        return keys, levels
+
+    def _match(self, lat, lon, mag):
+        import numpy as np
+
+        keys, levels, _ = self._built
+        matched = []
+        lat_r = math.radians(lat)
+        lon_r = math.radians(lon)
+        cos_event = math.cos(lat_r)
+        for level in levels:
+            row = min(max(int((lat + 90) // level.size), 0), int(180 // level.size) - 1)
+            col = int((lon + 180) // level.size) % level.cols
+            span = level.slices.get(row * level.cols + col)
+            if span is None:
+                continue
+            start, end = span
+            # Sorted by minimum magnitude: only the front of the slice wants this event
+            end = start + int(np.searchsorted(level.min_mag[start:end], mag, side="right"))
+            if start == end:
+                continue
+            a = (
+                np.sin((level.lat[start:end] - lat_r) / 2) ** 2
+                + level.cos_lat[start:end] * cos_event * np.sin((level.lon[start:end] - lon_r) / 2) ** 2
+            )
+            hits = level.index[start:end][a <= level.reach[start:end]]
+            matched.extend(keys[i] for i in hits)
+        if self._stale:
+            matched = [key for key in matched if key not in self._stale]
+        for key, (point_lat, point_lon, radius_km, min_magnitude) in self._added.items():
+            if mag >= min_magnitude and haversine_km(lat, lon, point_lat, point_lon) <= radius_km:
+                matched.append(key)
+        return matched
+
+    def _ready(self):
+        # Without a background rebuild under way (no event loop), build here
+        if self._built is None or (self._changed and self._rebuild is None):
+            self._build_now()
+
+    def match(self, lat, lon, mag):
+        if not self._points:
+            return []
+        self._ready()
+        return self._match(lat, lon, mag)
+
+    def match_batch(self, events):
+        """match() for a batch of (lat, lon, mag) events, in order."""
+        if not self._points:
+            return [[] for _ in events]
+        self._ready()
+        return [self._match(lat, lon, mag) for lat, lon, mag in events]
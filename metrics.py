@@ -0,0 +1,235 @@
+"""Counters and histograms for the bot, served in Prometheus text format.
+
+Recording is a dict lookup and an integer add on the event loop thread, so
+it stays on in production; the text is only built when something scrapes
+the endpoint. Set METRICS_PORT to serve it on 127.0.0.1.
+"""
+import asyncio
+import time
+from bisect import bisect_left
+
+METRICS_HOST = "127.0.0.1"
+LOOP_LAG_INTERVAL = 0.5  # seconds between event-loop lag samples
+
+# Upper bounds in seconds
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FAST_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+
+# =======================================================
+# Metric Types
+# =======================================================
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self):
+        return Timer(self)
+
+class Timer:
+    """`with histogram.time():` observes the block's duration."""
+
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+class Metric:
+    """A named family of series, one per combination of label values.
+
+    With no label names the metric is its own single series: call inc() or
+    observe() on it directly. Otherwise pick one with labels(*values); the
+    series are created on first use and cached, so callers may keep them.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        REGISTRY.append(self)
+
+    def _new(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        series = self._series.get(values)
+        if series is None:
+            series = self._series[values] = self._new()
+        return series
+
+    def _label_text(self, values, extra=""):
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, series in self._series.items():
+            lines.extend(self._render_series(values, series))
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new(self):
+        return CounterValue()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_series(self, values, series):
+        return [f"{self.name}_total{self._label_text(values)} {series.value}"]
+
+class GaugeValue:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new(self):
+        return GaugeValue()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def _render_series(self, values, series):
+        return [f"{self.name}{self._label_text(values)} {series.value}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=SLOW_BUCKETS):
+        self.buckets = tuple(buckets)
+        if any(low >= high for low, high in zip(self.buckets, self.buckets[1:])):
+            raise ValueError(f"{name}: bucket bounds must strictly increase")
+        super().__init__(name, help, labelnames)
+
+    def _new(self):
+        return HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_series(self, values, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), series.counts):
+            cumulative += count
+            le = f'le="{bound}"'
+            lines.append(f"{self.name}_bucket{self._label_text(values, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {series.sum}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {series.count}")
+        return lines
+
+REGISTRY = []
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# =======================================================
+# Bot Metrics
+# =======================================================
+
+FEED_FETCH = Histogram("quake_feed_fetch_seconds", "USGS feed request time, headers and body", ["status"])
+FEED_PARSE = Histogram("quake_feed_parse_seconds", "JSON decoding of a changed feed", buckets=FAST_BUCKETS)
+FEED_BYTES = Counter("quake_feed_bytes", "Feed bytes downloaded")
+POLL = Histogram("quake_poll_seconds", "One whole poll: fetch, merge and seen-event store")
+NEW_EVENTS = Counter("quake_new_events", "New earthquakes dispatched")
+MATCH = Histogram("quake_match_seconds", "Matching one event against every subscription", buckets=FAST_BUCKETS)
+SEND = Histogram("quake_send_seconds", "One alert send, per target kind", ["kind"])
+SENDS = Counter("quake_sends", "Alert sends per target kind and outcome", ["kind", "outcome"])
+WEBHOOK_SENDS = Counter("quake_webhook_sends", "Guild alert messages for webhook channels, by the path they took", ["path"])
+USER_LOOKUPS = Counter("quake_user_lookups", "DM target lookups, by how the user resolver answered them", ["result"])
+USER_REST_CALLS = Counter("quake_user_rest_calls", "fetch_user and create_dm requests made to resolve DM targets")
+RATE_LIMIT_WAIT = Counter("quake_rate_limit_wait_seconds", "Time deliveries waited on our own rate limiters", ["scope"])
+DB_CALL = Histogram("quake_db_call_seconds", "Database calls, queueing on the database thread included", ["db"], FAST_BUCKETS)
+AUTOCOMPLETE = Histogram("quake_autocomplete_seconds", "Region autocomplete handler time", buckets=FAST_BUCKETS)
+ALERT_READY = Gauge("quake_alert_ready_seconds", "Process start to the first completed poll with subscriptions loaded")
+LOOP_LAG = Histogram("quake_event_loop_lag_seconds", "How late the event loop woke a sleeping task", buckets=FAST_BUCKETS + SLOW_BUCKETS[5:])
+
+# =======================================================
+# Event Loop Lag & Endpoint
+# =======================================================
+
+async def watch_loop_lag(interval=LOOP_LAG_INTERVAL):
+    """Forever: sleep `interval` and record how late the wake-up came."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, loop.time() - start - interval))
+
+class MetricsServer:
+    """Serves GET /metrics and samples event-loop lag while running."""
+
+    def __init__(self, host=METRICS_HOST, port=9108):
+        self.host = host
+        self.port = port
+        self._runner = None
+        self._lag_task = None
+
+    async def _metrics(self, request):
+        from aiohttp import web
+        return web.Response(body=render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    async def start(self):
+        # aiohttp.web is only needed once something asks for the endpoint
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._lag_task = asyncio.create_task(watch_loop_lag())
+        print(f"📈 Metrics on http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
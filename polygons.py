@@ -0,0 +1,208 @@
+import json
+import math
+import os
+
+from regions import BASE_DIR, REGISTRY
+
+POLYGONS_FILE = os.path.join(BASE_DIR, "countries.polygons.json")
+COAST_KM = 200.0   # an offshore quake counts for every country whose coast is this close
+COASTLINE_KM = 25.0  # how far the 1:110m outlines can cut inside a real coastline
+MEMO_CELL = 1.0    # degrees per memoized grid cell
+KM_PER_DEGREE = 111.32
+
+# =======================================================
+# Geometry
+# =======================================================
+
+class Ring:
+    """One closed outline (or hole) of a country, as flat lon/lat lists."""
+
+    __slots__ = ("name", "lons", "lats", "bounds")
+
+    def __init__(self, name, flat):
+        self.name = name
+        self.lons = flat[0::2]
+        self.lats = flat[1::2]
+        self.bounds = (min(self.lats), max(self.lats), min(self.lons), max(self.lons))
+
+    def contains(self, lat, lon):
+        # Even-odd ray cast towards +lon
+        inside = False
+        lons, lats = self.lons, self.lats
+        j = len(lons) - 1
+        for i in range(len(lons)):
+            if (lats[i] > lat) != (lats[j] > lat):
+                crossing = lons[i] + (lat - lats[i]) * (lons[j] - lons[i]) / (lats[j] - lats[i])
+                if lon < crossing:
+                    inside = not inside
+            j = i
+        return inside
+
+    def edges_near(self, lat_min, lat_max, lon_min, lon_max):
+        """Edges touching the box as (lon1, lat1, lon2, lat2), shifted by 360 where the box runs past +/-180."""
+        lons, lats = self.lons, self.lats
+        shifts = [shift for shift in (-360, 0, 360) if lon_min <= 180 + shift and lon_max >= -180 + shift]
+        edges = []
+        j = len(lons) - 1
+        for i in range(len(lons)):
+            if min(lats[i], lats[j]) <= lat_max and max(lats[i], lats[j]) >= lat_min:
+                low, high = min(lons[i], lons[j]), max(lons[i], lons[j])
+                for shift in shifts:
+                    if low + shift <= lon_max and high + shift >= lon_min:
+                        edges.append((lons[j] + shift, lats[j], lons[i] + shift, lats[i]))
+            j = i
+        return edges
+
+def _side(ax, ay, bx, by, px, py):
+    return (bx - ax) * (py - ay) - (by - ay) * (px - ax) > 0
+
+def crossings(lon1, lat1, lon2, lat2, edges):
+    """How many edges the segment (lon1, lat1)-(lon2, lat2) crosses."""
+    count = 0
+    for ax, ay, bx, by in edges:
+        if (_side(ax, ay, bx, by, lon1, lat1) != _side(ax, ay, bx, by, lon2, lat2)
+                and _side(lon1, lat1, lon2, lat2, ax, ay) != _side(lon1, lat1, lon2, lat2, bx, by)):
+            count += 1
+    return count
+
+def distance_km(lat, lon, edges):
+    """Shortest distance from the point to any edge, on a local equirectangular projection."""
+    scale = math.cos(math.radians(lat))
+    best = math.inf
+    for ax, ay, bx, by in edges:
+        ax, ay, bx, by = (ax - lon) * scale, ay - lat, (bx - lon) * scale, by - lat
+        dx, dy = bx - ax, by - ay
+        length = dx * dx + dy * dy
+        t = 0.0 if length == 0 else max(0.0, min(1.0, -(ax * dx + ay * dy) / length))
+        px, py = ax + t * dx, ay + t * dy
+        best = min(best, px * px + py * py)
+    return math.sqrt(best) * KM_PER_DEGREE
+
+def load_rings(path=POLYGONS_FILE):
+    """Rings of every registry region that has an outline in the polygons file."""
+    with open(path, "r", encoding="utf-8") as f:
+        countries = json.load(f)["countries"]
+    names = {region.iso3: region.name for region in REGISTRY.values() if region.iso3}
+    return [Ring(names[iso3], flat) for iso3, rings in countries.items() if iso3 in names for flat in rings]
+
+# =======================================================
+# Polygon Region Locator
+# =======================================================
+
+class PolygonLocator:
+    """Which regions contain (lat, lon), by country outline instead of bounding box.
+
+    A coarse grid lists the rings whose box (grown by COAST_KM) overlaps
+    each cell. The first event in a cell classifies it once: countries
+    whose outline never comes near the cell are either all-in or all-out,
+    decided by the cell centre. For the rest it keeps only the outline
+    edges near the cell, and a point is inside when the centre is and the
+    line between them crosses those edges an even number of times. A point on land belongs to the
+    country it is in; a point at sea to every country within COAST_KM.
+    The outlines are coarse, so coastal cities (Istanbul, Valparaíso) can
+    fall just outside theirs: a point within COASTLINE_KM of a coast is
+    taken to be on it, and only belongs to the countries that close.
+    Regions without an outline in the file keep their bounding box.
+    """
+
+    def __init__(self, rings, regions, coast_km=COAST_KM, cell_size=MEMO_CELL, coastline_km=COASTLINE_KM):
+        self.coast_km = coast_km
+        self.coastline_km = coastline_km
+        self.cell_size = cell_size
+        self.cols = int(360 // cell_size)
+        self.rows = int(180 // cell_size)
+        self._memo = {}
+
+        self.margin_lat = coast_km / KM_PER_DEGREE
+        self._grid = {}
+        for ring in rings:
+            lat_min, lat_max, lon_min, lon_max = ring.bounds
+            margin_lon = self._margin_lon(max(abs(lat_min), abs(lat_max)) + self.margin_lat)
+            box = (lat_min - self.margin_lat, lat_max + self.margin_lat, lon_min - margin_lon, lon_max + margin_lon)
+            for cell in self._cells(*box):
+                self._grid.setdefault(cell, []).append(ring)
+
+        outlined = {ring.name for ring in rings}
+        self._boxes = {}
+        for name, bounds in regions.items():
+            if bounds and name not in outlined:
+                lat_min, lat_max, lon_min, lon_max = bounds
+                for cell in self._cells(lat_min, lat_max, lon_min, lon_max):
+                    self._boxes.setdefault(cell, []).append((name, bounds))
+
+    def _cell(self, lat, lon):
+        row = min(max(int((lat + 90) // self.cell_size), 0), self.rows - 1)
+        col = int((lon + 180) // self.cell_size) % self.cols
+        return row * self.cols + col
+
+    def _margin_lon(self, lat):
+        # Degrees of longitude get shorter towards the poles
+        return self.margin_lat / max(math.cos(math.radians(min(89.0, lat))), 0.05)
+
+    def _cells(self, lat_min, lat_max, lon_min, lon_max):
+        row_min = self._cell(lat_min, 0) // self.cols
+        row_max = self._cell(lat_max, 0) // self.cols
+        if lon_max - lon_min >= 360 - self.cell_size:
+            cols = range(self.cols)
+        else:
+            col_min = self._cell(0, lon_min) % self.cols
+            col_max = self._cell(0, lon_max) % self.cols
+            cols = range(col_min, col_max + 1) if col_min <= col_max else [*range(col_min, self.cols), *range(0, col_max + 1)]
+        return [row * self.cols + col for row in range(row_min, row_max + 1) for col in cols]
+
+    def _classify(self, cell):
+        row, col = divmod(cell, self.cols)
+        lat_min = row * self.cell_size - 90
+        lon_min = col * self.cell_size - 180
+        # Just off the exact centre, which outlines with rounded coordinates can pass through
+        lat_c = lat_min + self.cell_size * 0.5001937
+        lon_c = lon_min + self.cell_size * 0.4998713
+        margin_lon = self._margin_lon(abs(lat_c) + self.cell_size / 2 + self.margin_lat)
+        box = (
+            lat_min - self.margin_lat, lat_min + self.cell_size + self.margin_lat,
+            lon_min - margin_lon, lon_min + self.cell_size + margin_lon
+        )
+
+        by_name = {}
+        for ring in self._grid.get(cell, ()):
+            by_name.setdefault(ring.name, []).append(ring)
+
+        inside = []
+        exact = []
+        for name, rings in by_name.items():
+            centre_inside = sum(ring.contains(lat_c, lon_c) for ring in rings) % 2 == 1
+            edges = [edge for ring in rings for edge in ring.edges_near(*box)]
+            if edges:
+                exact.append((name, centre_inside, tuple(edges)))
+            elif centre_inside:
+                inside.append(name)
+        memo = (lat_c, lon_c, tuple(inside), tuple(exact), tuple(self._boxes.get(cell, ())))
+        self._memo[cell] = memo
+        return memo
+
+    def locate(self, lat, lon):
+        cell = self._cell(lat, lon)
+        memo = self._memo.get(cell)
+        if memo is None:
+            memo = self._classify(cell)
+        lat_c, lon_c, inside, exact, boxes = memo
+
+        # Inside iff the cell centre is, flipped once per outline crossed on the way from it
+        found = list(inside)
+        for name, centre_inside, edges in exact:
+            if centre_inside != (crossings(lon_c, lat_c, lon, lat, edges) % 2 == 1):
+                found.append(name)
+        # Offshore: the countries whose coast is within reach, or only those whose
+        # outline is close enough that the point is really on their coast
+        if not found:
+            distances = [(distance_km(lat, lon, edges), name) for name, _, edges in exact]
+            ashore = [name for distance, name in distances if distance <= self.coastline_km]
+            found = ashore or [name for distance, name in distances if distance <= self.coast_km]
+        for name, (lat_min, lat_max, lon_min, lon_max) in boxes:
+            if lat_min <= lat <= lat_max and lon_min <= lon <= lon_max:
+                found.append(name)
+        return found
+
+def load_locator(path=POLYGONS_FILE, coast_km=COAST_KM):
+    from regions import REGIONS
+    return PolygonLocator(load_rings(path), REGIONS, coast_km)
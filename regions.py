@@ -0,0 +1,138 @@
+import csv
+import hashlib
+import json
+import os
+import unicodedata
+from typing import NamedTuple, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COUNTRIES_FILE = os.path.join(BASE_DIR, "countries.json")
+COUNTRIES_CSV = os.path.join(BASE_DIR, "countries.csv")
+REGISTRY_CACHE = os.path.join(BASE_DIR, "regions.cache.json")
+
+WORLD = "World"
+WORLD_FLAG = "🌍"
+
+# =======================================================
+# Region Registry
+# =======================================================
+
+class Region(NamedTuple):
+    name: str
+    bounds: Optional[Tuple[float, float, float, float]]  # lat_min, lat_max, lon_min, lon_max
+    iso2: str
+    iso3: str
+    flag: str
+    key: str  # normalized search key
+    aliases: Tuple[str, ...] = ()
+
+def normalize(text):
+    """Case-folded, accent-free form used for searching ("Åland Islands" -> "aland islands")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().strip()
+
+def flag_from_code(iso2):
+    return "".join(chr(ord(c) + 127397) for c in iso2.upper()) if iso2 else ""
+
+def source_hash():
+    digest = hashlib.sha1()
+    for path in (COUNTRIES_FILE, COUNTRIES_CSV):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def _lookup_country(pycountry, name):
+    country = pycountry.countries.get(name=name)
+    if country is not None:
+        return country
+    try:
+        return pycountry.countries.lookup(name)
+    except LookupError:
+        pass
+    try:
+        return pycountry.countries.search_fuzzy(name)[0]
+    except LookupError:
+        return None
+
+def compile_registry():
+    """Build the registry from countries.json/countries.csv. Only this path imports pycountry."""
+    import pycountry
+
+    with open(COUNTRIES_FILE, "r") as f:
+        loaded_regions = json.load(f)
+
+    # countries.csv carries alpha-3 codes keyed by the same bounding boxes. Some
+    # boxes are shared (VGB and VIR); those are ambiguous, None, and fall back to the name.
+    codes_by_bounds = {}
+    with open(COUNTRIES_CSV, "r", newline="") as f:
+        for row in csv.reader(line for line in f if line.strip() and not line.startswith("#")):
+            if row[0] == "country_code":
+                continue
+            code, sw_lat, sw_lon, ne_lat, ne_lon = row
+            box = (float(sw_lat), float(ne_lat), float(sw_lon), float(ne_lon))
+            key = tuple(round(v, 2) for v in box)
+            codes_by_bounds[key] = None if key in codes_by_bounds else code
+
+    regions = [Region(WORLD, None, "", "", WORLD_FLAG, normalize(WORLD), ("global", "earth"))]
+    for name, bounds in loaded_regions.items():
+        country = None
+        code = codes_by_bounds.get(tuple(round(v, 2) for v in bounds))
+        if code:
+            country = pycountry.countries.get(alpha_3=code)
+        if country is None:
+            country = _lookup_country(pycountry, name)
+
+        iso2 = country.alpha_2 if country else ""
+        iso3 = country.alpha_3 if country else ""
+        aliases = []
+        if country:
+            for attr in ("name", "common_name", "official_name"):
+                alias = getattr(country, attr, None)
+                if alias and alias != name and alias not in aliases:
+                    aliases.append(alias)
+        regions.append(Region(name, tuple(bounds), iso2, iso3, flag_from_code(iso2), normalize(name), tuple(aliases)))
+
+    seen = {}
+    for region in regions:
+        if region.iso2 and seen.setdefault(region.iso2, region.name) != region.name:
+            print(f"⚠️ {region.name} and {seen[region.iso2]} both resolved to {region.iso2}")
+    return regions
+
+def write_registry_cache(regions, path=REGISTRY_CACHE):
+    payload = {"source_hash": source_hash(), "regions": [list(region) for region in regions]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1)
+
+def load_registry():
+    try:
+        with open(REGISTRY_CACHE, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload["source_hash"] == source_hash():
+            return [
+                Region(name, tuple(bounds) if bounds else None, iso2, iso3, flag, key, tuple(aliases))
+                for name, bounds, iso2, iso3, flag, key, aliases in payload["regions"]
+            ]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Cache missing or stale: rebuild once and try to persist it for the next start
+    regions = compile_registry()
+    try:
+        write_registry_cache(regions)
+    except OSError as e:
+        print(f"⚠️ Could not write {REGISTRY_CACHE}: {e}")
+    return regions
+
+REGISTRY = {region.name: region for region in load_registry()}
+
+# name -> (lat_min, lat_max, lon_min, lon_max); "World" has no bounds
+REGIONS = {name: region.bounds for name, region in REGISTRY.items()}
+
+def flag_emoji(country_name):
+    region = REGISTRY.get(country_name)
+    return region.flag if region else ""
+
+if __name__ == "__main__":
+    # python regions.py  -> regenerate regions.cache.json after editing countries.json/csv
+    write_registry_cache(compile_registry())
+    print(f"✅ Wrote {REGISTRY_CACHE}")
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+
+import discord
+
+from regions import flag_emoji
+
+THUMBNAIL_URL = "https://yourcdn.com/Earthquake%20Alerts.webp"
+ALERT_COLOR = discord.Color.from_rgb(231, 76, 60)
+
+SERVER = "server"  # /setchannel guild channels
+CHAT = "chat"      # /gcsetup DMs and group chats
+DM = "dm"          # /subscribe user DMs
+
+RENDER_CACHE_SIZE = 512
+DIGEST_LINES = 15  # events listed in a digest before "...and N more"
+
+# =======================================================
+# Alert Embeds
+# =======================================================
+
+def build_alert_embed(feature, region_name, template):
+    event_id = feature["id"]
+    props = feature["properties"]
+    lon, lat = feature["geometry"]["coordinates"][:2]
+    mag = props["mag"]
+    place = props["place"]
+    map_url = f"https://earthquake.usgs.gov/earthquakes/eventpage/{event_id}/map"
+
+    embed = discord.Embed(
+        title="🔔 Earthquake Detected!" if template == DM else "🌍 Earthquake Alert!",
+        color=ALERT_COLOR,
+        timestamp=discord.utils.utcnow()
+    )
+    embed.set_thumbnail(url=THUMBNAIL_URL)
+    if template == SERVER:
+        embed.add_field(name="Region", value=f"{flag_emoji(region_name)} {region_name}", inline=True)
+        embed.add_field(name="Magnitude", value=f"`{mag}`", inline=True)
+    elif template == CHAT:
+        embed.add_field(name="Magnitude", value=f"`{mag}`", inline=True)
+        embed.add_field(name="Region", value=f"{flag_emoji(region_name)} {region_name}", inline=True)
+    else:
+        embed.add_field(name="Magnitude", value=f"`{mag}`", inline=True)
+    embed.add_field(name="Location", value=place or "Unknown", inline=False)
+    embed.add_field(name="Coordinates", value=f"`{lat}, {lon}`", inline=False)
+    embed.add_field(name="More Info", value=f"[USGS Details]({props['url']})", inline=False)
+    if template != DM:
+        embed.add_field(name="Epicenter Map", value=f"[📍 View on Map]({map_url})", inline=False)
+    embed.set_footer(text="Stay alert. Stay safe.")
+    return embed
+
+def build_digest_embed(features, region_name, template):
+    """One embed for several events bound for the same target, largest magnitude first."""
+    features = sorted(features, key=lambda f: f["properties"]["mag"] or 0, reverse=True)
+    if template == DM or not region_name:
+        title = f"🔔 {len(features)} Earthquakes Detected"
+    else:
+        title = f"🌍 {len(features)} Earthquakes: {flag_emoji(region_name)} {region_name}".replace("  ", " ")
+
+    lines = []
+    for feature in features[:DIGEST_LINES]:
+        props = feature["properties"]
+        lines.append(
+            f"`M{props['mag']}` {props['place'] or 'Unknown'} · <t:{props['time'] // 1000}:R> · "
+            f"[USGS]({props['url']})"
+        )
+    if len(features) > DIGEST_LINES:
+        lines.append(f"…and {len(features) - DIGEST_LINES} more")
+
+    embed = discord.Embed(title=title, description="\n".join(lines), color=ALERT_COLOR, timestamp=discord.utils.utcnow())
+    embed.set_thumbnail(url=THUMBNAIL_URL)
+    embed.set_footer(text="Stay alert. Stay safe.")
+    return embed
+
+class AlertRenderer:
+    """Renders each (event, region, template) embed once and hands the same object to every recipient."""
+
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.renders = 0
+        self.hits = 0
+
+    def render(self, feature, region_name, template):
+        # DM embeds don't show the region, so every subscriber shares one
+        if template == DM:
+            region_name = None
+        key = (feature["id"], feature["properties"].get("updated"), region_name, template)
+        embed = self._cache.get(key)
+        if embed is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return embed
+
+        self.renders += 1
+        embed = build_alert_embed(feature, region_name, template)
+        self._cache[key] = embed
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return embed
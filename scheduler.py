@@ -0,0 +1,118 @@
+import random
+import statistics
+import time
+from collections import deque
+
+POLL_FLOOR = 10.0        # seconds between polls while things are happening
+POLL_CEILING = 120.0     # seconds between polls when the feed is quiet
+POLL_START = 60.0
+BACKOFF_FACTOR = 1.5
+NOTABLE_MAGNITUDE = 4.5  # an event this large keeps us at the floor...
+HOT_PERIOD = 15 * 60     # ...for this many seconds, to catch aftershocks
+JITTER = 0.1             # +/- fraction applied to every interval
+FEED_PERIOD = 60.0       # USGS regenerates the summary feeds about once a minute
+FEED_SETTLE = 3.0        # seconds after a regeneration before it is reliably served
+
+# =======================================================
+# Adaptive Polling
+# =======================================================
+
+class AdaptiveSchedule:
+    """Decides how long to wait before the next feed poll.
+
+    New events pull the interval down to the floor, and a notable one keeps
+    it there for HOT_PERIOD. Quiet polls back off geometrically towards the
+    ceiling. Outside hot periods each poll is moved to just after the feed's
+    next expected regeneration (from its `generated` stamp), so a slow
+    poller still sees a new generation within seconds of it appearing.
+    Jitter keeps restarts and shards from polling in lockstep.
+
+    Times are wall-clock seconds (time.time()), to line up with `generated`.
+    """
+
+    def __init__(self, floor=POLL_FLOOR, ceiling=POLL_CEILING, start=POLL_START, backoff=BACKOFF_FACTOR,
+                 notable_magnitude=NOTABLE_MAGNITUDE, hot_period=HOT_PERIOD, jitter=JITTER,
+                 feed_period=FEED_PERIOD, settle=FEED_SETTLE, rng=None):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.interval = min(max(start, floor), ceiling)
+        self.backoff = backoff
+        self.notable_magnitude = notable_magnitude
+        self.hot_period = hot_period
+        self.jitter = jitter
+        self.feed_period = feed_period
+        self.settle = settle
+        self.rng = rng or random.Random()
+        self.hot_until = 0.0
+        self.last_generated = None
+
+    def observe(self, new_events=0, max_magnitude=None, generated=None, now=None):
+        """Feed back one poll's outcome: how many new events, the largest magnitude, the feed's generated stamp (ms)."""
+        now = time.time() if now is None else now
+        if max_magnitude is not None and max_magnitude >= self.notable_magnitude:
+            self.hot_until = now + self.hot_period
+
+        # The feed regenerating faster than we poll means we are falling behind it
+        fast_feed = False
+        if generated is not None:
+            generated /= 1000
+            if self.last_generated is not None and generated > self.last_generated:
+                fast_feed = generated - self.last_generated < self.interval
+            self.last_generated = generated
+
+        if now < self.hot_until or new_events:
+            self.interval = self.floor
+        elif fast_feed:
+            self.interval = max(self.floor, self.interval / self.backoff)
+        else:
+            self.interval = min(self.ceiling, self.interval * self.backoff)
+        return self.interval
+
+    def next_interval(self, now=None):
+        now = time.time() if now is None else now
+        spread = self.interval * self.jitter
+        delay = min(max(self.interval + self.rng.uniform(-spread, spread), self.floor), self.ceiling)
+        if self.interval <= self.floor or self.last_generated is None:
+            return delay
+
+        # Snap to the expected regeneration nearest the target, never sooner than the floor
+        target = now + delay
+        first = self.last_generated + self.settle
+        k = round((target - first) / self.feed_period)
+        aligned = first + k * self.feed_period
+        while aligned - now < self.floor:
+            aligned += self.feed_period
+        return aligned - now + self.rng.uniform(0, self.settle)
+
+# =======================================================
+# Detection Latency
+# =======================================================
+
+class LatencyTracker:
+    """Seconds from USGS origin/updated time to our dispatch, over the most recent events."""
+
+    def __init__(self, size=500):
+        self.origin = deque(maxlen=size)
+        self.updated = deque(maxlen=size)
+
+    def record(self, origin_ms, updated_ms, dispatched=None):
+        dispatched_ms = (time.time() if dispatched is None else dispatched) * 1000
+        self.origin.append((dispatched_ms - origin_ms) / 1000)
+        if updated_ms is not None:
+            self.updated.append((dispatched_ms - updated_ms) / 1000)
+
+    def median(self):
+        """(median from origin, median from updated), or None where nothing was recorded."""
+        return (
+            statistics.median(self.origin) if self.origin else None,
+            statistics.median(self.updated) if self.updated else None
+        )
+
+    def summary(self):
+        from_origin, from_updated = self.median()
+        if from_origin is None:
+            return "no events yet"
+        text = f"{from_origin:.1f}s from origin"
+        if from_updated is not None:
+            text += f", {from_updated:.1f}s from USGS update"
+        return text
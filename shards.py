@@ -0,0 +1,279 @@
+"""Multi-process sharding: one coordinator polls USGS, shard workers deliver.
+
+The coordinator owns the feed poller and the seen-event store and
+broadcasts every changed feed (plus which events in it are new) to the
+workers over a local TCP socket as JSON lines. Each worker runs bot.py for
+a slice of the shards, keeps only the alert targets of the guilds it owns
+in its subscription index, and delivers only to those.
+
+Run from the repository root:  python shards.py --shards 4 --processes 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from collections import deque
+
+from journal import JOURNAL_FILE
+
+IPC_HOST = "127.0.0.1"
+IPC_PORT = 8765
+IPC_LIMIT = 16 * 1024 * 1024  # a full all_day feed fits in one line
+REPLAY = 100                  # broadcasts kept for workers that reconnect
+WORKER_WAIT = 60              # seconds the coordinator waits for every worker before its first poll
+
+def shard_for(guild_id, shard_count):
+    """The shard Discord routes a guild to."""
+    return (guild_id >> 22) % shard_count
+
+def ownership(shard_ids, shard_count):
+    """owns(guild_id) for a worker running `shard_ids`. DMs and group chats (guild_id None) belong to shard 0."""
+    shard_ids = frozenset(shard_ids)
+
+    def owns(guild_id):
+        if guild_id is None:
+            return 0 in shard_ids
+        return shard_for(guild_id, shard_count) in shard_ids
+    return owns
+
+def parse_shard_ids(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+# =======================================================
+# Coordinator Side
+# =======================================================
+
+class EventBroadcaster:
+    """Pushes messages to every connected shard worker.
+
+    Broadcasts are numbered; a worker that reconnects says which number it
+    saw last and gets the ones it missed replayed, so no event is dropped
+    or delivered twice across a reconnect. A worker that never saw this
+    coordinator (just started, or restarted) gets no replay: it may have
+    delivered those events in a previous life. Anything a worker sends up
+    is relayed to all of them (subscription changes, see bot.py).
+    """
+
+    def __init__(self, host=IPC_HOST, port=IPC_PORT, token=None, replay=REPLAY):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.epoch = os.urandom(8).hex()  # a restarted coordinator numbers from 1 again
+        self.seq = 0
+        self._backlog = deque(maxlen=replay)
+        self._workers = {}  # writer -> shard ids
+        self._server = None
+        self._changed = asyncio.Condition()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._accept, self.host, self.port, limit=IPC_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _accept(self, reader, writer):
+        try:
+            hello = json.loads(await reader.readline())
+        except ValueError:
+            writer.close()
+            return
+        if self.token and hello.get("token") != self.token:
+            writer.close()
+            return
+
+        if hello.get("epoch") == self.epoch:
+            last_seq = hello.get("last_seq", 0)
+            for seq, line in self._backlog:
+                if seq > last_seq:
+                    writer.write(line)
+        async with self._changed:
+            self._workers[writer] = hello.get("shard_ids", [])
+            self._changed.notify_all()
+        print(f"🔌 Shard worker connected: shards {hello.get('shard_ids')}")
+
+        try:
+            while line := await reader.readline():
+                await self.publish(json.loads(line))
+        except (ConnectionError, ValueError) as e:
+            print(f"⚠️ Shard worker {hello.get('shard_ids')} disconnected: {e}")
+        finally:
+            async with self._changed:
+                self._workers.pop(writer, None)
+                self._changed.notify_all()
+            writer.close()
+
+    async def wait_for_workers(self, count):
+        async with self._changed:
+            await self._changed.wait_for(lambda: len(self._workers) >= count)
+
+    async def publish(self, message):
+        self.seq += 1
+        line = (json.dumps({**message, "epoch": self.epoch, "seq": self.seq}, separators=(",", ":")) + "\n").encode()
+        self._backlog.append((self.seq, line))
+        workers = list(self._workers)
+        for writer in workers:
+            writer.write(line)
+        results = await asyncio.gather(*(writer.drain() for writer in workers), return_exceptions=True)
+        for writer, result in zip(workers, results):
+            if isinstance(result, Exception):
+                print(f"❌ Dropping shard worker {self._workers.get(writer)}: {result}")
+                self._workers.pop(writer, None)
+                writer.close()
+
+    async def broadcast(self, features, new_ids, generated=None):
+        """Send a changed feed; workers deliver the events listed in new_ids."""
+        await self.publish({"type": "feed", "features": features, "new": sorted(new_ids), "generated": generated})
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._workers):
+                writer.close()
+            await self._server.wait_closed()
+
+async def coordinate(host=IPC_HOST, port=IPC_PORT, token=None, workers=0, worker_wait=WORKER_WAIT):
+    """Poll the feeds forever and broadcast every change. Runs without a Discord connection.
+
+    The first poll waits (up to `worker_wait` seconds) for `workers` workers
+    to connect, since a worker joining later gets no replay of what it missed.
+    """
+    import bot
+    from feed import create_session
+
+    session = create_session()
+    bot.ingestor.use_session(session)
+    await bot.init_db()
+    if bot.metrics_server:
+        await bot.metrics_server.start()
+    broadcaster = EventBroadcaster(host, port, token)
+    await broadcaster.start()
+    print(f"🛰️ Coordinator listening on {host}:{broadcaster.port}")
+    try:
+        try:
+            await asyncio.wait_for(broadcaster.wait_for_workers(workers), worker_wait)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Only {len(broadcaster._workers)} of {workers} shard workers connected, polling anyway")
+        while True:
+            try:
+                features, new_features = await bot.poll_feed()
+                if features is not None:
+                    await broadcaster.broadcast(features, [f["id"] for f in new_features], bot.ingestor.generated)
+            except Exception as e:
+                print("❌ Error fetching earthquake data:", e)
+            await asyncio.sleep(bot.schedule.next_interval())
+    finally:
+        if bot.metrics_server:
+            await bot.metrics_server.stop()
+        await broadcaster.close()
+        await bot.ingestor.close()
+        await session.close()
+        await bot.close_db()
+        await asyncio.gather(*bot.history_writes)
+        await bot.close_history()
+
+# =======================================================
+# Worker Side
+# =======================================================
+
+class ShardLink:
+    """A worker's connection to the coordinator. Iterate over messages() to receive broadcasts."""
+
+    def __init__(self, host=IPC_HOST, port=IPC_PORT, shard_ids=(), token=None, retry=1.0, max_retry=30.0):
+        self.host = host
+        self.port = port
+        self.shard_ids = list(shard_ids)
+        self.token = token
+        self.retry = retry
+        self.max_retry = max_retry
+        self.epoch = None
+        self.last_seq = 0
+        self._writer = None
+        self._pending = []
+
+    def send(self, message):
+        """Send a message up to the coordinator, which relays it to every worker."""
+        line = (json.dumps(message) + "\n").encode()
+        if self._writer is None:
+            self._pending.append(line)
+        else:
+            self._writer.write(line)
+
+    async def messages(self):
+        delay = self.retry
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port, limit=IPC_LIMIT)
+            except OSError as e:
+                print(f"⚠️ Coordinator unreachable ({e}), retrying in {delay:.0f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry)
+                continue
+
+            delay = self.retry
+            hello = {"shard_ids": self.shard_ids, "epoch": self.epoch, "last_seq": self.last_seq, "token": self.token}
+            writer.write((json.dumps(hello) + "\n").encode())
+            for line in self._pending:
+                writer.write(line)
+            self._pending.clear()
+            self._writer = writer
+            try:
+                while line := await reader.readline():
+                    message = json.loads(line)
+                    if message["epoch"] != self.epoch:
+                        self.epoch, self.last_seq = message["epoch"], 0
+                    if message["seq"] <= self.last_seq:
+                        continue
+                    self.last_seq = message["seq"]
+                    yield message
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                print(f"⚠️ Lost the coordinator: {e}")
+            finally:
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(self.retry)
+
+# =======================================================
+# Launcher
+# =======================================================
+
+def split_shards(shard_count, processes):
+    return [list(range(i, shard_count, processes)) for i in range(processes)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one coordinator and several shard worker processes")
+    parser.add_argument("--shards", type=int, required=True, help="total shard count")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes to spread the shards over")
+    parser.add_argument("--port", type=int, default=IPC_PORT)
+    args = parser.parse_args()
+
+    token = os.urandom(16).hex()
+    metrics_port = os.getenv("METRICS_PORT")
+    journal_root, journal_ext = os.path.splitext(os.getenv("JOURNAL_FILE", JOURNAL_FILE))
+    workers = []
+    for index, shard_ids in enumerate(split_shards(args.shards, args.processes)):
+        env = dict(
+            os.environ,
+            SHARD_COUNT=str(args.shards),
+            SHARD_IDS=",".join(map(str, shard_ids)),
+            SHARD_IPC=f"{IPC_HOST}:{args.port}",
+            SHARD_IPC_TOKEN=token,
+            # Each worker writes and rotates its own alert journal
+            JOURNAL_FILE=f"{journal_root}-{'-'.join(map(str, shard_ids))}{journal_ext}"
+        )
+        if metrics_port:
+            # The coordinator keeps METRICS_PORT, worker i serves on the ports after it
+            env["METRICS_PORT"] = str(int(metrics_port) + 1 + index)
+        workers.append(subprocess.Popen([sys.executable, "bot.py"], env=env))
+
+    try:
+        asyncio.run(coordinate(IPC_HOST, args.port, token, workers=len(workers)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+if __name__ == "__main__":
+    main()
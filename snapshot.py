@@ -0,0 +1,83 @@
+import time
+from bisect import bisect_left
+
+SNAPSHOT_MAX_AGE = 3 * 60  # seconds before read commands stop trusting the poller's snapshot
+
+# =======================================================
+# Latest Feed Snapshot
+# =======================================================
+
+class Quake:
+    """The fields read commands need from one GeoJSON feature."""
+
+    __slots__ = ("id", "magnitude", "place", "time", "updated", "lat", "lon", "depth", "url")
+
+    def __init__(self, id, magnitude, place, time, updated, lat, lon, depth, url):
+        self.id = id
+        self.magnitude = magnitude
+        self.place = place
+        self.time = time
+        self.updated = updated
+        self.lat = lat
+        self.lon = lon
+        self.depth = depth
+        self.url = url
+
+    @classmethod
+    def from_feature(cls, feature):
+        props = feature["properties"]
+        coords = feature["geometry"]["coordinates"]
+        return cls(
+            feature["id"], props["mag"], props.get("place"), props["time"], props.get("updated"),
+            coords[1], coords[0], coords[2] if len(coords) > 2 else None, props.get("url")
+        )
+
+class FeedSnapshot:
+    """The poller's latest parsed feed, oldest first, shared with read commands.
+
+    The poller publishes every changed feed and touches the snapshot when a
+    poll finds nothing new, so its age is the time since the feed was last
+    confirmed, not since it last changed.
+    """
+
+    def __init__(self, max_age=SNAPSHOT_MAX_AGE):
+        self.max_age = max_age
+        self.quakes = []
+        self._times = []
+        self.generated = None
+        self.refreshed_at = None
+
+    def publish(self, features, generated=None):
+        quakes = [Quake.from_feature(f) for f in features if f["properties"].get("mag") is not None]
+        quakes.sort(key=lambda q: q.time)
+        self.quakes = quakes
+        self._times = [q.time for q in quakes]
+        self.generated = generated
+        self.touch()
+
+    def touch(self):
+        self.refreshed_at = time.monotonic()
+
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        return time.monotonic() - self.refreshed_at
+
+    @property
+    def stale(self):
+        age = self.age()
+        return age is None or age > self.max_age
+
+    def recent(self, limit=5, min_magnitude=None):
+        """The newest `limit` quakes at or above `min_magnitude`, newest first."""
+        found = []
+        for quake in reversed(self.quakes):
+            if min_magnitude is None or quake.magnitude >= min_magnitude:
+                found.append(quake)
+                if len(found) == limit:
+                    break
+        return found
+
+    def since(self, time_ms):
+        """Every quake with an origin time at or after `time_ms`, oldest first."""
+        return self.quakes[bisect_left(self._times, time_ms):]
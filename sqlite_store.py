@@ -0,0 +1,61 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import DB_CALL
+
+# =======================================================
+# Connection
+# =======================================================
+
+def connect(path):
+    # sqlite3 keeps compiled statements per connection, keyed by SQL text,
+    # so constant query strings are prepared once and reused
+    conn = sqlite3.connect(path, check_same_thread=False, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+class Store:
+    """One long-lived connection, only ever touched from its own worker thread.
+
+    SQLite never blocks the event loop and needs no locking of ours. The
+    connection comes from `open()` on first use, so the file path can
+    still be changed before then.
+    """
+
+    def __init__(self, name, open):
+        self.open = open
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-db")
+        self._conn = None
+        self._db_call = DB_CALL.labels(name)
+
+    def _call(self, fn, args):
+        if self._conn is None:
+            self._conn = self.open()
+        try:
+            result = fn(self._conn, *args)
+            self._conn.commit()
+            return result
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    async def run(self, fn, *args):
+        """Run fn(conn, *args) on the store's thread and commit."""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, self._call, fn, args)
+        finally:
+            self._db_call.observe(time.perf_counter() - start)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
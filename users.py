@@ -0,0 +1,147 @@
+import time
+from collections import OrderedDict
+
+import discord
+
+from metrics import USER_LOOKUPS, USER_REST_CALLS
+
+USER_CACHE_SIZE = 10000
+USER_CACHE_TTL = 6 * 60 * 60        # seconds
+CLOSED_DM_BACKOFF = 60 * 60         # first back-off after a 403, doubled on each repeat
+CLOSED_DM_MAX_BACKOFF = 7 * 24 * 60 * 60
+
+# =======================================================
+# Caches
+# =======================================================
+
+class TTLCache:
+    """Bounded LRU whose entries also expire `ttl` seconds after insertion."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires = entry
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def __len__(self):
+        return len(self._data)
+
+# =======================================================
+# User & DM Channel Resolution
+# =======================================================
+
+class DMClosed(Exception):
+    """Raised by UserResolver.send for a user still backed off after a 403."""
+
+class UserResolver:
+    """Resolves user IDs to DM channels with as few REST calls as possible.
+
+    Lookup order is the gateway cache (`bot.get_user`), then our own LRU of
+    fetched users and opened DM channels, and only then `fetch_user` /
+    `create_dm`. Users whose DMs answered 403 are skipped until their
+    back-off expires; send() raises DMClosed for them.
+    """
+
+    def __init__(self, bot, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL,
+                 backoff=CLOSED_DM_BACKOFF, max_backoff=CLOSED_DM_MAX_BACKOFF):
+        self.bot = bot
+        self.users = TTLCache(maxsize, ttl)
+        self.dm_channels = TTLCache(maxsize, ttl)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.closed = {}  # user_id -> (retry_after, current back-off)
+
+        self.hits = 0
+        self.misses = 0
+        self.rest_calls = 0
+        self.skipped_closed = 0
+
+    def is_closed(self, user_id):
+        entry = self.closed.get(user_id)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def mark_closed(self, user_id):
+        _, previous = self.closed.get(user_id, (0, 0))
+        backoff = min(previous * 2, self.max_backoff) if previous else self.backoff
+        self.closed[user_id] = (time.monotonic() + backoff, backoff)
+        self.dm_channels.pop(user_id)
+
+    def mark_open(self, user_id):
+        self.closed.pop(user_id, None)
+
+    async def get_user(self, user_id):
+        user = self.bot.get_user(user_id) or self.users.get(user_id)
+        if user is not None:
+            self.hits += 1
+            USER_LOOKUPS.labels("hit").inc()
+            return user
+        self.misses += 1
+        self.rest_calls += 1
+        USER_LOOKUPS.labels("miss").inc()
+        USER_REST_CALLS.inc()
+        user = await self.bot.fetch_user(user_id)
+        self.users.put(user_id, user)
+        return user
+
+    async def get_dm_channel(self, user_id):
+        """Return a DM channel for `user_id`, or None while the user is backed off."""
+        if self.is_closed(user_id):
+            self.skipped_closed += 1
+            USER_LOOKUPS.labels("closed").inc()
+            return None
+        channel = self.dm_channels.get(user_id)
+        if channel is not None:
+            self.hits += 1
+            USER_LOOKUPS.labels("hit").inc()
+            return channel
+        user = await self.get_user(user_id)
+        channel = user.dm_channel
+        if channel is None:
+            self.rest_calls += 1
+            USER_REST_CALLS.inc()
+            channel = await user.create_dm()
+        self.dm_channels.put(user_id, channel)
+        return channel
+
+    async def send(self, user_id, **kwargs):
+        channel = await self.get_dm_channel(user_id)
+        if channel is None:
+            raise DMClosed(f"DMs closed for user {user_id}")
+        try:
+            message = await channel.send(**kwargs)
+        except discord.Forbidden:
+            self.mark_closed(user_id)
+            raise
+        self.mark_open(user_id)
+        return message
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "rest_calls": self.rest_calls,
+            "skipped_closed": self.skipped_closed,
+            "cached_users": len(self.users),
+            "cached_dm_channels": len(self.dm_channels),
+            "closed_dms": sum(1 for user_id in self.closed if self.is_closed(user_id))
+        }
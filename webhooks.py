@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import defaultdict
+
+import aiohttp
+import discord
+
+from database import get_webhook, set_webhook, uses_webhook
+from metrics import WEBHOOK_SENDS
+
+WEBHOOK_NAME = "Earthquake Alerts"
+WEBHOOK_POOL_SIZE = 32       # open connections shared by every webhook, when not given the bot's session
+WEBHOOK_RETRY = 60 * 60      # seconds before trying again in a channel where we may not create webhooks
+MAX_EMBEDS = 10              # Discord's per-message limit
+
+# =======================================================
+# Webhook Delivery
+# =======================================================
+
+class WebhookSender:
+    """Sends guild alerts through one webhook per channel.
+
+    On first use in a channel the bot's own webhook there is reused, or a
+    new one created; either way it is stored in botdata.db and kept as a
+    partial Webhook bound to one pooled session, so a send is a single
+    request on the webhook's own rate limit. A message carries up to
+    MAX_EMBEDS embeds. When the webhook was deleted, or the bot may not
+    manage webhooks in the channel, the message goes out through `fallback`
+    (the channel's own send) instead. discard() deletes the webhook when a
+    channel stops using it. Requests go over the session given to
+    use_session(), or one of its own.
+    """
+
+    def __init__(self, bot, name=WEBHOOK_NAME, avatar_url=None, pool_size=WEBHOOK_POOL_SIZE, retry=WEBHOOK_RETRY):
+        self.bot = bot
+        self.name = name
+        self.avatar_url = avatar_url
+        self.pool_size = pool_size
+        self.retry = retry
+        self._session = None
+        self._shared = None
+        self._webhooks = {}     # channel_id -> discord.Webhook
+        self._unavailable = {}  # channel_id -> monotonic time to try creating one again
+        self._locks = defaultdict(asyncio.Lock)  # channel_id -> held while finding, creating or deleting its webhook
+
+        self.created = 0
+        self.fallbacks = 0
+
+    def use_session(self, session):
+        self._shared = session
+
+    def _client(self):
+        if self._shared is not None:
+            return self._shared
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size))
+        return self._session
+
+    def _partial(self, webhook_id, token):
+        return discord.Webhook.partial(webhook_id, token, session=self._client())
+
+    async def _find_or_create(self, channel_id):
+        """Return (webhook_id, token) of a webhook of ours in the channel, creating one if there is none."""
+        owner_id = self.bot.user.id if self.bot.user else None
+        for data in await self.bot.http.channel_webhooks(channel_id):
+            user = data.get("user") or {}
+            if data.get("token") and data.get("name") == self.name and int(user.get("id", 0)) == owner_id:
+                return int(data["id"]), data["token"]
+        data = await self.bot.http.create_webhook(channel_id, name=self.name, reason="Earthquake alert delivery")
+        self.created += 1
+        return int(data["id"]), data["token"]
+
+    async def _webhook(self, channel_id):
+        webhook = self._webhooks.get(channel_id)
+        if webhook is not None:
+            return webhook
+        # One lookup per channel at a time, so concurrent sends can't each create a webhook
+        async with self._locks[channel_id]:
+            webhook = self._webhooks.get(channel_id)
+            if webhook is not None:
+                return webhook
+            if not uses_webhook(channel_id):
+                # Turned off since this alert was queued
+                return None
+            webhook_id, token = get_webhook(channel_id)
+            if webhook_id is None:
+                if self._unavailable.get(channel_id, 0) > time.monotonic():
+                    return None
+                try:
+                    webhook_id, token = await self._find_or_create(channel_id)
+                except discord.HTTPException as e:
+                    # Missing Manage Webhooks, or the channel's webhook limit is reached
+                    print(f"⚠️ Couldn't create a webhook in {channel_id}, using normal messages: {e}")
+                    self._unavailable[channel_id] = time.monotonic() + self.retry
+                    return None
+                await set_webhook(channel_id, webhook_id, token)
+            webhook = self._webhooks[channel_id] = self._partial(webhook_id, token)
+            return webhook
+
+    async def discard(self, channel_id, drop):
+        """Stop webhook delivery to a channel: `drop()` removes its row, then the webhook is deleted from Discord.
+
+        Returns what `drop()` returned.
+        """
+        # Waits out a lookup in progress, so a webhook can't be created after we looked
+        async with self._locks[channel_id]:
+            self._webhooks.pop(channel_id, None)
+            self._unavailable.pop(channel_id, None)
+            webhook_id, token = get_webhook(channel_id)
+            result = await drop()
+        if webhook_id is not None and not uses_webhook(channel_id):
+            try:
+                await self._partial(webhook_id, token).delete(reason="Earthquake alert webhook turned off")
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                print(f"⚠️ Couldn't delete the webhook in {channel_id}: {e}")
+        return result
+
+    async def send(self, channel_id, fallback, embeds):
+        """Post `embeds` (at most MAX_EMBEDS) to a channel by webhook, or by `fallback(embeds=...)` if that fails."""
+        webhook = await self._webhook(channel_id)
+        if webhook is not None:
+            try:
+                message = await webhook.send(embeds=embeds, username=self.name, avatar_url=self.avatar_url or discord.utils.MISSING)
+                WEBHOOK_SENDS.labels("webhook").inc()
+                return message
+            except discord.NotFound:
+                # Deleted from the channel settings: make a new one next time
+                print(f"⚠️ Webhook for {channel_id} was deleted, falling back to a normal message")
+                self._webhooks.pop(channel_id, None)
+                await set_webhook(channel_id, None, None)
+            except discord.Forbidden:
+                self._webhooks.pop(channel_id, None)
+                await set_webhook(channel_id, None, None)
+                self._unavailable[channel_id] = time.monotonic() + self.retry
+        self.fallbacks += 1
+        WEBHOOK_SENDS.labels("fallback").inc()
+        return await fallback(embeds=embeds)
+
+    def stats(self):
+        return {"webhooks": len(self._webhooks), "created": self.created, "fallbacks": self.fallbacks}
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None